@@ -6,19 +6,31 @@ import time
 import string
 import ConfigParser
 import argparse
+import threading
+import random
+import urllib2
+from array import array
 
 sys.path.append( os.path.join(sys.path[0],'jtLib') )
-from jinja2 import Environment, FileSystemLoader, Template
 from jakUtils import *
 from SciDirect import *
 from SciDirectJournals import *
 from PrecisionRecall import *
 from MGIarticles import *
+from Pipeline import *
+from SciDirectQuery import *
+from ResultCache import *
+from LocalSciDirect import *
+from Progress import *
+from GoldCounts import *
+from ResultAlgebra import *
+from Report import renderPages, pageFilename
 
 # Various Constants
 SDQUERYDELIM = '|||'	# delimiter in config for joining SDquery strings
 TCABBREVDELIM = ','	# delimiter in config for list of triage category abbrev
 JOURNALDELIM = '|'	# delimiter in config for list of journal names
+YEARDELIM = ','		# delimiter in config for list of years
 
 class ArgParser (object):
     """ ArgParser instantiates ConfigParser object,
@@ -60,9 +72,9 @@ class ArgParser (object):
 			dest='outputDir', default=argparse.SUPPRESS,
 			help='output directory, current dir is default')
 	self.parser.add_argument('-y', metavar='year',
-			dest='year', default=argparse.SUPPRESS,
+			dest='years', nargs='+', default=argparse.SUPPRESS,
 			choices=['2011','2012','2013'],
-			help='year to analyze (2011, 2012, 2013 -default)')
+		help='year(s) to analyze (2011, 2012, 2013 -default)')
 	self.parser.add_argument('--maxFalseNegs',metavar='num',
 			dest='numFalseNegatives', default=argparse.SUPPRESS,
 			type=int,
@@ -76,6 +88,32 @@ class ArgParser (object):
 			help=
 		    '''causes all SciDirect results & false negatives to be
 		    dumped in tab-delimited files in the output directory''')
+	self.parser.add_argument('--termAnalysis', action='store_true',
+			dest='termAnalysis', default=False,
+			help=
+		    '''instead of a normal run, report how much each term in
+		    each triage category query contributes to its true and
+		    false positives''')
+	self.parser.add_argument('--clauseAnalysis', action='store_true',
+			dest='clauseAnalysis', default=False,
+			help=
+		    '''instead of a normal run, report what each AND NOT
+		    clause (and each term in it) of each triage category
+		    query removes, and the precision/recall without it''')
+	self.parser.add_argument('--estimate', action='store_true',
+			dest='estimate', default=False,
+			help=
+		    '''instead of a normal run, estimate precision (and
+		    recall) from random samples of each query's results,
+		    w/ error bars. Fewer API calls, see [Estimation]''')
+	self.parser.add_argument('--corpus', metavar='mode',
+			dest='corpusMode', default='',
+			choices=['build','use','compare'],
+			help=
+		    '''local article corpus (see [SciDirect] corpusFile):
+		    "build" fetches it from SciDirect, "use" runs the
+		    queries against it instead of SciDirect, "compare"
+		    reports how local query counts agree with SciDirect's''')
     def parse_args(self):
 	return self.parser.parse_args()
 
@@ -131,9 +169,23 @@ class ArgParser (object):
 	# set dump option from cmd line
 	co.set('DEFAULT','DumpQueries',str(args.dumpQueries)) 
 
-	# update year from cmd line
-	if argdict.has_key('year'):
-	    co.set('DEFAULT', 'Year', argdict['year'] )
+	# set term analysis mode from cmd line
+	co.set('DEFAULT','TermAnalysis',str(args.termAnalysis)) 
+
+	# set AND NOT clause analysis mode from cmd line
+	co.set('DEFAULT','ClauseAnalysis',str(args.clauseAnalysis)) 
+
+	# set precision estimation mode from cmd line
+	co.set('DEFAULT','Estimate',str(args.estimate)) 
+
+	# set local corpus mode from cmd line
+	co.set('DEFAULT','CorpusMode',args.corpusMode) 
+
+	# update years from cmd line
+	if argdict.has_key('years'):
+	    co.set('DEFAULT', 'Year', argdict['years'][0] )
+	    co.set('DEFAULT', 'Years',
+				string.join(argdict['years'],YEARDELIM) )
 
 	# update numFalsePositives from cmd line
 	if argdict.has_key('numFalsePositives'):
@@ -175,35 +227,44 @@ class TcLabelHandler (object):
 	return "Triage Category: " + abbrev
 # end class TcLabelHandler ------------------------
 
-class Processor (object): # [
-
+class JournalCompRun (object): # [
+    ''' A JournalCompRun is the top level object for a run of this program.
+	Handles the args and config, sets up the things shared by all the
+	years being analyzed (journals, triage categories, templates),
+	runs a Processor for each year (concurrently) and writes the run
+	summary page.
+    '''
     def __init__(self):
 
 	self.config = ArgParser().handleArgsAndConfig()
 
-	self.mgiRefs = MgiRefs( self.config.get('MGIReferences','filename') )
-
-	self.sd = self.initSciDirectConnection()
+	self.years = self.initYears()
 
 	self.journals = self.initSciDirectJournals()
 	print "%d Journals" % len(self.journals)
 
 	self.triageCategories = self.initTriageCategories()
-	self.nonExactJournals = {} 	# set in self.getSciDirectResults()
 
-	# output files for triage category None
-	self.sdAllResultsWriter = None	# all SD results across all journals
-	self.sdFalseNegsWriter = None	# false neg rslts across all journals
+	self.resultCache = self.initResultCache()
 
-	# jinja2 template stuff
-	tmpltDir = self.config.get('DEFAULT','TemplateDir')
-	self.jinja2Env = Environment( loader=FileSystemLoader(tmpltDir),
-							    trim_blocks=True)
+	# jinja2 templates for the report pages
+	self.templateDir = self.config.get('DEFAULT','TemplateDir')
 
-	self.process()
+	self.run()
 	return
     # end __init__() -------------------------------
 
+    def initYears(self):
+	'''
+	Return list of years (strings) to analyze, in order.
+	'''
+	years = [ self.config.get('DEFAULT', 'Year') ]
+	if self.config.has_option('DEFAULT', 'Years'):
+	    years = [ y.strip() for y in
+		    self.config.get('DEFAULT', 'Years').split(YEARDELIM) ]
+	return sorted( set(years) )
+    # end initYears() -------------------------------
+
     def initTriageCategories(self,):
 	'''
 	Return list TriageCategories to process.
@@ -233,34 +294,14 @@ class Processor (object): # [
 	return tcList
     # end initTriageCategories() -------------------------------
 
-    def initSciDirectConnection(self):
-
-	sd = ElsevierSciDirect()
-	section = 'SciDirect'
-
-	# compute start and end dates from 'Year'
-	year = self.config.getint(section, 'Year')
-	startDate = "%d1231" % (year-1)
-	endDate = "%d0101" % (year+1)
-	#print "StartDate '%s'    EndDate '%s'" % (startDate, endDate)
-
-	sd.setStartDate( startDate)
-	sd.setEndDate  ( endDate)
-
-	sd.setContent  ( self.config.get(section, 'Content') )
-	sd.setSubscribed( self.config.getboolean( section, 'Subscribed') )
-	sd.setDebug     ( self.config.getboolean( section, 'Debug') )
-
-	return sd
-    # end initSciDirectConnection() -------------------------------
-
     def initSciDirectJournals(self):
 	'''
 	Return list of SciDirectJournal objects to process.
 	'''
 	section = 'Journals'
 	filename = self.config.get(section, 'filename')
-	journalList = SciDirectJournal.initSciDirectJournals(filename)
+	self.journalRegistry = JournalRegistry.fromFile(filename)
+	journalList = self.journalRegistry.getJournals()
 
 	journalSubList = []
 	if self.config.has_option(section, 'journalSubList') \
@@ -271,142 +312,686 @@ class Processor (object): # [
 	if journalSubList != []:		# filter by this list of names
 	    return [x for x in journalList if x.getMgiJname() in journalSubList]
 	else:
-	    return SciDirectJournal.getTriagedJournals()
+	    return self.journalRegistry.getTriagedJournals()
     # end initSciDirectJournals() -------------------------------
 
-    def process( self):
+    def initResultCache(self):
+	'''
+	Return ResultCache for SciDirect query results, shared by all years.
+	'''
+	section = 'SciDirect'
+	cacheDir = None
+	if self.config.has_option(section, 'cacheDir'):
+	    cacheDir = self.config.get(section, 'cacheDir')
+	return ResultCache(cacheDir)
+    # end initResultCache() -------------------------------
+
+    def getOutputDir(self, year):
+	''' Return the output directory for the given year (string).
+	    If OutputDir does not vary by year (e.g., it was set by -o) and
+	    we are doing several years, each year gets a subdirectory.
+	'''
+	outputDir = self.config.get('DEFAULT', 'OutputDir', vars={'year':year})
+	if len(self.years) > 1 and outputDir == \
+		    self.config.get('DEFAULT', 'OutputDir', vars={'year':''}):
+	    outputDir = os.path.join( outputDir, year)
+	if not os.path.isdir(outputDir):
+	    os.makedirs(outputDir)
+	return outputDir
+    # end getOutputDir() -------------------------------
+
+    def getSummaryDir(self):
+	''' Return the directory to write the run summary to (string).
+	    For a single year, this is that year's output directory.
+	'''
+	if len(self.years) == 1:
+	    return self.getOutputDir( self.years[0])
+	label = "%s-%s" % (self.years[0], self.years[-1])
+	summaryDir = self.config.get('DEFAULT', 'OutputDir', vars={'year':label})
+	if not os.path.isdir(summaryDir):
+	    os.makedirs(summaryDir)
+	return summaryDir
+    # end getSummaryDir() -------------------------------
+
+    def run( self):
+	''' Run a Processor for each year (concurrently) and write the
+	    run summary and detail pages.
+	'''
+	processors = parallelMap( self.runYear, self.years,
+						numThreads=len(self.years) )
+
+	if self.config.getboolean('DEFAULT', 'TermAnalysis') or \
+	    self.config.getboolean('DEFAULT', 'ClauseAnalysis') or \
+	    self.config.getboolean('DEFAULT', 'Estimate') or \
+	    self.config.get('DEFAULT', 'CorpusMode') in ['build', 'compare']:
+	    return			# no run summary for these
+
+	ciLabel = self.computeIntervals( [ p.getResults() for p in processors ])
+
+	self.dataRangler = DisplayDataRangler( \
+			[ (p.getYear(), p.getResults()) for p in processors ],
+			ciLabel=ciLabel)
+	self.writeReport( processors)
+    # end run() --------------------------------
+
+    def writeReport( self, processors):
+	''' Write the report pages: the run summary (for all the years) and,
+	    in each year's output directory, a page for each triage category
+	    and for each (triage category, journal).
+	    The pages are rendered in a process pool, each streamed to its
+	    file, from the template data we gather here.
+	'''
+	start = time.time()
+	summaryDir = self.getSummaryDir()
+	indexPathName = os.path.join(summaryDir, 'index.html')
+	numFalsePositives = self.config.getint('HTML Output',
+							'numFalsePositives')
+	numFalseNegatives = self.config.getint('HTML Output',
+							'numFalseNegatives')
+	processes = 4
+	if self.config.has_option('HTML Output', 'processes'):
+	    processes = self.config.getint('HTML Output', 'processes')
+
+	pages = []			# (template, data, filename) for each
+	tcLinks = {}			# dict[(year, tc name)] = link from the
+					#   summary to the tc page
+	for p in processors:
+	    year = p.getYear()
+	    results = p.getResults()
+	    summaryLink = os.path.relpath(indexPathName, p.outputDir)
+	    for tc in results.triageCategories:
+		tcFile = pageFilename('category', tc.getName())
+		tcLinks[ (year, tc.getName()) ] = os.path.relpath( \
+				os.path.join(p.outputDir, tcFile), summaryDir)
+		journalLinks = {}	# dict[journal] = journal page file
+		for j in results.getJournals():
+		    jFile = pageFilename('journal', tc.getName(),
+							    j.getMgiJname())
+		    journalLinks[j] = jFile
+		    pages.append( ('journal.html',
+			self.dataRangler.getJournalPageData(year, results, tc,
+				j, numFalsePositives, numFalseNegatives, tcFile),
+			os.path.join(p.outputDir, jFile) ) )
+		pages.append( ('category.html',
+			self.dataRangler.getTcPageData(year, results, tc,
+						journalLinks, summaryLink),
+			os.path.join(p.outputDir, tcFile) ) )
+	pages.insert(0, ('runSummary.html',
+			self.dataRangler.getRunSummaryData(tcLinks),
+			indexPathName) )
 
-	self.results = PRresults(self.triageCategories, self.journals)
-	self.dataRangler = DisplayDataRangler( self.results)
+	print "Writing RunSummary to %s" % indexPathName
+	n = renderPages( self.templateDir, pages, processes)
+	print "Report: %d pages rendered in %.2f secs" % (n,
+							time.time() - start)
+    # end writeReport() --------------------------------
 
-	for self.tc in self.triageCategories:
-	    self.processTc()
+    def getBootstrapOption(self, option, default):
+	''' Return [Bootstrap] config option value (string), or default
+	'''
+	section = 'Bootstrap'
+	if self.config.has_section(section) and \
+				self.config.has_option(section, option):
+	    return self.config.get(section, option)
+	return default
+    # end getBootstrapOption() --------------------------------
+
+    def computeIntervals( self,
+		resultsList	# list of PRresults, one per year
+	):
+	''' Compute bootstrap confidence intervals for precision and recall
+	    of each triage category in each year, all at once in a process
+	    pool, and set them in the PRresults.
+	    Return heading for the intervals, like "95% CI", '' if none.
+	'''
+	numSamples = int( self.getBootstrapOption('samples', '1000') )
+	if numSamples <= 0: return ''
+	confidence = float( self.getBootstrapOption('confidence', '0.95') )
+	start = time.time()
+	tasks = []
+	targets = []			# (PRresults, tc) for each task
+	for results in resultsList:
+	    for tc in results.triageCategories:
+		tasks.append( (results.getBootstrapStrata(tc), numSamples,
+						    confidence, len(tasks)) )
+		targets.append( (results, tc) )
+	intervals = bootstrapMany( tasks,
+		    int( self.getBootstrapOption('processes', '4') ) )
+	for ( (results, tc), i) in zip(targets, intervals):
+	    results.getTcOverallResults(tc).setIntervals(i)
+	print "Bootstrap intervals for %d categories computed in %.2f secs" %\
+					    (len(tasks), time.time() - start)
+	return "%g%% CI" % (100 * confidence)
+    # end computeIntervals() --------------------------------
+
+    def runYear( self, year):
+	''' Process one year. Runs in its own thread.
+	    Return the Processor for the year.
+	'''
+	p = Processor( self.config, year, self.getOutputDir(year),
+				    self.journals, self.triageCategories,
+				    showYear=(len(self.years) > 1),
+				    journalRegistry=self.journalRegistry)
+	corpusMode = self.config.get('DEFAULT', 'CorpusMode')
+	if self.config.getboolean('DEFAULT', 'TermAnalysis'):
+	    TermAnalyzer( p, self.resultCache).analyze()
+	elif self.config.getboolean('DEFAULT', 'ClauseAnalysis'):
+	    ClauseAnalyzer( p, self.resultCache).analyze()
+	elif self.config.getboolean('DEFAULT', 'Estimate'):
+	    PrecisionEstimator( p).estimate()
+	elif corpusMode == 'build':
+	    CorpusTool( p).build()
+	elif corpusMode == 'compare':
+	    CorpusTool( p).compareCounts()
+	else:
+	    p.process()
+	return p
+    # end runYear() --------------------------------
 
-	# render summary page using self.results
-	t = self.jinja2Env.get_template('runSummary.html')
-	d = self.dataRangler.getRunSummaryData()
-	indexPathName = "%s/index.html" % self.config.get('DEFAULT','OutputDir')
-	print "Writing RunSummary to %s" % indexPathName
-	fp = open(indexPathName, 'w')
-	fp.write( t.render(d) )
-	fp.close()
-    # end process() --------------------------------
+# end class JournalCompRun ----------------------------------- ]
 
-    def processTc(self):
-	print "Triage Category: %s\nSciDirect query:\n'%s'" % \
-		    (self.tc.getDisplayName(), self.tc.getSdQueryString())
+class Processor (object): # [
+    ''' A Processor runs the SciDirect queries for each triage category
+	and journal for one year and compares the results to the MGI
+	references for that year.
+	The config, journals and triage categories are shared (read only)
+	with the Processors for other years in the run.
+    '''
+    def __init__(self,
+		config,		# ConfigParser object for the run
+		year,		# string, year to analyze
+		outputDir,	# string, output directory for this year
+		journals,	# list of SciDirectJournals
+		triageCategories, # list of TriageCategory objs
+		showYear=False,	# True => include year in console output
+		journalRegistry=None # JournalRegistry the journals are from,
+				#   None => one for just the journals
+		):
+	self.config = config
+	self.year = year
+	self.outputDir = outputDir
+	self.journals = journals
+	if journalRegistry == None: journalRegistry = JournalRegistry(journals)
+	self.journalRegistry = journalRegistry
+	self.triageCategories = triageCategories
+	self.showYear = showYear
+
+	self.mgiRefs = self.initMgiRefs()
+	self.refResolver = RefResolver( self.mgiRefs) # shared by all tcs
+
+	self.corpusIndex = None		# CorpusIndex for local queries
+	if self.config.get('DEFAULT', 'CorpusMode') in ['use', 'compare']:
+	    self.corpusIndex = self.initCorpusIndex()
 
-	for j in self.journals:
-	    jPRStats = self.processJournal( j)
+	self.sd = self.initSciDirectConnection()
+	self.connections = threading.local()	# SciDirect connection for
+						#   each worker thread
+
+	self.nonExactJournals = {} 	# set in self.processJournal()
+	self.progress = None		# ProgressTracker, set in self.process()
+	self.unitCounts = {}		# dict[(tc,j)] = SciDirect count from
+					#   count probes, see self.probeCounts()
+	self.earlyStops = {}		# dict[(tc,j)] = (num results fetched,
+					#   SciDirect count) for queries we
+					#   stopped paging early
+	self.rankCutoffs = [ int(k) for k in
+		    self.getRankedOption('cutoffs', '').split(',') if k.strip() ]
+	self.prCurveWriter = None	# PR curve file, see outputRankedStats()
 
-	    self.results.addJournalResults(self.tc, j, jPRStats)
+	# output files for triage category None
+	self.sdAllResultsWriter = None	# all SD results across all journals
+	self.sdFalseNegsWriter = None	# false neg rslts across all journals
+	self.sdFalsePosWriter = None	# false pos rslts across all journals
+	return
+    # end __init__() -------------------------------
+
+    def initMgiRefs(self):
+	''' Return MgiRefs for our year
+	'''
+	section = 'MGIReferences'
+	storage = 'tabledataset'
+	snapshotCheck = 'mtime'
+	if self.config.has_option(section, 'storage'):
+	    storage = self.config.get(section, 'storage')
+	if self.config.has_option(section, 'snapshotCheck'):
+	    snapshotCheck = self.config.get(section, 'snapshotCheck')
+	if storage == 'sqlite':
+	    filename = self.configGet(section, 'sqliteFile')
+	else:
+	    filename = self.configGet(section, 'filename')
+	return MgiRefs( filename, storage, snapshotCheck)
+    # end initMgiRefs() -------------------------------
+
+    def configGet(self, section, option):
+	''' Return config option value (string) for this Processor's year
+	    and output directory.
+	'''
+	return self.config.get(section, option,
+			vars={'year' : self.year, 'outputdir' : self.outputDir})
+    # end configGet() -------------------------------
+
+    def getYear(self):
+	return self.year
+
+    def getResults(self):
+	return self.results
+
+    def isLocal(self):
+	''' Return True if our queries are answered from the local corpus
+	'''
+	return self.config.get('DEFAULT', 'CorpusMode') == 'use'
+
+    def initCorpusIndex(self):
+	''' Return CorpusIndex for the local article corpus for our year
+	'''
+	filename = self.configGet('SciDirect', 'corpusFile')
+	print "Loading corpus %s%s" % (filename, self.yearLabel())
+	index = CorpusIndex( loadCorpus(filename) )
+	print "%d articles in corpus%s" % (index.getNumArticles(),
+							    self.yearLabel())
+	return index
+    # end initCorpusIndex() -------------------------------
+
+    def initSciDirectConnection(self,
+			local=None	# True => query the local corpus,
+					# False => query SciDirect,
+					# None => local if self.isLocal()
+			):
+	if local == None: local = self.isLocal()
+	if local:
+	    sd = LocalSciDirect(self.corpusIndex)
+	else:
+	    sd = SciDirectConnection()
+	section = 'SciDirect'
+
+	# compute start and end dates from our year
+	year = int(self.year)
+	startDate = "%d1231" % (year-1)
+	endDate = "%d0101" % (year+1)
+	#print "StartDate '%s'    EndDate '%s'" % (startDate, endDate)
 
-	#self.outputPRStats( self.tcPRStats, "Totals Across All Journals")
+	sd.setStartDate( startDate)
+	sd.setEndDate  ( endDate)
 
-	# render Triage category page using self.results
-	#self.tcHtmlPage.endJournals()
-	#self.tcHtmlPage.addTcSummary(self.tc, self.tcPRStats, self.journals)
-	#tcPathName = "%s/category_%s.html" % \
-	#	(self.config.get('DEFAULT', 'OutputDir'), self.tc.getName())
-	#self.tcHtmlPage.write( tcPathName)
+	sd.setContent  ( self.config.get(section, 'Content') )
+	sd.setSubscribed( str( self.config.getboolean( section,
+						    'Subscribed') ).lower() )
+	subjects = ''			# all subjects
+	if self.config.has_option(section, 'Subjects'):
+	    subjects = self.config.get(section, 'Subjects')
+	sd.setSubjects  ( subjects)
+	if self.config.getboolean( section, 'Debug'):
+	    sd.setDebugWriter( sys.stdout.write)
+	sd.setApiCallback( self.apiCall)	# counts each page fetched
 
-    # end processTc() --------------------------------
+	return sd
+    # end initSciDirectConnection() -------------------------------
 
-    def processJournal( self, j):
+    def getThreadConnection(self):
+	''' Return a SciDirect connection for the current thread, for when
+	    several threads are making SciDirect calls for us.
+	'''
+	if not hasattr(self.connections, 'sd'):
+	    self.connections.sd = self.initSciDirectConnection()
+	return self.connections.sd
+
+    def getApiThreads(self):
+	''' Return the max number of concurrent SciDirect API calls to make
+	'''
+	section = 'SciDirect'
+	if self.config.has_option(section, 'apiThreads'):
+	    return self.config.getint(section, 'apiThreads')
+	return 4
 
-	self.outputJournalHeader( j)
+    def process( self):
+
+	self.results = PRresults(self.triageCategories, self.journals)
+	self.results.setGoldCounts( GoldCountCube(self.mgiRefs) )
+
+	# Each unit of work is a (triage category, journal) pair.
+	# SciDirect results for the next unit are fetched in a background
+	#   thread while we match/report the current unit's results.
+	units = [ (tc, j) for tc in self.triageCategories
+						for j in self.journals ]
+	self.progress = self.initProgress( units)
+	if self.getProgressOption('probeCounts', 'true').lower() == 'true':
+	    self.probeCounts( units)
+
+	pipeline = FetchPipeline( units, self.fetchUnit,
+					maxQueued=self.getFetchAhead() )
+	self.tc = None
+	for ( (tc, j), (sdResults, nonExactJournals) ) in pipeline:
+	    if tc != self.tc:		# starting a new triage category
+		self.tc = tc
+		self.outputTcHeader()
+
+	    jPRStats = self.processJournal( j, sdResults, nonExactJournals)
 
-	sdResults = self.getSciDirectResults(j)
+	    self.results.addJournalResults(self.tc, j, jPRStats)
+	    self.progress.unitDone( (tc, j) )
 
-	goldResults = self.getGoldResults( j)
+	self.outputResolverStats()
+	self.progress.finish()
+	# the HTML pages for self.results are written by
+	#   JournalCompRun.writeReport(), w/ the other years'
+    # end process() --------------------------------
 
-	pr = PrecisionRecallCalculator( sdResults, goldResults,
-			self.sdRef2MgiRef, goldKey=self.gold2key).calculate()
+    def getFetchAhead(self):
+	''' Return the max number of (tc, journal) query results to fetch
+	    ahead of the results we are currently processing.
+	'''
+	section = 'SciDirect'
+	if self.config.has_option(section, 'fetchAhead'):
+	    return self.config.getint(section, 'fetchAhead')
+	return 2
+    # end getFetchAhead() --------------------------------
 
-	self.outputResultsDumps( sdResults, pr)
-	self.outputNonExactJournals( )
+    def getProgressOption(self, option, default):
+	''' Return [Progress] config option value (string), or default
+	'''
+	section = 'Progress'
+	if self.config.has_section(section) and \
+				self.config.has_option(section, option):
+	    return self.configGet(section, option)
+	return default
+    # end getProgressOption() --------------------------------
+
+    def getRankedOption(self, option, default):
+	''' Return [Ranked Metrics] config option value (string), or default
+	'''
+	section = 'Ranked Metrics'
+	if self.config.has_section(section) and \
+				self.config.has_option(section, option):
+	    return self.configGet(section, option)
+	return default
+    # end getRankedOption() --------------------------------
+
+    def initProgress(self, units):
+	''' Return ProgressTracker for processing the units
+	'''
+	progressFile = self.getProgressOption('progressFile', '')
+	if progressFile == '': progressFile = None
+	return ProgressTracker( self.year, len(units), progressFile,
+		float( self.getProgressOption('updateInterval', '2') ) )
+    # end initProgress() --------------------------------
+
+    def probeCounts(self, units):
+	''' Get SciDirect counts for all the units, concurrently, so the
+	    ProgressTracker can predict how much is left to fetch.
+	    Later fetches use these counts instead of probing again, so
+	    this costs no extra API calls.
+	'''
+	def probe(unit):
+	    (tc, j) = unit
+	    return self.getSciDirectCount(tc, j, self.getThreadConnection())
+
+	with self.progress.phase('probe'):
+	    counts = parallelMap( probe, units, self.getApiThreads() )
+	for (unit, n) in zip(units, counts):
+	    self.unitCounts[unit] = n
+	    self.progress.setExpected(unit, n)
+    # end probeCounts() --------------------------------
+
+    def apiCall(self):
+	''' Note that we made a SciDirect API call. Our SciDirect connections
+	    call this for each call they make (see initSciDirectConnection())
+	'''
+	if self.progress != None: self.progress.apiCall()
 
-	header = "Totals for %s" % j.getMgiJname()
-	self.outputPRStats( pr, header)
-	self.outputFalseNegatives( j) # JIM think about params
-	self.outputFalsePositives( j)
+    def outputResolverStats(self):
+	''' Report how often SciDirect articles were matched to MGI refs
+	    from the RefResolver's cache (i.e., seen in an earlier tc)
+	'''
+	rr = self.refResolver
+	self.progress.setStat('refResolverHits', rr.getNumHits())
+	self.progress.setStat('refResolverMisses', rr.getNumMisses())
+	self.progress.setStat('refResolverHitRate', round(rr.getHitRate(), 3))
+	print "\nReference matching%s: %d articles matched, %d from cache " \
+		"(%4.1f%%)" % (self.yearLabel(), rr.getNumHits() +
+		rr.getNumMisses(), rr.getNumHits(), 100 * rr.getHitRate())
+    # end outputResolverStats() --------------------------------
+
+    def outputTcHeader(self):
+	print "Triage Category: %s%s\nSciDirect query:\n'%s'" % \
+		    (self.tc.getDisplayName(), self.yearLabel(),
+						self.tc.getSdQueryString())
+
+    # end outputTcHeader() --------------------------------
+
+    def fetchUnit( self, unit	# (TriageCategory, SciDirectJournal) pair
+	):
+	''' Fetch the SciDirect results for one unit of work.
+	    Runs in the FetchPipeline's producer thread, so this should only
+	    touch self.sd and not any state used by processJournal().
+	'''
+	(tc, j) = unit
+	with self.progress.phase('fetch'):
+	    (results, nonExactJournals) = self.getSciDirectResults( tc, j,
+			sdNumPubsJW=self.unitCounts.get(unit), earlyStop=True)
+	self.progress.fetched( unit,
+			len(results) + sum(nonExactJournals.values()) )
+	return (results, nonExactJournals)
+    # end fetchUnit() --------------------------------
+
+    def processJournal( self, j, sdResults, nonExactJournals):
+
+	self.nonExactJournals = nonExactJournals
+
+	with self.progress.phase('match'):
+	    goldResults = self.getGoldResults( j)
+
+	with self.progress.phase('PR'):
+	    # the results are matched a page at a time as the P/R consumes
+	    #   them. Keep just the counts and the false positives/negatives
+	    #   we display, all of them go to the dump files
+	    flags = None		# isPositive flags, for ranked metrics
+	    if self.rankCutoffs: flags = array('b')
+	    pr = StreamingPrecisionRecall(
+		    self.matchedResults( sdResults, j, flags), goldResults,
+		    None, goldKey=self.gold2key,
+		    maxFalsePositives=self.config.getint('HTML Output',
+							'numFalsePositives'),
+		    maxFalseNegatives=self.config.getint('HTML Output',
+							'numFalseNegatives'),
+		    falsePositiveSink=self.getFalsePosSink(),
+		    falseNegativeSink=self.getFalseNegsSink() )
+	    pr.calculate()
+
+	    ranked = None		# ranked metrics, if we want them
+	    if self.rankCutoffs:
+		ranked = RankedPrecisionRecall( pr.getNumGoldPositives() )
+		ranked.addPage(flags)
+
+	with self.progress.phase('render'):
+	    self.outputJournalHeader( j)
+	    self.outputResultsDumps( sdResults)
+	    self.outputNonExactJournals( )
+
+	    header = "Totals for %s" % j.getMgiJname()
+	    self.outputPRStats( pr, header)
+	    self.outputRankedStats( j, ranked)
+	    self.outputFalseNegatives( j) # JIM think about params
+	    self.outputFalsePositives( j)
 
 	return pr
     # end processJournal() --------------------------------
 
-    def getSciDirectResults(self, j):
-	''' Return list of SciDirectResults for the given journal and
-	       self.tc TriageCategory.
-	    Also set self.nonExactJournals for any articles returned
-	      by the query that match journal names by words, but are not
-	      exact matches.
+    def getJournalQuery(self, tc, j):
+	''' Return the SciDirect query string for the given TriageCategory
+	    and journal.
 	'''
 	# query SciDirect query string for this triage category
-	qstring = self.tc.getSdQueryString()
+	qstring = tc.getSdQueryString()
 	# add journal name
 	jname = j.getSdJname().replace("&", " ")	# SciDirect bungles &
-	qstring = ( 'srctitle("%s") AND\n' % jname ) + qstring
-
-	self.sd.setQuery(qstring)
+	return ( 'srctitle("%s") AND\n' % jname ) + qstring
+    # end getJournalQuery() ----------------------------
+
+    def getSciDirectCount(self, tc, j,
+			    sd=None	# connection to use, self.sd if None
+	):
+	''' Return the number of SciDirect results for the given journal and
+	    TriageCategory. This counts all pubs matching the journal words,
+	    so it is an upper bound on the number of results for the journal.
+	'''
+	if sd == None: sd = self.sd
+	sd.setQuery( self.getJournalQuery(tc, j) )
+	try:
+	    return sd.doCount()
+	except urllib2.URLError, e:
+	    raise JournalCompError( "SciDirect count failed: %s\nQuery: %s" % \
+							    (e, sd.qstring) )
+    # end getSciDirectCount() ----------------------------
+
+    def doSciDirectQuery(self, sd,
+			    numToGet,	# max num of results to get
+			    startIndex=0, # index of 1st result to get
+			    pageCallback=None, # see sd.doQuery()
+			    numResults=None # total num of results if known
+	):
+	''' Return (total num of results, list of result records) for sd's
+	    query. Raise JournalCompError if the query fails.
+	    (sd counts the API calls, one per page, see
+	    initSciDirectConnection())
+	'''
+	try:
+	    return sd.doQuery( numToGet=numToGet, startIndex=startIndex,
+			pageCallback=pageCallback, numResults=numResults)
+	except urllib2.URLError, e:
+	    raise JournalCompError( "SciDirect query failed: %s\nQuery: %s" % \
+							    (e, sd.qstring) )
+    # end doSciDirectQuery() ----------------------------
+
+    def getSciDirectResults(self, tc, j,
+			    sd=None,	# connection to use, self.sd if None
+			    sdNumPubsJW=None, # count from an earlier count probe
+					#   None => probe now
+			    earlyStop=False, # True => stop paging when recall
+					#   plateaus, if [Ranked Metrics] says
+			    startIndex=0, # index of 1st result to get
+			    numToGet=None # num of results to get from
+					#   startIndex, None => all
+	):
+	''' Return list of SciDirectResults for the given journal and
+	       TriageCategory, and a dict of nonExactJournals for any articles
+	       returned by the query that match journal names by words, but
+	       are not exact matches.
+	    Returns (results, nonExactJournals)
+	'''
+	if sd == None: sd = self.sd
 
-	sdNumPubsJW = self.sd.doCount() # num of pubs matching journal words
-					#   is upper bound on num Refs
+	if sdNumPubsJW == None:
+	    sdNumPubsJW = self.getSciDirectCount(tc, j, sd)
+				# num of pubs matching journal words
+				#   is upper bound on num Refs
+	else:
+	    sd.setQuery( self.getJournalQuery(tc, j) )
 
-	self.nonExactJournals = {}	# dict w/ keys being journal names
+	nonExactJournals = {}		# dict w/ keys being journal names
 				    #  from SciDirect that match our journal
 				    #  words, but not the journal title.
 				    # So we can report these.
 				    # nonExactJournals[x] = num of refs w/
 				    #			    journalname x
-	data = self.sd.doQuery( maxrslts=sdNumPubsJW)
-	if type(data) == type("string"):	# had error
-	    raise JournalCompError( data)
-
+	if numToGet == None: numToGet = sdNumPubsJW - startIndex
+	pageCallback = None
+	window = int( self.getRankedOption('earlyStopWindow', '0') )
+	if earlyStop and window > 0:
+	    pageCallback = self.getEarlyStopCallback(tc, j, window)
+	(total, data) = self.doSciDirectQuery( sd, numToGet, startIndex,
+				    pageCallback, numResults=sdNumPubsJW)
+	if pageCallback != None and \
+				len(data) < min(numToGet, total - startIndex):
+	    self.earlyStops[ (tc, j) ] = (len(data), total)
+
+	classifier = self.journalRegistry.getClassifier()
 	results = []
 	for sdRef in data:		# for each pub returned from SciDirect
 
 	    sdJournal = sdRef['journal']
-	    if  j.isSdJname( sdJournal ):	# have journal name match
+	    if classifier.classify( sdJournal ) is j: # have journal name match
 		results.append(sdRef)
 	    else:				# no journal name match
-		self.nonExactJournals[ sdJournal ] = \
-			self.nonExactJournals.get( sdJournal, 0) +1
+		nonExactJournals[ sdJournal ] = \
+			nonExactJournals.get( sdJournal, 0) +1
 
 	#print "Scidirect query: %d results" % len(results)
-	return results
+	return (results, nonExactJournals)
 
     # end getSciDirectResults() ----------------------------
 
-    def getGoldResults(self, j):
-	goldResults = []
+    def getEarlyStopCallback(self, tc, j,
+			    window	# see RankedPrecisionRecall.isPlateaued()
+	):
+	''' Return pageCallback for doQuery() that stops paging the results
+	    for tc and j once they stop finding true positives.
+	    Runs in the fetch thread, so it matches against self.mgiRefs
+	    directly rather than going through the refResolver.
+	'''
+	ranked = RankedPrecisionRecall( len(
+			    self.mgiRefs.getMgiRefsByTriageCategory(j, tc) ) )
+	def isPositive(sdRef):
+	    mgiRef = self.mgiRefs.matchRefsByIds( [sdRef], j)[0]
+	    return mgiRef != None and \
+			self.mgiRefs.refInTriageCategory(mgiRef, tc)
+	return ranked.makePageCallback( isPositive, window,
+		    int( self.getRankedOption('earlyStopMinGain', '1') ) )
+    # end getEarlyStopCallback() ----------------------------
 
-	for r in self.mgiRefs.getMgiRefsByJournal( j):
-	    if self.mgiRefs.refInTriageCategory(r, self.tc):
-		goldResults.append(r)
+    def getGoldResults(self, j):
+	goldResults = self.mgiRefs.getMgiRefsByTriageCategory( j, self.tc)
 	#print "GoldResults: %d" % len(goldResults)
 	return goldResults
     # end getGoldResults() ----------------------------
 
-    def sdRef2MgiRef( self, sdRef):
+    def sdRef2MgiRef( self, sdRef, j=None):
 	''' For the current self.tc,
-		match the sdRef against MGI refs.
+		match the sdRef (from Journal j) against MGI refs.
 	    Return the matching MGI ref record if one matches,
 	    Return None if no match
 	'''
-	mgiRef = self.mgiRefs.matchRefById( 'DOI', sdRef['DOI'])
-	if mgiRef == None:		# not found by DOI
-	    mgiRef = self.mgiRefs.matchRefById( 'pubmed', sdRef['pubmed'])
-	    if mgiRef == None:		# not found by pubmed ID
-		return None
+	mgiRef = self.refResolver.resolve( sdRef, j) # DOI, pubmed, or
+	if mgiRef == None:			  # journal/vol/page match,
+	    return None				  #  remembered across tcs
 
-	# have a reference that matched by DOI or pubmed, check tc
-	# if mgiRef.tc is wrong: return None # use self.tc
+	# have a matching reference, check tc
 	if self.mgiRefs.refInTriageCategory(mgiRef, self.tc):
 	    return mgiRef
 	else:
 	    return None
     # end sdRef2MgiRef() ------------------------------------
 
+    def sdRefs2MgiRefs( self, sdRefs, j=None):
+	''' For the current self.tc,
+		match a list of sdRefs (from Journal j) against MGI refs, all
+		at once.
+	    Return list of the matching MGI ref records (None for no match)
+	'''
+	matches = self.refResolver.resolveAll( sdRefs, j)
+	for i in range(len(matches)):
+	    if matches[i] != None and \
+		not self.mgiRefs.refInTriageCategory(matches[i], self.tc):
+		matches[i] = None
+	return matches
+    # end sdRefs2MgiRefs() ------------------------------------
+
+    def matchedResults( self, sdResults, j,
+			flags=None	# array, if given, we append isPositive
+					#  for each result
+	):
+	''' Generate (sdResult, matching MGI ref or None) for the SciDirect
+	    results from Journal j, matching them (sdRefs2MgiRefs()) a page
+	    of self.sd.bufferSize at a time as they are consumed.
+	'''
+	pageSize = self.sd.bufferSize
+	for start in xrange(0, len(sdResults), pageSize):
+	    page = sdResults[start:start+pageSize]
+	    matches = self.sdRefs2MgiRefs( page, j)
+	    if flags != None: flags.extend( [ m != None for m in matches ] )
+	    for pair in zip(page, matches):
+		yield pair
+    # end matchedResults() ------------------------------------
+
     def gold2key(self, g):
 	'''
 	Given a goldstd MgiRef object,
@@ -415,29 +1000,104 @@ class Processor (object): # [
 	'''
 	return g['Jnum']
 
+    def resultKey(self, sdRef, j=None):
+	''' Return a hashable key for a SciDirect result: the gold key of the
+	    MGI ref it matches (in any triage category), else its DOI.
+	    So a result is a true positive iff its key is in the gold keys.
+	'''
+	mgiRef = self.refResolver.resolve( sdRef, j)
+	if mgiRef != None:
+	    return self.gold2key(mgiRef)
+	return sdRef['DOI'].lower()
+
     def outputJournalHeader( self, j):
 
-	print "----------------------"
-	print "Journal: '%s',  SciDirect: '%s' for %s" % \
-	    ( j.getMgiJname(), j.getSdJname(), self.tc.getDisplayName() )
+	print "----------------------\n" + \
+	    "Journal: '%s',  SciDirect: '%s' for %s%s" % \
+	    ( j.getMgiJname(), j.getSdJname(), self.tc.getDisplayName(),
+							self.yearLabel() )
 	sys.stdout.flush()
     # end outputJournalHeader() -----------------------------
 
     def outputPRStats(self, pr, header):
-	print
-	print "%s; category: %s" % (header, self.tc.getDisplayName())
-	print \
+	lines = [ '' ]		# build lines & print at once so output from
+				#  concurrent years does not interleave
+	lines.append( "%s; category: %s%s" % \
+			(header, self.tc.getDisplayName(), self.yearLabel()) )
+	lines.append( \
 "MGI Pubs (Gold positives): %d;  SciDirect Results: %d;  TruePositives: %d" \
 	    % (pr.getNumGoldPositives(),
 	       pr.getNumResults(),
-	       pr.getNumTruePositives())
+	       pr.getNumTruePositives()) )
+	prLine = ''
 	if pr.precisionIsDefined():
-	    print "Precision  %4.2f     " % ( pr.getPrecision()) , 
+	    prLine += "Precision  %4.2f      " % ( pr.getPrecision())
 	if pr.recallIsDefined():
-	    print "Recall %4.2f" % (pr.getRecall()) ,
-	print
+	    prLine += "Recall %4.2f" % (pr.getRecall())
+	lines.append( prLine)
+	print string.join(lines, '\n')
     # end outputPRStats() -----------------------------
 
+    def outputRankedStats(self, j,
+			    ranked	# RankedPrecisionRecall, None if we
+					#   don't have ranked metrics
+	):
+	lines = []
+	if self.earlyStops.has_key( (self.tc, j) ):
+	    lines.append( "Stopped paging early (recall plateaued): " \
+		    "fetched %d of %d results" % self.earlyStops[ (self.tc, j) ])
+	if ranked != None:
+	    parts = []
+	    if ranked.recallIsDefined():
+		parts.append( "Average precision %4.2f" % \
+						ranked.getAveragePrecision() )
+	    for k in self.rankCutoffs:
+		s = "P@%d %4.2f" % (k, ranked.getPrecisionAt(k))
+		if ranked.recallIsDefined():
+		    s += " R@%d %4.2f" % (k, ranked.getRecallAt(k))
+		parts.append(s)
+	    lines.append( string.join(parts, ';  ') )
+	    self.writePRCurve(j, ranked)
+	if lines:
+	    print string.join(lines, '\n')
+    # end outputRankedStats() -----------------------------
+
+    def writePRCurve(self, j, ranked):
+	''' Write the PR curve for the current tc and journal to the
+	    prCurveFile, if there is one
+	'''
+	if self.prCurveWriter == None:
+	    filename = self.getRankedOption('prCurveFile', '')
+	    if filename == '': return
+	    self.prCurveWriter = open(filename, 'w')
+	    self.prCurveWriter.write( string.join( ['category', 'journal',
+			'rank', 'precision', 'recall'], '\t') + '\n')
+	for (k, precision, recall) in ranked.getPRCurve():
+	    if recall == None: recall = ''
+	    else: recall = "%5.3f" % recall
+	    self.prCurveWriter.write( string.join( [self.tc.getName(),
+		    j.getMgiJname(), str(k), "%5.3f" % precision, recall],
+		    '\t') + '\n')
+    # end writePRCurve() -----------------------------
+
+    def yearLabel(self):
+	''' Return string to tag console output with our year, if needed.
+	'''
+	if self.showYear: return " (%s)" % self.year
+	return ''
+
+    sdDumpFields = [ 'pubmed',	# fields from SciDirect results to dump
+		     'DOI',
+		     'journal',
+		     'volume',
+		     'startingPage',
+		     'endingPage',
+		     'coverDate',
+		     'pubType',
+		     'prismType',
+		     'title',
+		   ]
+
     class ReferencesWriter (object): #[
 	''' object that knows how to write Reference results to a tab delimited
 	    output file
@@ -464,30 +1124,28 @@ class Processor (object): # [
 		self.writeReference( r)
     # end class ReferencesWriter -------------------------- ]
 
-    def outputResultsDumps(self, sdResults, pr):
+    def outputResultsDumps(self, sdResults):
 	""" Create a few special dumps of results.
 	    Dump of all results returned from SciDirect.
-	    Dump of all false negative results.
+	    (the dumps of all false negative and false positive results are
+	    written as we find them, see getFalseNegsSink(),
+	    getFalsePosSink())
 	"""
 	if not self.config.getboolean('DEFAULT','dumpqueries'):
 	    return
-	sdFields = [ 'pubmed',	# fields from sdResults to output
-		     'DOI',
-		     'journal',
-		     'volume',
-		     'startingPage',
-		     'endingPage',
-		     'coverDate',
-		     'pubType',
-		     'prismType',
-		     'title',
-		   ]
 	if self.sdAllResultsWriter == None:		# need a writer
-	    filename = self.config.get( "DEFAULT", "sdAllResultsFile")
-	    self.sdAllResultsWriter = self.ReferencesWriter( filename, sdFields)
+	    filename = self.configGet( "DEFAULT", "sdAllResultsFile")
+	    self.sdAllResultsWriter = self.ReferencesWriter( filename,
+							    self.sdDumpFields)
 
 	self.sdAllResultsWriter.writeReferences( sdResults)
 
+    def getFalseNegsSink(self):
+	""" Return function to write a false negative MGI ref to the
+	    false negatives dump, None if we are not dumping.
+	"""
+	if not self.config.getboolean('DEFAULT','dumpqueries'):
+	    return None
 	mgiFields = ['Jnum',	# fields from falseNegs (MGI rcds) to output
 		     'pubmed',
 		     'DOI',
@@ -496,10 +1154,23 @@ class Processor (object): # [
 		     'title',
 		   ]
 	if self.sdFalseNegsWriter == None:		# need a writer
-	    filename = self.config.get( "DEFAULT", "sdFalseNegsFile")
+	    filename = self.configGet( "DEFAULT", "sdFalseNegsFile")
 	    self.sdFalseNegsWriter = self.ReferencesWriter( filename, mgiFields)
 
-	self.sdFalseNegsWriter.writeReferences( pr.getFalseNegatives() )
+	return self.sdFalseNegsWriter.writeReference
+
+    def getFalsePosSink(self):
+	""" Return function to write a false positive SciDirect result to
+	    the false positives dump, None if we are not dumping.
+	"""
+	if not self.config.getboolean('DEFAULT','dumpqueries'):
+	    return None
+	if self.sdFalsePosWriter == None:		# need a writer
+	    filename = self.configGet( "DEFAULT", "sdFalsePosFile")
+	    self.sdFalsePosWriter = self.ReferencesWriter( filename,
+							    self.sdDumpFields)
+
+	return self.sdFalsePosWriter.writeReference
 
     def outputNonExactJournals(self):
 	if self.tc.getName() == "None" and len(self.nonExactJournals) != 0:
@@ -524,6 +1195,659 @@ class Processor (object): # [
 
 # end class Processor ----------------------------------- ]
 
+class TermAnalyzer (object): # [
+    ''' A TermAnalyzer measures how much each term in a triage category's
+	SciDirect query contributes to the query's results.
+
+	For each triage category, we parse the query and pick its main
+	OR-list of terms (the longest one that is not negated).
+	For each term we generate two variants of the query:
+	    single term   - the OR-list replaced by just the term
+	    leave one out - the OR-list without the term
+	Since the OR-list is not negated, the results of the full query are
+	the union of the single term variants' results, and the results of
+	each leave one out variant are the union of the other terms' results.
+	So we only need to fetch the single term variants from SciDirect
+	(one per term and journal) and can compute the rest locally.
+
+	Count probes for all the variants are done concurrently first, so we
+	skip fetching variants with no results. Fetched result sets are kept
+	in the ResultCache so reruns (and other years' runs, and tweaks to
+	other parts of the query) don't refetch them.
+
+	For each term we report:
+	    results, true and false positives of the single term variant
+	    unique true/false positives - the results only this term finds,
+		i.e., what we lose (TP) or save (FP) by dropping the term.
+	    precision and recall of the single term variant across the
+		journals (computed for all terms x journals at once by a
+		BatchPrecisionRecall)
+    '''
+    def __init__(self,
+		processor,	# Processor for the year to analyze
+		resultCache	# ResultCache for SciDirect results
+		):
+	self.processor = processor
+	self.resultCache = resultCache
+	self.numThreads = processor.getApiThreads()
+    # end __init__() -------------------------------
+
+    def analyze(self):
+	for tc in self.processor.triageCategories:
+	    self.analyzeTc(tc)
+    # end analyze() -------------------------------
+
+    def analyzeTc(self, tc):
+	p = self.processor
+	print "Term analysis for Triage Category: %s%s" % \
+				    (tc.getDisplayName(), p.yearLabel())
+	tree = parseQuery( tc.getSdQueryString() )
+	termLists = findTermLists(tree)
+	if len(termLists) == 0:
+	    print "No list of OR'ed terms in the query, nothing to analyze"
+	    return
+	orNode = termLists[0]
+	for tl in termLists[1:]:
+	    if len(tl.children) > len(orNode.children): orNode = tl
+
+	variants = termVariants(tree, orNode)
+	terms = [ v[0].toQuery() for v in variants ]
+	singleTcs = [ self.variantTc(tc, v[1]) for v in variants ]
+	fullTc = self.variantTc(tc, tree)
+
+	# count probes for the full query and each single term variant
+	units = [ (vtc, j) for vtc in [fullTc] + singleTcs
+						    for j in p.journals ]
+	counts = parallelMap( self.countUnit, units, self.numThreads)
+	fullCount = sum( counts[:len(p.journals)] )
+
+	# fetch single term results for variants that have some
+	toFetch = [ u for (u, n) in zip(units, counts)
+				if n > 0 and u[0] is not fullTc ]
+	fetched = parallelMap( self.fetchUnit, toFetch, self.numThreads)
+	resultsByUnit = {}		# dict[(tc,j)] = list of SciDirect rcds
+	for (u, (results, nonExactJournals)) in zip(toFetch, fetched):
+	    resultsByUnit[u] = results
+
+	# match everything against MGI for this tc
+	p.tc = tc			# p.sdRef2MgiRef() needs p.tc
+	stats = [ [0, 0, 0, 0] for t in terms ] # per term:
+						#  TP, FP, unique TP, unique FP
+	totalTP = 0
+	totalFP = 0
+	numGold = 0
+	batchPR = BatchPrecisionRecall()	# PR for each (term, journal)
+	for j in p.journals:
+	    gold = p.getGoldResults(j)
+	    numGold += len(gold)
+	    batchPR.addGoldSet( j, [ p.gold2key(g) for g in gold ] )
+	    isTP = {}			# dict[DOI] = True if a true positive
+	    prKey = {}			# dict[DOI] = key for batchPR: gold key
+					#   if a true positive, else the DOI
+	    termsFound = {}		# dict[DOI] = list of term indexes
+	    for i in range(len(terms)):
+		termKeys = []
+		for r in resultsByUnit.get( (singleTcs[i], j), [] ):
+		    key = r['DOI'].lower()
+		    if not isTP.has_key(key):
+			mgiRef = p.sdRef2MgiRef(r, j)
+			isTP[key] = mgiRef != None
+			prKey[key] = isTP[key] and p.gold2key(mgiRef) or key
+		    termKeys.append( prKey[key] )
+		    termsFound.setdefault(key, []).append(i)
+		    if isTP[key]: stats[i][0] += 1
+		    else:	  stats[i][1] += 1
+		batchPR.addResultSet( (i, j), termKeys)
+		batchPR.addPair( (i, j), (i, j), j)
+	    for (key, found) in termsFound.items():
+		if isTP[key]: totalTP += 1
+		else:	      totalFP += 1
+		if len(found) == 1:	# only one term finds this result
+		    if isTP[key]: stats[found[0]][2] += 1
+		    else:	  stats[found[0]][3] += 1
+
+	batchPR.calculate()
+	termPRs = [ batchPR.getTotalStats( [ (i, j) for j in p.journals ] )
+						for i in range(len(terms)) ]
+	self.outputTermStats(tc, terms, stats, totalTP, totalFP, numGold,
+							fullCount, termPRs)
+    # end analyzeTc() -------------------------------
+
+    def variantTc(self, tc, tree):
+	''' Return a TriageCategory like tc, but with the query from tree
+	'''
+	return TriageCategory(tc.getName(), tc.getDisplayName(),
+					    tc.getMgiCode(), tree.toQuery() )
+
+    def cacheKey(self, unit, kind):
+	(tc, j) = unit
+	q = self.processor.getJournalQuery(tc, j)
+	source = 'SciDirect'
+	if self.processor.isLocal(): source = 'local'
+	return self.resultCache.makeKey( kind, source, self.processor.getYear(),
+			self.processor.config.get('SciDirect', 'Content'),
+			self.processor.config.get('SciDirect', 'Subscribed'),
+			canonicalQuery(q) )
+
+    def countUnit(self, unit	# (TriageCategory, SciDirectJournal) pair
+	):
+	''' Return SciDirect count for the unit. Runs in a worker thread.
+	'''
+	key = self.cacheKey(unit, 'count')
+	n = self.resultCache.get(key)
+	if n == None:
+	    (tc, j) = unit
+	    p = self.processor
+	    n = p.getSciDirectCount(tc, j, p.getThreadConnection())
+	    self.resultCache.put(key, n)
+	return n
+
+    def fetchUnit(self, unit	# (TriageCategory, SciDirectJournal) pair
+	):
+	''' Return (results, nonExactJournals) for the unit.
+	    Runs in a worker thread.
+	'''
+	key = self.cacheKey(unit, 'results')
+	data = self.resultCache.get(key)
+	if data == None:
+	    (tc, j) = unit
+	    p = self.processor
+	    data = p.getSciDirectResults(tc, j, p.getThreadConnection())
+	    self.resultCache.put(key, data)
+	return data
+
+    def outputTermStats(self, tc, terms, stats, totalTP, totalFP, numGold,
+							fullCount, termPRs):
+	''' Print the term stats and write them to a tab-delimited file
+	'''
+	p = self.processor
+	print "Full query: SciDirect count %d (all journal word matches), " \
+		"union of term results: %d" % (fullCount, totalTP + totalFP)
+	print "True positives: %d  False positives: %d  Gold positives: %d" % \
+					    (totalTP, totalFP, numGold)
+
+	fmt = "%-30s %8s %8s %8s %10s %10s %9s %6s"
+	print fmt % ('Term', 'Results', 'TP', 'FP', 'Unique TP', 'Unique FP',
+						    'Precision', 'Recall')
+	for (t, s, pr) in zip(terms, stats, termPRs):
+	    print fmt % (t[:30], s[0]+s[1], s[0], s[1], s[2], s[3],
+				self.formatRatio(pr.precisionIsDefined(),
+						    pr.getPrecision),
+				self.formatRatio(pr.recallIsDefined(),
+						    pr.getRecall) )
+	sys.stdout.flush()
+
+	filename = os.path.join(p.outputDir, "termAnalysis_%s.tsv" % \
+							    tc.getName() )
+	fp = open(filename, 'w')
+	fp.write( string.join( ['term', 'results', 'truePositives',
+		    'falsePositives', 'uniqueTruePositives',
+		    'uniqueFalsePositives', 'recallLostWithout', 'precision',
+		    'recall'], '\t') + '\n')
+	for (t, s, pr) in zip(terms, stats, termPRs):
+	    recallLost = ''
+	    if numGold > 0: recallLost = "%5.3f" % (float(s[2])/numGold)
+	    values = [ t ] + [ str(x) for x in [s[0]+s[1]] + s ] + \
+		    [ recallLost,
+		      self.formatRatio(pr.precisionIsDefined(), pr.getPrecision),
+		      self.formatRatio(pr.recallIsDefined(), pr.getRecall) ]
+	    fp.write( string.join(values, '\t') + '\n')
+	fp.close()
+	print "Wrote %s" % filename
+    # end outputTermStats() -------------------------------
+
+    def formatRatio(self, isDefined, getRatio):
+	''' Return getRatio() as a string, '' if not isDefined
+	'''
+	if not isDefined: return ''
+	return "%5.3f" % getRatio()
+
+# end class TermAnalyzer ----------------------------------- ]
+
+class ClauseAnalyzer (TermAnalyzer): # [
+    ''' A ClauseAnalyzer measures what each AND NOT clause in a triage
+	category's SciDirect query (and each term in the clause, if it is
+	a list of OR'ed terms) removes from the query's results.
+	E.g., for Expression: ... AND NOT ALL("embryonic fibroblast" OR ...)
+
+	Rather than submitting each combination of clauses and terms to
+	SciDirect, we fetch, for each journal:
+	    the query without its AND NOT clauses (the "positive" part)
+	    each term of each clause by itself (w/ the journal)
+	and put them in a ResultAlgebra. The full query and the query
+	without any clause or term are then computed locally.
+	Fetches go through the ResultCache like the TermAnalyzer's.
+
+	For each clause and term we report:
+	    results it removes, and how many are true/false positives
+	    unique true/false positives - the results only it removes
+	    precision and recall of the query without it
+    '''
+    def analyzeTc(self, tc):
+	p = self.processor
+	print "AND NOT clause analysis for Triage Category: %s%s" % \
+				    (tc.getDisplayName(), p.yearLabel())
+	tree = parseQuery( tc.getSdQueryString() )
+	clauses = []			# the right sides of the AND NOTs
+	positive = tree
+	while isinstance(positive, AndNotQuery):
+	    clauses.insert(0, positive.right)
+	    positive = positive.left
+	if len(clauses) == 0:
+	    print "No AND NOT clauses in the query, nothing to analyze"
+	    return
+	clauseTerms = [ self.splitClause(c) for c in clauses ]
+
+	# all the queries we need, w/ count probes to skip empty ones
+	alg = ResultAlgebra()
+	positiveTc = self.variantTc(tc, positive)
+	termTcs = [ [ self.variantTc(tc, t) for t in terms ]
+						    for terms in clauseTerms ]
+	vtcs = [positiveTc] + [ t for tcs in termTcs for t in tcs ]
+	units = [ (vtc, j) for vtc in vtcs for j in p.journals ]
+	counts = parallelMap( self.countUnit, units, self.numThreads)
+	toFetch = [ u for (u, n) in zip(units, counts) if n > 0 ]
+	fetched = parallelMap( self.fetchUnit, toFetch, self.numThreads)
+	resultsByUnit = {}		# dict[(tc,j)] = list of SciDirect rcds
+	for (u, (results, nonExactJournals)) in zip(toFetch, fetched):
+	    resultsByUnit[u] = results
+	for (vtc, j) in units:
+	    results = resultsByUnit.get( (vtc, j), [] )
+	    alg.addResults( p.getJournalQuery(vtc, j),
+				    [ p.resultKey(r, j) for r in results ] )
+
+	# rows: each clause, then its terms (if more than one)
+	# items[k] = (label, clause index, term index or None)
+	items = []
+	for (k, terms) in enumerate(clauseTerms):
+	    items.append( (clauses[k].toQuery(), k, None) )
+	    if len(terms) > 1:
+		items.extend( [ ('    ' + terms[i].toQuery(), k, i)
+					    for i in range(len(terms)) ] )
+	stats = [ [0, 0, 0, 0] for item in items ]  # per item:
+				#  TP removed, FP removed, unique TP, unique FP
+	itemPRs = [ PrecisionRecallStats() for item in items ]
+	fullPR = PrecisionRecallStats()
+	positivePR = PrecisionRecallStats()
+
+	p.tc = tc			# p.getGoldResults() needs p.tc
+	for j in p.journals:
+	    gold = alg.makeSet( [ p.gold2key(g) for g in p.getGoldResults(j)])
+	    pos = alg.evaluate( p.getJournalQuery(positiveTc, j) )
+	    termSets = [ [ alg.evaluate( p.getJournalQuery(t, j) ) & pos
+				for t in tcs ] for tcs in termTcs ]
+	    clauseSets = [ reduce(lambda a, b: a | b, sets, pos - pos)
+						    for sets in termSets ]
+	    fullPR.incAll( alg.evaluate( p.getJournalQuery(tc, j) ).\
+							    getStats(gold) )
+	    positivePR.incAll( pos.getStats(gold) )
+
+	    for (n, (label, k, i)) in enumerate(items):
+		if i == None:
+		    removed = clauseSets[k]
+		    others = clauseSets[:k] + clauseSets[k+1:]
+		else:
+		    removed = termSets[k][i]
+		    others = clauseSets[:k] + clauseSets[k+1:] + \
+					termSets[k][:i] + termSets[k][i+1:]
+		othersRemove = reduce(lambda a, b: a | b, others, pos - pos)
+		unique = removed - othersRemove
+		stats[n][0] += len(removed & gold)
+		stats[n][1] += len(removed - gold)
+		stats[n][2] += len(unique & gold)
+		stats[n][3] += len(unique - gold)
+		itemPRs[n].incAll( (pos - othersRemove).getStats(gold) )
+
+	print "%d result sets fetched, %d combinations computed locally" % \
+			(len(toFetch), len(p.journals) * (len(items) + 2))
+	self.outputClauseStats(tc, items, stats, itemPRs, fullPR, positivePR)
+    # end analyzeTc() -------------------------------
+
+    def splitClause(self, clause):
+	''' Return list of the terms of an AND NOT clause: the operands if
+	    it is an OR (of a field, e.g., ALL(a OR b) -> ALL(a), ALL(b)),
+	    else just the clause.
+	'''
+	if isinstance(clause, FieldQuery) and \
+					isinstance(clause.child, OrQuery):
+	    return [ FieldQuery(clause.field, c)
+				    for c in clause.child.flatten() ]
+	if isinstance(clause, OrQuery):
+	    return clause.flatten()
+	return [clause]
+
+    def outputClauseStats(self, tc, items, stats, itemPRs, fullPR,
+								positivePR):
+	''' Print the clause stats and write them to a tab-delimited file
+	'''
+	p = self.processor
+	fmt = "%-34s %8s %8s %8s %10s %10s %9s %6s"
+	print fmt % ('', 'Results', 'TP', 'FP', '', '', 'Precision', 'Recall')
+	for (label, pr) in [ ('Full query', fullPR),
+			     ('Without AND NOT clauses', positivePR) ]:
+	    n = pr.getNumResults()
+	    tp = pr.getNumTruePositives()
+	    print fmt % (label, n, tp, n - tp, '', '',
+			self.formatRatio(pr.precisionIsDefined(), pr.getPrecision),
+			self.formatRatio(pr.recallIsDefined(), pr.getRecall) )
+	print "Gold positives: %d" % fullPR.getNumGoldPositives()
+
+	print fmt % ('AND NOT clause/term', 'Removes', 'TP', 'FP',
+		    'Unique TP', 'Unique FP', 'Precision', 'Recall')
+	print fmt % ('', '', '', '', '', '', 'without', 'w/o')
+	for ( (label, k, i), s, pr) in zip(items, stats, itemPRs):
+	    print fmt % (label[:34], s[0]+s[1], s[0], s[1], s[2], s[3],
+			self.formatRatio(pr.precisionIsDefined(), pr.getPrecision),
+			self.formatRatio(pr.recallIsDefined(), pr.getRecall) )
+	sys.stdout.flush()
+
+	filename = os.path.join(p.outputDir, "clauseAnalysis_%s.tsv" % \
+							    tc.getName() )
+	fp = open(filename, 'w')
+	fp.write( string.join( ['clause', 'term', 'removes',
+		    'truePositivesRemoved', 'falsePositivesRemoved',
+		    'uniqueTruePositives', 'uniqueFalsePositives',
+		    'precisionWithout', 'recallWithout'], '\t') + '\n')
+	for ( (label, k, i), s, pr) in zip(items, stats, itemPRs):
+	    term = ''
+	    if i != None: term = label.strip()
+	    values = [ str(k+1), term ] + \
+		    [ str(x) for x in [s[0]+s[1]] + s ] + \
+		    [ self.formatRatio(pr.precisionIsDefined(), pr.getPrecision),
+		      self.formatRatio(pr.recallIsDefined(), pr.getRecall) ]
+	    fp.write( string.join(values, '\t') + '\n')
+	fp.close()
+	print "Wrote %s" % filename
+    # end outputClauseStats() -------------------------------
+
+# end class ClauseAnalyzer ----------------------------------- ]
+
+class PrecisionEstimator (object): # [
+    ''' A PrecisionEstimator estimates the precision of each triage
+	category's query from random samples of its results, for when
+	fetching all the results takes too many API calls.
+
+	For each journal we get the SciDirect count, split the ranks
+	0..count into strata (equal bands of ranks), and fetch one randomly
+	placed page ([Estimation] pageSize, or sampleSize if that is smaller)
+	from each, for up to sampleSize results in all. Precision falls off w/ rank, so stratifying by rank
+	keeps every part of the result list in the sample. Queries w/ no
+	more than sampleSize results are fetched completely, so their
+	numbers are exact.
+	Sampled results are matched against the MGI refs like a normal run,
+	and a StratifiedRatioEstimate gives, w/ standard errors:
+	    results	  - count * the fraction of the sample that is from
+			    the journal (the count includes journal word
+			    matches that are not)
+	    true positives
+	    precision	  - true positives / results
+	The gold positives are local, so they are exact, and
+	recall = estimated true positives / gold positives.
+	Errors are reported as +/- z * standard error for [Estimation]
+	confidence.
+    '''
+    def __init__(self,
+		processor	# Processor for the year to estimate
+		):
+	self.processor = processor
+	self.numThreads = processor.getApiThreads()
+	self.sampleSize = int( self.getEstimationOption('sampleSize', '200') )
+	self.pageSize = int( self.getEstimationOption('pageSize', '25') )
+	self.confidence = float( self.getEstimationOption('confidence',
+								    '0.95') )
+	self.z = normalQuantile( 0.5 + self.confidence / 2)
+	self.seed = self.getEstimationOption('seed', '')
+    # end __init__() -------------------------------
+
+    def getEstimationOption(self, option, default):
+	''' Return [Estimation] config option value (string), or default
+	'''
+	section = 'Estimation'
+	p = self.processor
+	if p.config.has_section(section) and \
+				p.config.has_option(section, option):
+	    return p.configGet(section, option)
+	return default
+    # end getEstimationOption() -------------------------------
+
+    def estimate(self):
+	for tc in self.processor.triageCategories:
+	    self.estimateTc(tc)
+    # end estimate() -------------------------------
+
+    def estimateTc(self, tc):
+	p = self.processor
+	print "Precision estimate for Triage Category: %s%s" % \
+				    (tc.getDisplayName(), p.yearLabel())
+	units = [ (tc, j) for j in p.journals ]
+	samples = parallelMap( self.sampleUnit, units, self.numThreads)
+
+	p.tc = tc			# p.sdRefs2MgiRefs() needs p.tc
+	rows = []			# (journal, count, api calls, estimate,
+					#	num of gold positives)
+	total = StratifiedRatioEstimate()
+	for (j, (count, apiCalls, pages)) in zip(p.journals, samples):
+	    est = StratifiedRatioEstimate()
+	    for (stratumSize, results, numNonExact) in pages:
+		matches = p.sdRefs2MgiRefs(results, j)
+		ys = [ int(m != None) for m in matches ] + [0] * numNonExact
+		xs = [1] * len(results) + [0] * numNonExact
+		est.addStratum(stratumSize, ys, xs)
+	    total.addAll(est)
+	    rows.append( (j.getMgiJname(), count, apiCalls, est,
+					    len( p.getGoldResults(j) ) ) )
+	rows.append( ('Total', sum( [ r[1] for r in rows ] ),
+			sum( [ r[2] for r in rows ] ), total,
+			sum( [ r[4] for r in rows ] ) ) )
+	self.outputEstimates(tc, rows)
+    # end estimateTc() -------------------------------
+
+    def sampleUnit(self, unit	# (TriageCategory, SciDirectJournal) pair
+	):
+	''' Return (count, num of API calls, list of sampled pages) for the
+	    unit, each page: (stratum size, list of SciDirect results from
+	    the journal, num of other results).
+	    Runs in a worker thread.
+	'''
+	(tc, j) = unit
+	p = self.processor
+	sd = p.getThreadConnection()
+	numCallsBefore = sd.getNumApiCalls()
+	count = p.getSciDirectCount(tc, j, sd)
+	pages = []
+	for (stratumSize, start, num) in self.getSamplePages(unit, count):
+	    (results, nonExactJournals) = p.getSciDirectResults(tc, j, sd,
+			    sdNumPubsJW=count, startIndex=start, numToGet=num)
+	    pages.append( (stratumSize, results,
+					    sum( nonExactJournals.values() )) )
+	return (count, sd.getNumApiCalls() - numCallsBefore, pages)
+    # end sampleUnit() -------------------------------
+
+    def getSamplePages(self, unit, count):
+	''' Return list of (stratum size, start index, num of results) for
+	    the pages to sample from count results.
+	'''
+	if count == 0: return []
+	if count <= self.sampleSize:		# get them all
+	    return [ (count, 0, count) ]
+	if self.seed == '':
+	    rand = random.Random()
+	else:			# the same pages each run
+	    (tc, j) = unit
+	    rand = random.Random( "%s|%s|%s|%s" % (self.seed,
+			self.processor.getYear(), tc.getName(), j.getMgiJname()))
+	numStrata = max(1, self.sampleSize / self.pageSize)
+	pages = []
+	for s in range(numStrata):
+	    low = s * count / numStrata
+	    high = (s + 1) * count / numStrata
+	    num = min(self.pageSize, self.sampleSize, high - low)
+	    pages.append( (high - low, rand.randint(low, high - num), num) )
+	return pages
+    # end getSamplePages() -------------------------------
+
+    def getFullFetchCalls(self, count):
+	''' Return about how many API calls fetching all count results takes
+	    (a count probe + one call per page of the SciDirect connection's
+	    bufferSize, like a normal run pages)
+	'''
+	bufferSize = self.processor.sd.bufferSize
+	return 1 + (count + bufferSize - 1) / bufferSize
+
+    def outputEstimates(self, tc, rows):
+	''' Print the estimates and write them to a tab-delimited file
+	'''
+	p = self.processor
+	fmt = "%-30s %8s %8s %6s %8s %13s %13s %6s %13s"
+	print fmt % ('Journal', 'Count', 'Sampled', 'Calls', 'Results',
+		    'Precision', 'TruePos', 'Gold', 'Recall')
+	lines = []			# for the tsv file
+	for (jname, count, apiCalls, est, numGold) in rows:
+	    values = [ str(count), str(est.getSampleSize()), str(apiCalls),
+				"%.0f" % est.getTotalX() ]
+	    (precision, precisionErr) = ('', '')
+	    if est.ratioIsDefined():
+		precision = "%5.3f" % est.getRatio()
+		precisionErr = "%5.3f" % (self.z * est.getRatioStdErr())
+	    tp = "%.0f" % est.getTotalY()
+	    tpErr = "%.0f" % (self.z * est.getTotalYStdErr())
+	    (recall, recallErr) = ('', '')
+	    if numGold > 0:
+		recall = "%5.3f" % (est.getTotalY() / numGold)
+		recallErr = "%5.3f" % \
+			    (self.z * est.getTotalYStdErr() / numGold)
+	    values += [ precision, precisionErr, tp, tpErr, str(numGold),
+							recall, recallErr ]
+	    lines.append( string.join( [jname] + values, '\t') )
+	    print fmt % tuple( [jname[:30]] + values[:4] +
+			[ self.formatError(precision, precisionErr),
+			  self.formatError(tp, tpErr), values[8],
+			  self.formatError(recall, recallErr) ] )
+	(count, apiCalls) = rows[-1][1:3]
+	print "Errors are +/- for %g%% confidence. API calls: %d, fetching " \
+		"all the results would take about %d" % (100 * self.confidence,
+		apiCalls, sum( [ self.getFullFetchCalls(r[1])
+							for r in rows[:-1] ] ))
+	sys.stdout.flush()
+
+	filename = os.path.join(p.outputDir, "precisionEstimate_%s.tsv" % \
+							    tc.getName() )
+	fp = open(filename, 'w')
+	fp.write( string.join( ['journal', 'count', 'sampled', 'apiCalls',
+		    'results', 'precision', 'precisionError',
+		    'truePositives', 'truePositivesError', 'goldPositives',
+		    'recall', 'recallError'], '\t') + '\n')
+	for line in lines:
+	    fp.write(line + '\n')
+	fp.close()
+	print "Wrote %s" % filename
+    # end outputEstimates() -------------------------------
+
+    def formatError(self, value, error):
+	''' Return "value +/- error", '' if no value
+	'''
+	if value == '': return ''
+	return "%s+/-%s" % (value, error)
+
+# end class PrecisionEstimator ----------------------------------- ]
+
+class CorpusTool (object): # [
+    ''' A CorpusTool builds the local article corpus for a Processor's year,
+	and compares counts for queries run against the corpus to counts
+	from SciDirect.
+
+	The corpus is everything SciDirect returns for each journal for
+	[SciDirect] corpusQuery (the base query by default). Every triage
+	category query includes the base query, so they only find articles
+	in the corpus. Articles from journals that only match our journals'
+	names by words are kept, so local counts include them like
+	SciDirect's do.
+    '''
+    def __init__(self,
+		processor	# Processor for the year
+		):
+	self.processor = processor
+	self.numThreads = processor.getApiThreads()
+    # end __init__() -------------------------------
+
+    def build(self):
+	''' Fetch the corpus from SciDirect and write it to the corpus file
+	'''
+	p = self.processor
+	corpusTc = TriageCategory('corpus', 'Corpus', '',
+				    p.configGet('SciDirect', 'corpusQuery') )
+	def fetchJournal(j):
+	    sd = p.getThreadConnection()
+	    n = p.getSciDirectCount(corpusTc, j, sd)
+	    (total, data) = p.doSciDirectQuery( sd, n, numResults=n)
+	    return data
+
+	print "Building corpus%s for %d journals" % (p.yearLabel(),
+							    len(p.journals))
+	articles = []
+	seen = set()		# DOIs of articles we have already
+	for data in parallelMap( fetchJournal, p.journals, self.numThreads):
+	    for sdRef in data:
+		key = sdRef['DOI'].lower()
+		if key in seen: continue
+		seen.add(key)
+		articles.append( corpusRecord(sdRef) )
+
+	filename = p.configGet('SciDirect', 'corpusFile')
+	corpusDir = os.path.dirname(filename)
+	if corpusDir != '' and not os.path.isdir(corpusDir):
+	    os.makedirs(corpusDir)
+	saveCorpus(filename, articles)
+	print "Wrote %d articles to %s" % (len(articles), filename)
+    # end build() -------------------------------
+
+    def compareCounts(self):
+	''' For each triage category and journal, compare the count from the
+	    local corpus to the count from SciDirect.
+	    Print a summary and write the counts to a tab-delimited file.
+	'''
+	p = self.processor
+	units = [ (tc, j) for tc in p.triageCategories for j in p.journals ]
+
+	def liveCount(unit):
+	    (tc, j) = unit
+	    return p.getSciDirectCount(tc, j, p.getThreadConnection())
+	liveCounts = parallelMap( liveCount, units, self.numThreads)
+
+	localSd = p.initSciDirectConnection(local=True)
+	localCounts = [ p.getSciDirectCount(tc, j, localSd)
+							for (tc, j) in units ]
+
+	filename = os.path.join(p.outputDir, "corpusCounts.tsv")
+	fp = open(filename, 'w')
+	fp.write( string.join( ['category', 'journal', 'SciDirectCount',
+					    'localCount', 'ratio'], '\t') + '\n')
+	numAgree = 0		# num of units w/ counts within 10%
+	for ((tc, j), live, local) in zip(units, liveCounts, localCounts):
+	    ratio = ''
+	    if live > 0: ratio = "%5.3f" % (float(local)/live)
+	    if abs(local - live) <= 0.1 * live: numAgree += 1
+	    fp.write( string.join( [tc.getName(), j.getMgiJname(), str(live),
+					str(local), ratio], '\t') + '\n')
+	fp.close()
+
+	lines = [ "Corpus count comparison%s" % p.yearLabel() ]
+	fmt = "%-30s %12s %12s %8s"
+	lines.append( fmt % ('Category', 'SciDirect', 'Local', 'Ratio') )
+	for tc in p.triageCategories:
+	    live = sum( [ n for (u, n) in zip(units, liveCounts) if u[0] == tc])
+	    local = sum( [ n for (u, n) in zip(units, localCounts) if u[0] == tc])
+	    ratio = '-'
+	    if live > 0: ratio = "%5.3f" % (float(local)/live)
+	    lines.append( fmt % (tc.getDisplayName()[:30], live, local, ratio) )
+	lines.append( "%d of %d category/journal counts agree within 10%%" % \
+						    (numAgree, len(units)) )
+	lines.append( "Wrote %s" % filename)
+	print string.join(lines, '\n')
+    # end compareCounts() -------------------------------
+
+# end class CorpusTool ----------------------------------- ]
+
 class PRresults (object):
     ''' a PRresults object holds the results from a run of searches for
         one or more TriageCategories and a list of SciDirectJournals.
@@ -542,7 +1866,8 @@ class PRresults (object):
 	    self.OverallPR[tc] = PrecisionRecallStats()
 
 	self.PR = {}		# dict mapping (tc,journal) pairs to their
-				#   PrecisionRecallCalculator objects
+				#   StreamingPrecisionRecall objects
+	self.goldCounts = None	# GoldCountCube of the MGI refs, if we have it
 
     def addJournalResults(self, tc, journal, pr):
 	self.PR[ (tc, journal) ] = pr
@@ -556,6 +1881,25 @@ class PRresults (object):
 
     def getTcOverallResults(self, tc):
 	return self.OverallPR[ tc]
+
+    def getBootstrapStrata(self, tc):
+	''' Return list of (numTP, numFP, numFN) for each journal for tc,
+	    for bootstrapPR()
+	'''
+	strata = []
+	for j in self.journals:
+	    pr = self.PR.get( (tc, j) )
+	    if pr == None: continue
+	    tp = pr.getNumTruePositives()
+	    strata.append( (tp, pr.getNumResults() - tp,
+					    pr.getNumGoldPositives() - tp) )
+	return strata
+
+    def setGoldCounts(self, goldCounts):
+	self.goldCounts = goldCounts
+
+    def getGoldCounts(self):
+	return self.goldCounts
 # end class PRresults ---------------------------------
 
 class DisplayDataRangler (object):
@@ -568,182 +1912,189 @@ class DisplayDataRangler (object):
 	So likely, there will be a method in this class for each webpage
 	    template we have.
     '''
-    def __init__(self, results	# PRresults object
-		):
-	self.results = results
+    def __init__(self, yearResults,	# list of (year, PRresults obj) pairs
+					#   in year order
+		ciLabel=''		# heading for precision/recall
+		):			#   confidence intervals, '' if none
+	self.yearResults = yearResults
+	self.ciLabel = ciLabel
 	self.datetime = 'jim figure this out'
 
-    def getRunSummaryData(self):
-	rows = []
-	for tc in self.results.triageCategories:
-	    pr = self.results.getTcOverallResults(tc)
-	    r = dict( \
-		name           = tc.getDisplayName(),
-		nGoldPos       = pr.getNumGoldPositives(),
-		nSciDirResults = pr.getNumResults(),
-		nTruePos       = pr.getNumTruePositives(),
-		nFalsePos      = '-', #r.nSciDirResults - r.nTruePos,
-		nFalseNeg      = '-',
-		precision      = '-',
-		recall         = '-',
-		)
-	    # JIM need to round precision and recall
-	    if pr.precisionIsDefined(): r['precision'] = pr.getPrecision()
-	    if pr.recallIsDefined(): r['recall'] = pr.getRecall()
-
-	    rows.append(r)
-
-	d = {   'nJournals' : len( self.results.getJournals() ),
-		'rows'	: rows
+    def getRunSummaryData(self,
+		tcLinks={}	# dict[(year, tc name)] = link to the tc page
+		):
+	years = []		# list of dicts, one per year
+	for (year, results) in self.yearResults:
+	    rows = []
+	    for tc in results.triageCategories:
+		row = self.getTcRow( tc, results.getTcOverallResults(tc))
+		row['link'] = tcLinks.get( (year, tc.getName()), '')
+		rows.append(row)
+	    years.append( { 'year' : year, 'rows' : rows,
+			    'goldCounts' : self.getGoldCountsData(results) } )
+
+	(firstYear, firstResults) = self.yearResults[0]
+	d = {   'nJournals' : len( firstResults.getJournals() ),
+		'ciLabel' : self.ciLabel,
+		'rows'	: years[0]['rows'],	# rows for the 1st/only year
+		'years'	: years,
+		'trendRows' : self.getTrendRows(),
 	    }
 	return d
 
-    def getTcSummaryData(self):
-	d = {}
-	return d
-# end class DisplayDataRangler ---------------------------------
-
-class IndexHtmlPage (HtmlPage):
-
-    def addTc(self,
-		tc,		# TriageCategory obj
-		pr,		# PrecisionRecallStats obj
-		journals	# list of SciDirectJournals
-	    ):
-	''' Add summary info for the TriageCategory and PRstats to the
-	    results Index page
-	'''
-	lines = ["<hr>"]
-	linkText = '<a href="category_%s.html">details</a>' % tc.getName()
-	t = time.ctime(time.time())
-	lines.append("<p>Category: %s (%d journals) %s --- %s" % \
-		    (tc.getDisplayName(),len(journals), linkText, t) )
-	lines.append( \
-"<p>MGI Pubs (Gold positives): %d;  SciDirect Results: %d;  TruePositives: %d" \
-	    % (pr.getNumGoldPositives(),
-	       pr.getNumResults(),
-	       pr.getNumTruePositives()) )
-	lines.append("<br>")
-	if pr.precisionIsDefined():
-	    lines.append( "Precision:  %4.2f; " % ( pr.getPrecision()) ) 
-	if pr.recallIsDefined():
-	    lines.append( "Recall: %4.2f" % (pr.getRecall()) )
-
-	lines.append("<p>Query:\n<pre>%s</pre>" % tc.getSdQueryString() )
-
-	self.appendToBody( lines)
-
-# end class IndexHtmlPage -------------------------- ]
-
-class TcHtmlPage (HtmlPage):
-
-    def __init__(self, title=''):
-	super(self.__class__, self).__init__(title=title)
-	self.journalsInfo = []	# list of (Journal, PrecisionRecallStats)
-
-    def addTcSummary(self,
-		tc,		# TriageCategory obj
-		pr,		# PrecisionRecallStats obj
-		journals	# list of SciDirectJournals
-	    ):
-	''' Add summary info for the TriageCategory and PRstats to the
-	    results Index page
+    def getTcRow(self,
+		tc,	# TriageCategory
+		pr	# PrecisionRecallStats for tc
+		):
+	''' Return dict of the summary values for one triage category
 	'''
-	lines = []
-	linkText = '<a href="index.html">back to index</a>'
-	t = time.ctime(time.time())
-	lines.append("<p>Category: %s (%d journals) %s --- %s" % \
-		    (tc.getDisplayName(),len(journals), linkText, t) )
-	lines.append( \
-"<p>MGI Pubs (Gold positives): %d;  SciDirect Results: %d;  TruePositives: %d" \
-	    % (pr.getNumGoldPositives(),
-	       pr.getNumResults(),
-	       pr.getNumTruePositives()) )
-	lines.append("<br>")
-	if pr.precisionIsDefined():
-	    lines.append( "Precision:  %4.2f; " % ( pr.getPrecision()) ) 
-	if pr.recallIsDefined():
-	    lines.append( "Recall: %4.2f" % (pr.getRecall()) )
-
-	lines.append("<p>Query:\n<pre>%s</pre>" % tc.getSdQueryString() )
-
-	self.prependToBody( lines)
-    
-    def addJournal(self,
-		    journal,	# SciDirectJournal obj
-		    pr		# PrecisionRecallCalculator obj
+	r = dict( \
+	    name           = tc.getDisplayName(),
+	    nGoldPos       = pr.getNumGoldPositives(),
+	    nSciDirResults = pr.getNumResults(),
+	    nTruePos       = pr.getNumTruePositives(),
+	    nFalsePos      = '-', #r.nSciDirResults - r.nTruePos,
+	    nFalseNeg      = '-',
+	    precision      = '-',
+	    recall         = '-',
+	    precisionCI    = self.formatInterval( pr.getPrecisionInterval() ),
+	    recallCI       = self.formatInterval( pr.getRecallInterval() ),
+	    )
+	# JIM need to round precision and recall
+	if pr.precisionIsDefined(): r['precision'] = pr.getPrecision()
+	if pr.recallIsDefined(): r['recall'] = pr.getRecall()
+	return r
+
+    def formatInterval(self, interval	# (low, high) or None
 		):
-	self.journalsInfo.append( (journal, pr) )
+	if interval == None: return '-'
+	return "%4.2f - %4.2f" % interval
 
-    def endJournals(self):
-	lines = []
-	for (j,pr) in self.journalsInfo:
-	    lines.append("<p><hr>")
-	    lines.append("<b>%s (%s) --- SciDirect: %s</b>" % \
-		(j.getMgiJname(),j.getTriagedBy(), j.getSdJname()) )
-	    lines.append( \
-"<p>MGI Pubs (Gold positives): %d;  SciDirect Results: %d;  TruePositives: %d" \
-		% (pr.getNumGoldPositives(),
-		   pr.getNumResults(),
-		   pr.getNumTruePositives()) )
-	    lines.append("<br>")
-	    if pr.precisionIsDefined():
-		lines.append( "Precision:  %4.2f; " % ( pr.getPrecision()) ) 
-	    if pr.recallIsDefined():
-		lines.append( "Recall: %4.2f" % (pr.getRecall()) )
-
-	    fp = pr.getFalsePositives()
-	    if len(fp) == 0:
-		lines.append("<p>False Positives: none")
-	    else:
-		#n = 10000  #self.config.getint('HTML Output', 'numFalsePositives')
-		n = ConfigHolder.getConfig().getint('HTML Output', 'numFalsePositives')
-		lines.append("<p>False Positives: %d of %d" % \
-				( min(n,len(fp)), len(fp) ) )
-		lines.append(" (returned by SciDirect but not selected in MGI)")
-		lines.append('<table border=1>')
-		lines.append('<tr><th>DOI</th><th>Title</th><th>pubType</th><th>Abstract</th></tr>')
-
-		for rcd in fp[:n]:
-		    doiLink = '<a href="http://dx.doi.org/%s">%s</a>' % \
-		    				(rcd['DOI'], rcd['DOI'])
-		    lines.append('<tr>')
-		    lines.append('<td>%s</td>' % doiLink)
-		    lines.append('<td>%s</td>' % rcd['title'])
-		    lines.append('<td>%s</td>' % rcd['pubType'])
-		    lines.append('<td>%s</td>' % " ") #rcd['abstract'])
-		    lines.append('</tr>')
-		lines.append('</table>')
-
-	    fp = pr.getFalseNegatives()
-	    if len(fp) == 0:
-		lines.append("<p>False Negatives: none")
-	    else:
-		#n = 3 #self.config.getint('HTML Output', 'numFalseNegatives')
-		n = ConfigHolder.getConfig().getint('HTML Output', 'numFalseNegatives')
-		lines.append("<p>False Negatives: %d of %d" % \
-				( min(n,len(fp)), len(fp) ) )
-		lines.append(" (not returned by SciDirect but selected in MGI)")
-		lines.append('<table border=1>')
-
-		for rcd in fp[:n]:
-
-		    MGIurl = 'http://informatics.jax.org/accession'
-		    jnumLink = '<a href="%s/%s">%s</a>' % \
-		    		(MGIurl, rcd['Jnum'], rcd['Jnum'])
-		    doiLink = '<a href="http://dx.doi.org/%s">%s</a>' % \
-		    				(rcd['DOI'], rcd['DOI'])
-		    lines.append('<tr>')
-		    lines.append('<td>%s</td>' % jnumLink)
-		    lines.append('<td>%s</td>' % doiLink)
-		    lines.append('<td>%s</td>' % rcd['title'])
-		    lines.append('<td>%s</td>' % rcd['authors'])
-		    lines.append('</tr>')
-		lines.append('</table>')
-
-	self.appendToBody( lines)
-
-# end class TcHtmlPage -------------------------- ]
+    def getGoldCountsData(self,
+		results		# PRresults for a year
+		):
+	''' Return dict w/ the number of MGI refs in each journal (rows) and
+	    triage category (columns) for the year, None if we don't have
+	    the counts.
+	'''
+	cube = results.getGoldCounts()
+	if cube == None: return None
+	fields = ['']			# all refs, then each category
+	for tc in results.triageCategories:
+	    if tc.getMgiCode() != '' and tc.getMgiCode() not in fields:
+		fields.append( tc.getMgiCode() )
+	rows = cube.getRows( fields,
+			[ j.getMgiJname() for j in results.getJournals() ] )
+	totals = [ sum( [ counts[i] for (j, counts) in rows ] )
+						    for i in range(len(fields)) ]
+	return { 'columns' : ['All'] + fields[1:],
+		 'rows'    : [ { 'journal' : j, 'counts' : counts }
+						    for (j, counts) in rows ],
+		 'totals'  : totals,
+	       }
+
+    def getTrendRows(self):
+	''' Return list of dicts, one per triage category, each holding a
+	    list of that category's summary values for each year.
+	    Empty list if there is only one year (so no trends).
+	'''
+	if len(self.yearResults) < 2: return []
+
+	trendRows = []
+	(firstYear, firstResults) = self.yearResults[0]
+	for tc in firstResults.triageCategories:
+	    cells = []
+	    for (year, results) in self.yearResults:
+		cell = self.getTcRow( tc, results.getTcOverallResults(tc))
+		cell['year'] = year
+		cells.append(cell)
+	    trendRows.append( { 'name' : tc.getDisplayName(), 'years' : cells })
+	return trendRows
+
+    def getTcPageData(self,
+		year,		# string
+		results,	# PRresults for the year
+		tc,		# TriageCategory
+		journalLinks,	# dict[SciDirectJournal] = link to its page
+		summaryLink	# link to the run summary
+		):
+	''' Return dict for the triage category's page
+	'''
+	summary = self.getTcRow( tc, results.getTcOverallResults(tc))
+	for k in ['precision', 'recall']:
+	    if summary[k] != '-': summary[k] = "%4.2f" % summary[k]
+	return { 'year'	    : year,
+		 'name'	    : tc.getDisplayName(),
+		 'query'    : self.text( tc.getSdQueryString() ),
+		 'nJournals': len( results.getJournals() ),
+		 'ciLabel'  : self.ciLabel,
+		 'summary'  : summary,
+		 'journals' : [ self.getJournalRow( j,
+				    results.getJournalResults(tc, j),
+				    journalLinks.get(j, '') )
+					for j in results.getJournals() ],
+		 'summaryLink' : summaryLink,
+	       }
+
+    def getJournalRow(self,
+		j,		# SciDirectJournal
+		pr,		# its StreamingPrecisionRecall for the tc
+		link=''		# link to the journal's page
+		):
+	''' Return dict of the summary values for one journal
+	'''
+	r = dict( \
+	    name           = j.getMgiJname(),
+	    sdName         = j.getSdJname(),
+	    triagedBy      = j.getTriagedBy(),
+	    nGoldPos       = pr.getNumGoldPositives(),
+	    nSciDirResults = pr.getNumResults(),
+	    nTruePos       = pr.getNumTruePositives(),
+	    nFalsePos      = pr.getNumFalsePositives(),
+	    nFalseNeg      = pr.getNumFalseNegatives(),
+	    precision      = '-',
+	    recall         = '-',
+	    link           = link,
+	    )
+	if pr.precisionIsDefined(): r['precision'] = "%4.2f" % pr.getPrecision()
+	if pr.recallIsDefined(): r['recall'] = "%4.2f" % pr.getRecall()
+	return r
+
+    def getJournalPageData(self,
+		year,		# string
+		results,	# PRresults for the year
+		tc,		# TriageCategory
+		j,		# SciDirectJournal
+		numFalsePositives, # max num of false positives to show
+		numFalseNegatives, # max num of false negatives to show
+		tcLink		# link to the triage category's page
+		):
+	''' Return dict for the page for one journal in the triage category.
+	    Just the fields we show of the false positives/negatives, so the
+	    data is small to send to a worker process.
+	'''
+	pr = results.getJournalResults(tc, j)
+	fps = [ dict( [ (f, self.text(r[f])) for f in
+				['DOI', 'title', 'pubType'] ] )
+			for r in pr.getFalsePositives()[:numFalsePositives] ]
+	fns = [ dict( [ (f, self.text(r[f])) for f in
+				['Jnum', 'DOI', 'title', 'authors'] ] )
+			for r in pr.getFalseNegatives()[:numFalseNegatives] ]
+	return { 'year'		  : year,
+		 'category'	  : tc.getDisplayName(),
+		 'journal'	  : self.getJournalRow(j, pr),
+		 'falsePositives' : fps,
+		 'falseNegatives' : fns,
+		 'categoryLink'	  : tcLink,
+	       }
+
+    def text(self, s):
+	''' Return s as unicode for a template. MGI refs and SciDirect
+	    results are byte strings, not always ascii.
+	'''
+	if type(s) == type(''): return s.decode('utf-8', 'replace')
+	return s
+# end class DisplayDataRangler ---------------------------------
 
 class JournalCompError (Exception):
     ''' Exception class for odd things that shouldn't happen.
@@ -756,4 +2107,4 @@ class JournalCompError (Exception):
 # end class JournalCompError --------------------------
 
 if __name__ == "__main__":
-    p = Processor( )
+    r = JournalCompRun( )
@@ -9,6 +9,7 @@
 #
 #  Usage:  
 USAGETEXT = """Usage: runsql.py [-s server] [-d database] [-sep string] [-delim string] [-q]
+		[-y year] [-p [-c config] [-ds datasets] [-standin tsvfiles]]
 	Run one or more sql commands from stdin,
 	and send output in tab-delimited form to stdout.
 	-s (or -S) server   defaults to ADHOC_MGI.
@@ -17,6 +18,21 @@ USAGETEXT = """Usage: runsql.py [-s server] [-d database] [-sep string] [-delim
 	-sep string defines the sql command separator string, default is "||"
 	-delim string defines the output field separator, default is tab
 	-q means quiet - don't write diagnositic msgs to stderr
+	-y year of the references to count, default 2013
+	-p means pivot: get the (journal, dataset, count) rows in one
+	   query (via a DB-API connection) and turn them into the table
+	   here, writing each journal's row as soon as we have it,
+	   instead of the temp table and self joins.
+	   Connects as configured in the [MGI Database] section of the
+	   config file (like loadMGIrefs.py), -s and -d are not used
+	-c config (for -p): config file, default config.cfg in the same
+	   directory as this script
+	-ds datasets (for -p): comma separated _dataset_keys to have
+	   columns for, each optionally =heading, e.g., 1002=A&P,1005=GO
+	   default is the A&P, GO, Expr and Tumor columns
+	-standin tsvfiles (for -p): comma separated MGI references files
+	   (like JournalComp reads) to build a SQLite stand-in for the
+	   database from, instead of connecting to server, for testing
 """
 #
 #  Env Vars:  None
@@ -38,7 +54,7 @@ import sys
 import os
 import string
 import time
-import db
+import ConfigParser
 
 SQL = '''
 -- SQL to create a table of journals by Triage categories (A, G, E, T)
@@ -68,6 +84,23 @@ order by rc.journal
 
 COLUMNS = [ 'journal', 'A&P', 'GO', 'Expr', 'Tumor' ]
 
+# SQL for -p, one row per (journal, dataset), ordered by journal
+PIVOTSQL = '''
+select r.journal, dsa._dataset_key, count(*) as refcount
+from bib_refs r join bib_dataset_assoc dsa on (r._refs_key = dsa._refs_key)
+where r.year = %(year)s
+and r.journal is not null
+group by r.journal, dsa._dataset_key
+order by r.journal
+'''
+
+# default datasets (columns) for -p: (_dataset_key, column heading),
+#   same as the COLUMNS from SQL
+DATASETS = [ (1002, 'A&P'), (1005, 'GO'), (1004, 'Expr'), (1007, 'Tumor') ]
+
+BATCHSIZE = 500		# num of rows to fetch at a time for -p, if no
+			#   [MGI Database] batchSize in config
+
 #
 #  CONSTANTS
 #
@@ -97,6 +130,11 @@ def getArgs():
     argDict[ "SQLSEPARATOR"] = "||"
     argDict[ "DELIMITER"]    = "\t"
     argDict[ "QUIET"]        = False
+    argDict[ "YEAR"]         = "2013"
+    argDict[ "PIVOT"]        = False
+    argDict[ "DATASETS"]     = None
+    argDict[ "STANDIN"]      = None
+    argDict[ "CONFIG"]       = os.path.join(sys.path[0], 'config.cfg')
 
     # Process "-" flag arguments
     while len(myArgs) > 0 and myArgs[0][0] == "-": # while next arg start w/ -
@@ -112,6 +150,16 @@ def getArgs():
 	    getRequredFlagValue( myArgs, argDict, "DELIMITER")
 	elif arg == "-q":
 	    argDict[ "QUIET"] = True
+	elif arg == "-y":
+	    getRequredFlagValue( myArgs, argDict, "YEAR")
+	elif arg == "-p":
+	    argDict[ "PIVOT"] = True
+	elif arg == "-ds":
+	    getRequredFlagValue( myArgs, argDict, "DATASETS")
+	elif arg == "-standin":
+	    getRequredFlagValue( myArgs, argDict, "STANDIN")
+	elif arg == "-c":
+	    getRequredFlagValue( myArgs, argDict, "CONFIG")
 	else:
 	    usage()
 
@@ -120,6 +168,18 @@ def getArgs():
 	usage()
 
     # Apply any cleanups and error checks
+    if not argDict[ "YEAR"].isdigit():
+	usage()
+    if argDict[ "DATASETS"] == None:
+	argDict[ "DATASETS"] = DATASETS
+    else:
+	datasets = []
+	for ds in argDict[ "DATASETS"].split(','):
+	    (key, heading) = (ds.split('=', 1) + [ds])[:2]
+	    if not key.strip().isdigit():
+		usage()
+	    datasets.append( (int(key), heading.strip()) )
+	argDict[ "DATASETS"] = datasets
 
     return argDict
 
@@ -150,12 +210,17 @@ def process ():
 
     notQuiet = not args[ "QUIET"]
 
+    if args[ "PIVOT"]:
+	processPivot( args)
+	return
+
+    import db
     db.set_sqlServer  ( args["DBSERVER"])
     db.set_sqlDatabase( args["DBNAME"])
     db.set_sqlUser    ("MGD_PUBLIC")
     db.set_sqlPassword("mgdpub")
 
-    query = SQL % {'year' : '2013'}
+    query = SQL % {'year' : args[ "YEAR"]}
     queries = string.split(query, args[ "SQLSEPARATOR"])
 
     if notQuiet:
@@ -188,6 +253,83 @@ def process ():
     
 # end process() ----------------------------------
 
+def processPivot ( args	# dict from getArgs()
+    ):
+# Purpose: -p version of process(): stream (journal, dataset, count) rows
+#	   and pivot them into the table, one journal's row at a time.
+# Returns: nothing
+
+    notQuiet = not args[ "QUIET"]
+    delim = args[ "DELIMITER"]
+    datasets = args[ "DATASETS"]
+    column = dict( [ (key, i) for (i, (key, heading)) in enumerate(datasets) ])
+
+    sys.path.append( os.path.join(sys.path[0],'jtLib') )
+    from MgiRefDb import streamingCursor, makeStandInDb, connectMgiDb
+    config = ConfigParser.SafeConfigParser()
+    config.readfp( open(args[ "CONFIG"], 'r'), args[ "CONFIG"])
+    batchSize = BATCHSIZE
+    if config.has_option('MGI Database', 'batchSize'):
+	batchSize = config.getint('MGI Database', 'batchSize')
+
+    if args[ "STANDIN"]:
+	conn = makeStandInDb( args[ "STANDIN"].split(',') )
+	source = "stand-in from %s" % args[ "STANDIN"]
+    else:
+	conn = connectMgiDb(config)
+	source = "%s..%s" % (config.get('MGI Database', 'host'),
+				    config.get('MGI Database', 'database'))
+
+    if notQuiet:
+	sys.stderr.write("Counting %s refs by journal and dataset on %s\n" % \
+						    (args[ "YEAR"], source) )
+	sys.stderr.flush()
+
+    startTime = time.time()
+    cursor = streamingCursor(conn)
+    cursor.arraysize = batchSize
+    cursor.execute( PIVOTSQL % {'year' : int(args[ "YEAR"])} )
+
+    # print column headers
+    sys.stdout.write( string.join( ['journal'] +
+				[ heading for (key, heading) in datasets ], delim) )
+    sys.stdout.write( "\n")
+
+    # rows come in journal order, so a journal's row is done when we see
+    #   the next journal
+    journal = None
+    counts = []
+    numJournals = 0
+    rows = cursor.fetchmany(batchSize)
+    while rows:
+	for (j, datasetKey, count) in rows:
+	    if j != journal:
+		if journal != None:
+		    writePivotRow( journal, counts, delim)
+		    numJournals += 1
+		journal = j
+		counts = [None] * len(datasets)
+	    i = column.get( int(datasetKey))
+	    if i != None:
+		counts[i] = count
+	rows = cursor.fetchmany(batchSize)
+    if journal != None:
+	writePivotRow( journal, counts, delim)
+	numJournals += 1
+    cursor.close()
+    conn.close()
+
+    if notQuiet:
+	sys.stderr.write( "%d journals in %8.3f seconds\n" % \
+					(numJournals, time.time() - startTime))
+	sys.stderr.flush()
+# end processPivot() ----------------------------------
+
+def writePivotRow( journal, counts, delim):
+    vals = map( cleanVal, [journal] + counts)
+    sys.stdout.write( string.join(vals, delim) + "\n")
+    sys.stdout.flush()
+
 def cleanVal( val):
     if val == None:
 	val = ""
@@ -1,16 +1,18 @@
--- Get all refs from MGI for 2013 including their J#, pubmed ID, DOI, and a column
---   for each triage category:  A_P, GO, Expr, Tumor
+-- Get all refs from MGI for a year including their J#, pubmed ID, DOI, and a
+--   column for each triage category:  A_P, GO, Expr, Tumor
+-- %(year)s is replaced by the year (see loadMGIrefs.py). Sticks to portable
+--   SQL so it runs on the MGI database and the SQLite stand-in (MgiRefDb.py)
 --set rowcount 100
 --||
 select r.title, r.title2, r.authors, r.authors2, r.journal, r.vol, r.issue,
         r.date, r.year, r.pgs, r._primary as firstAuthor,
         a.accid as Jnum, p.accid as pubmed, d.accid as DOI,
-        (CASE WHEN dsa._dataset_key = Null THEN "false" ELSE "true" END) as A_P,
-        (CASE WHEN dsg._dataset_key = Null THEN "false" ELSE "true" END) as GO,
-        (CASE WHEN dse._dataset_key = Null THEN "false" ELSE "true" END) as Expr,
-        (CASE WHEN dst._dataset_key = Null THEN "false" ELSE "true" END) as Tumor
+        (CASE WHEN dsa._dataset_key IS NULL THEN 'false' ELSE 'true' END) as A_P,
+        (CASE WHEN dsg._dataset_key IS NULL THEN 'false' ELSE 'true' END) as GO,
+        (CASE WHEN dse._dataset_key IS NULL THEN 'false' ELSE 'true' END) as Expr,
+        (CASE WHEN dst._dataset_key IS NULL THEN 'false' ELSE 'true' END) as Tumor
 from bib_refs r  inner join acc_accession a on
-  (a._object_key = r._refs_key and a._logicaldb_key = 1 and a.prefixpart = "j:")
+  (a._object_key = r._refs_key and a._logicaldb_key = 1 and a.prefixpart = 'J:')
     left outer join acc_accession p on
     (p._object_key = r._refs_key and p._logicaldb_key = 29) -- pubmed
     left outer join acc_accession d on
@@ -23,4 +25,4 @@ from bib_refs r  inner join acc_accession a on
     (r._refs_key = dse._refs_key and dse._dataset_key = 1004) -- Expr
     left outer join bib_dataset_assoc dst on
     (r._refs_key = dst._refs_key and dst._dataset_key = 1007) -- Tumor
-where r.year = 2013
+where r.year = %(year)s
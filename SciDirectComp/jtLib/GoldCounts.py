@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# Class GoldCountCube - counts of MGI references by journal and triage
+#	category (the "gold" positives), all computed at once from an MgiRefs.
+#	Uses NumPy if it is installed, plain python if not.
+#
+# Run as a script to print the journal by triage category table that
+#   getMGIrefTcCounts.py gets from the database, from an MGI references file
+#   instead.
+
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# columns of the getMGIrefTcCounts.py report: (heading, MGI refs field)
+REPORTCOLUMNS = [ ('A&P', 'A_P'), ('GO', 'GO'), ('Expr', 'Expr'),
+							    ('Tumor', 'Tumor') ]
+
+class GoldCountCube (object): #[
+    '''
+    A GoldCountCube holds the number of MGI references in each
+    (journal, triage category), and in each journal overall.
+    Triage categories are named by their MGI refs field (A_P, GO, ...),
+    '' means all refs in the journal (like the "None" category).
+
+    Built in one pass: each ref's journal (as a code) and its triage
+    category bitmask (MgiRefs.getTriageMask()) go into two arrays, then
+    each category's counts are one bincount of the journal codes of the
+    refs w/ that bit set. ColumnarRefTables already have both arrays, so
+    for them we don't look at the refs at all.
+    '''
+    def __init__(self,
+		mgiRefs		# MgiRefs to count
+		):
+	self.fields = [ f for (b, f) in sorted( [ (b, f) for (f, b) in
+						mgiRefs.tcBits.items() ] ) ]
+	bits = [ mgiRefs.tcBits[f] for f in self.fields ]
+
+	mgiDs = mgiRefs.mgiDs
+	if hasattr(mgiDs, 'getCodedColumn'):	# ColumnarRefTable
+	    (jcodes, self.journals) = mgiDs.getCodedColumn('journal')
+	    masks = mgiDs.getTriageMasks()
+	else:
+	    (jcodes, self.journals, masks) = self._getColumns(mgiRefs)
+
+	if numpy != None:
+	    counts = self._countNumpy(jcodes, masks, bits)
+	else:
+	    counts = self._countPython(jcodes, masks, bits)
+
+	self.cube = {}		# dict[(journal, field)] = count
+	for (jname, jcounts) in zip(self.journals, counts):
+	    self.cube[ (jname, '') ] = jcounts[0]
+	    for (f, n) in zip(self.fields, jcounts[1:]):
+		self.cube[ (jname, f) ] = n
+    # end __init__() ----------------------------
+
+    def _getColumns(self, mgiRefs):
+	''' Return (journal codes, journal names, triage masks) for the refs
+	'''
+	from array import array
+	jcodes = array('l')
+	masks = array('L')
+	codeOf = {}		# dict[journal] = code
+	journals = []
+	for r in mgiRefs.mgiDs.getRecords():
+	    jname = r['journal']
+	    code = codeOf.get(jname)
+	    if code == None:
+		code = len(journals)
+		codeOf[jname] = code
+		journals.append(jname)
+	    jcodes.append(code)
+	    masks.append( mgiRefs.getTriageMask(r) )
+	return (jcodes, journals, masks)
+
+    def _countNumpy(self, jcodes, masks, bits):
+	''' Return list of [total, count for each bit] per journal code
+	'''
+	nJournals = len(self.journals)
+	jcodes = numpy.frombuffer(jcodes, dtype=jcodes.typecode)
+	masks = numpy.frombuffer(masks, dtype=masks.typecode)
+	counts = numpy.zeros( (nJournals, len(bits) + 1), dtype=int)
+	if len(jcodes) == 0: return counts.tolist()
+	counts[:,0] = numpy.bincount(jcodes, minlength=nJournals)
+	for (i, bit) in enumerate(bits):
+	    inTc = (masks >> bit) & 1 == 1
+	    counts[:,i+1] = numpy.bincount(jcodes[inTc], minlength=nJournals)
+	return counts.tolist()
+
+    def _countPython(self, jcodes, masks, bits):
+	counts = [ [0] * (len(bits) + 1) for j in self.journals ]
+	for (code, mask) in zip(jcodes, masks):
+	    jcounts = counts[code]
+	    jcounts[0] += 1
+	    if mask == 0: continue
+	    for (i, bit) in enumerate(bits):
+		if (mask >> bit) & 1: jcounts[i+1] += 1
+	return counts
+
+    def getJournalNames(self):
+	return self.journals
+
+    def getFields(self):
+	return self.fields
+
+    def getCount(self,
+		jname,		# MGI journal name
+		field=''	# triage category field, '' for all refs
+		):
+	''' Return num of refs in the journal and triage category
+	'''
+	return self.cube.get( (jname, field), 0)
+
+    def getRows(self,
+		fields,		# list of triage category fields
+		journals=None	# list of MGI journal names, None for all
+				#   journals that have refs in any of fields
+		):
+	''' Return list of (journal name, list of counts for fields),
+	    in journal name order
+	'''
+	if journals == None:
+	    journals = [ j for j in self.journals if j != '' and
+			    max( [ self.getCount(j, f) for f in fields ] ) > 0 ]
+	return [ (j, [ self.getCount(j, f) for f in fields ])
+						    for j in sorted(journals) ]
+
+    def writeReport(self,
+		fp,				# file to write to
+		columns=REPORTCOLUMNS,		# list of (heading, field)
+		delim='\t'
+		):
+	''' Write the journal by triage category table, like
+	    getMGIrefTcCounts.py (zero counts are blank, like its NULLs)
+	'''
+	fp.write( delim.join( ['journal'] + [ h for (h, f) in columns ] ) +'\n')
+	for (jname, counts) in self.getRows( [ f for (h, f) in columns ] ):
+	    fp.write( delim.join( [jname] + [ n and str(n) or ''
+						for n in counts ] ) + '\n')
+
+# end class GoldCountCube -------------------------- ]
+
+if __name__ == "__main__":
+
+    # Usage: GoldCounts.py MGI_refs_file [storage]
+    #   prints the journal by triage category table
+    from MGIarticles import MgiRefs
+    storage = 'columnar'
+    if len(sys.argv) > 2: storage = sys.argv[2]
+    sys.stdout = sys.stderr		# MgiRefs() chatter
+    mgiRefs = MgiRefs(sys.argv[1], storage=storage)
+    sys.stdout = sys.__stdout__
+    GoldCountCube(mgiRefs).writeReport(sys.stdout)
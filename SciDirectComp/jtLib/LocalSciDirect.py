@@ -0,0 +1,486 @@
+#!/usr/bin/python
+# Evaluate SciDirect queries locally, against a corpus of article metadata
+#   previously fetched from SciDirect, so we can try query variants
+#   without API calls.
+#
+# Class CorpusIndex   - inverted index over a list of article records that
+#			knows how to evaluate a parsed SciDirect query.
+# Class LocalSciDirect - stands in for the SciDirect connection JournalComp
+#			uses (refUtils SciDirectConnection: setQuery(),
+#			doCount(), doQuery()) but answers from a CorpusIndex.
+# loadCorpus(), saveCorpus(), corpusRecord() - reading/writing corpus files
+#
+# Caveat: SciDirect searches the full text of articles, we only have the
+#   metadata (title, abstract, keywords, journal, authors, dates), so ALL()
+#   queries will find fewer articles locally than SciDirect does.
+#   JournalComp --corpus compare reports how closely the counts agree.
+
+import sys
+import re
+import string
+import json
+import time
+import bisect
+import fnmatch
+from jakUtils import *
+from SciDirectQuery import *
+
+# fields we keep for each article in a corpus
+CORPUSFIELDS = [ 'DOI', 'pubmed', 'pii', 'title', 'abstract', 'keywords',
+		 'authors', 'journal', 'volume', 'issue', 'startingPage',
+		 'endingPage', 'coverDate', 'pubDate', 'pubType', 'prismType',
+	       ]
+
+# the text fields we index, and the SciDirect query fields that search them
+#  (uppercase). Fields not listed here search FIELDGROUPS['ALL']
+TEXTFIELDS = [ 'title', 'abstract', 'keywords', 'authors', 'journal' ]
+FIELDGROUPS = {
+	'ALL'		  : [ 'title', 'abstract', 'keywords' ],
+	'DOC-HEAD'	  : [ 'title', 'abstract', 'keywords', 'authors' ],
+	'TITLE-ABSTR-KEY' : [ 'title', 'abstract', 'keywords' ],
+	'TITLE-ABS-KEY'   : [ 'title', 'abstract', 'keywords' ],
+	'TITLE'		  : [ 'title' ],
+	'ABSTRACT'	  : [ 'abstract' ],
+	'ABS'		  : [ 'abstract' ],
+	'KEYWORDS'	  : [ 'keywords' ],
+	'KEY'		  : [ 'keywords' ],
+	'AUTHORS'	  : [ 'authors' ],
+	'AUTHOR-NAME'	  : [ 'authors' ],
+	'SRCTITLE'	  : [ 'journal' ],
+	}
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+def tokenizeText( s	# string
+    ):
+    ''' Return list of lower case words in s
+    '''
+    return WORD_RE.findall( s.lower() )
+
+class CorpusIndex (object): #[
+    '''
+    A CorpusIndex is an inverted index over a list of article records
+    (dicts w/ the CORPUSFIELDS). For each text field, maps each word to
+    the articles (by position in the list, "docId") and word positions where
+    the word occurs, so we can do word, phrase, proximity and wildcard
+    searches.
+
+    search() evaluates a parsed SciDirect query (see SciDirectQuery.py) and
+    returns the set of docIds that match.
+    '''
+    def __init__(self, articles	# list of article records
+		):
+	self.articles = articles
+	self.allDocs = set( range(len(articles)) )
+
+	self.postings = {}	# postings[field][word] = {docId: [positions]}
+	for f in TEXTFIELDS:
+	    self.postings[f] = {}
+	for docId in range(len(articles)):
+	    a = articles[docId]
+	    for f in TEXTFIELDS:
+		fieldPostings = self.postings[f]
+		pos = 0
+		for w in tokenizeText( a.get(f, '') ):
+		    fieldPostings.setdefault(w, {}).setdefault(docId,[]).append(pos)
+		    pos += 1
+
+	self.vocab = {}		# vocab[field] = sorted list of words,
+	for f in TEXTFIELDS:	#   for expanding wildcards
+	    self.vocab[f] = sorted( self.postings[f].keys() )
+	self.wildcardCache = {}	# dict[(field,pattern)] = list of words
+    # end __init__() ----------------------------
+
+    def getArticles(self):
+	return self.articles
+
+    def getNumArticles(self):
+	return len(self.articles)
+
+    def search(self,
+		node,		# QueryNode (parsed query)
+		fields=None	# list of text fields to search, None = ALL
+		):
+	''' Return set of docIds of the articles that match the query.
+	'''
+	if fields == None: fields = FIELDGROUPS['ALL']
+
+	if isinstance(node, FieldQuery):
+	    return self.search( node.child,
+			FIELDGROUPS.get(node.field.upper(), FIELDGROUPS['ALL']))
+	elif isinstance(node, OrQuery):
+	    docs = set()
+	    for c in node.children:
+		docs |= self.search(c, fields)
+	    return docs
+	elif isinstance(node, AndQuery):
+	    docs = self.search(node.children[0], fields)
+	    for c in node.children[1:]:
+		if len(docs) == 0: break
+		docs &= self.search(c, fields)
+	    return docs
+	elif isinstance(node, AndNotQuery):
+	    docs = self.search(node.left, fields)
+	    if len(docs) == 0: return docs
+	    return docs - self.search(node.right, fields)
+	elif isinstance(node, NearQuery):
+	    return self.searchNear(node, fields)
+	elif isinstance(node, DateQuery):
+	    return self.searchDate(node)
+	elif isinstance(node, Phrase) and node.exact:
+	    return self.searchExact(node.text, fields)
+	else:				# Term or loose Phrase
+	    return set( self.getPositions(node, fields).keys() )
+    # end search() ----------------------------
+
+    def getPositions(self,
+		node,		# Term, loose Phrase, or OrQuery of those
+		fields		# list of text fields to search
+		):
+	''' Return dict[docId] = set of (field, position) where the node
+	    matches (for phrases, the position of the 1st word).
+	'''
+	if isinstance(node, OrQuery):
+	    found = {}
+	    for c in node.children:
+		for (docId, poss) in self.getPositions(c, fields).items():
+		    found.setdefault(docId, set()).update(poss)
+	    return found
+
+	if isinstance(node, Term) and node.hasWildcard():
+	    if node.text.strip('*?') == '':	# matches everything
+		return dict( [ (d, set()) for d in self.allDocs ] )
+	    found = {}
+	    for f in fields:
+		for w in self.expandWildcard(f, node.text.lower()):
+		    for (docId, poss) in self.postings[f][w].items():
+			found.setdefault(docId, set()).update(
+						    [ (f, p) for p in poss ] )
+	    return found
+
+	if isinstance(node, (Term, Phrase)):
+	    words = tokenizeText(node.text)
+	    found = {}
+	    if len(words) == 0: return found
+	    for f in fields:
+		fieldPostings = self.postings[f]
+		if not fieldPostings.has_key(words[0]): continue
+		for (docId, poss) in fieldPostings[words[0]].items():
+		    for p in poss:
+			if self.phraseAt(f, docId, words, p):
+			    found.setdefault(docId, set()).add( (f, p) )
+	    return found
+
+	# anything else we treat as matching anywhere in the doc
+	return dict( [ (d, set()) for d in self.search(node, fields) ] )
+    # end getPositions() ----------------------------
+
+    def phraseAt(self, f, docId, words, p):
+	''' Return True if words[1:] follow word position p in field f of
+	    docId.
+	'''
+	fieldPostings = self.postings[f]
+	for i in range(1, len(words)):
+	    docs = fieldPostings.get(words[i])
+	    if docs == None or p+i not in docs.get(docId, []): return False
+	return True
+
+    def expandWildcard(self,
+		f,		# text field name
+		pattern		# lower case word w/ * and/or ? wildcards
+		):
+	''' Return list of words in field f's vocabulary matching pattern.
+	'''
+	key = (f, pattern)
+	if not self.wildcardCache.has_key(key):
+	    vocab = self.vocab[f]
+	    prefix = re.split(r'[*?]', pattern, 1)[0]
+	    if prefix != '':		# only need to look at words w/ prefix
+		i = bisect.bisect_left(vocab, prefix)
+		j = bisect.bisect_left(vocab, prefix + '\xff')
+		candidates = vocab[i:j]
+	    else:
+		candidates = vocab
+	    self.wildcardCache[key] = fnmatch.filter(candidates, pattern)
+	return self.wildcardCache[key]
+    # end expandWildcard() ----------------------------
+
+    def searchExact(self,
+		text,		# exact phrase text, case sensitive
+		fields		# list of text fields to search
+		):
+	''' Return set of docIds whose fields contain text exactly
+	    (w/ punctuation, like {/-} or {HA-tagged}).
+	'''
+	words = tokenizeText(text)
+	if len(words) > 0:		# only check docs w/ all the words
+	    candidates = set( self.getPositions( Phrase(text), fields).keys() )
+	else:				# punctuation only, check all docs
+	    candidates = self.allDocs
+	found = set()
+	for docId in candidates:
+	    a = self.articles[docId]
+	    for f in fields:
+		if text in a.get(f, ''):
+		    found.add(docId)
+		    break
+	return found
+    # end searchExact() ----------------------------
+
+    def searchNear(self, node, fields):
+	''' Return set of docIds matching W/n or PRE/n.
+	    Operands that are not words, phrases, or ORs of those are just
+	    ANDed.
+	'''
+	def isSimple(n):
+	    if isinstance(n, OrQuery):
+		return all( [ isSimple(c) for c in n.children ] )
+	    return isinstance(n, Term) or \
+			    (isinstance(n, Phrase) and not n.exact)
+
+	if not (isSimple(node.left) and isSimple(node.right)):
+	    return self.search( AndQuery( [node.left, node.right] ), fields)
+
+	left = self.getPositions(node.left, fields)
+	right = self.getPositions(node.right, fields)
+	found = set()
+	for docId in set(left.keys()) & set(right.keys()):
+	    for (lf, lp) in left[docId]:
+		for (rf, rp) in right[docId]:
+		    if lf != rf: continue
+		    d = rp - lp
+		    if node.op == 'PRE' and 0 < d <= node.distance or \
+			node.op == 'W' and 0 < abs(d) <= node.distance:
+			found.add(docId)
+			break
+		if docId in found: break
+	return found
+    # end searchNear() ----------------------------
+
+    def searchDate(self, node):
+	''' Return set of docIds matching Pub-Date AFT|BEF|IS yyyymmdd
+	'''
+	value = node.value
+	found = set()
+	for docId in self.allDocs:
+	    d = self.articles[docId].get('pubDate', '')
+	    if d == '': continue
+	    if node.op == 'AFT' and d > value or \
+		node.op == 'BEF' and d < value or \
+		node.op == 'IS' and d.startswith(value):
+		found.add(docId)
+	return found
+    # end searchDate() ----------------------------
+
+# end class CorpusIndex -------------------------- ]
+
+class LocalSciDirect (object): #[
+    '''
+    A LocalSciDirect object answers SciDirect queries from a CorpusIndex.
+    It has the same methods as the SciDirect connection JournalComp uses
+    (SciDirectConnection), so it can be used in its place:
+	setQuery(), setStartDate(), setEndDate(), setContent(),
+	setSubscribed(), setSubjects(), setBufferSize(), setDebugWriter(),
+	doCount(), doQuery()
+    Content, subscribed and subjects are ignored - the corpus is whatever
+    was fetched to build it.
+    Several LocalSciDirect objects can share one CorpusIndex.
+    '''
+    def __init__(self,
+		index,		# CorpusIndex
+		query=''	# SciDirect query string
+		):
+	self.index = index
+	self.qstring = query
+	self.startDate = None	# means no start date
+	self.endDate = None	# means no end date
+	self.debugWriter = None	# function to write debug msgs to, None=none
+	self.bufferSize = 100	# num of articles per "page" for doQuery()
+				#   pageCallbacks
+	self.numApiCalls = 0	# num of doCount()/doQuery() calls
+	self.apiCallback = None	# function() called w/ each of them
+    # end __init__() ----------------------------
+
+    def setQuery(self, query):
+	self.qstring = query
+
+    def setStartDate(self, dateString):
+	self.startDate = dateString
+
+    def setEndDate(self, dateString):
+	self.endDate = dateString
+
+    def setContent(self, s):
+	pass
+
+    def setSubscribed(self, subscribed):
+	pass
+
+    def setSubjects(self, s):
+	pass
+
+    def setDebugWriter(self, writer):
+	self.debugWriter = writer
+
+    def setBufferSize(self, n):
+	self.bufferSize = n
+
+    def setApiCallback(self, callback):
+	self.apiCallback = callback
+
+    def getNumApiCalls(self):
+	return self.numApiCalls
+
+    def getFullQuery(self, query=None):
+	''' Return the query string w/ the start and end dates added
+	'''
+	if query == None: query = self.qstring
+	if self.startDate != None:
+	    query = 'Pub-Date AFT %s AND (%s)' % (self.startDate, query)
+	if self.endDate != None:
+	    query = 'Pub-Date BEF %s AND (%s)' % (self.endDate, query)
+	return query
+
+    def getMatchingIds(self, query=None):
+	''' Return sorted list of docIds matching the query
+	'''
+	self.numApiCalls += 1
+	if self.apiCallback != None: self.apiCallback()
+	query = self.getFullQuery(query)
+	if self.debugWriter != None:
+	    self.debugWriter("Local query: %s\n" % query)
+	return sorted( self.index.search( parseQuery(query) ) )
+
+    def doCount(self, query=None):
+	''' Return the number of articles in the corpus matching the query
+	'''
+	return len( self.getMatchingIds(query) )
+
+    def doQuery(self,
+		query=None,	# query string, use default query if None
+		numToGet=25,	# (max) num items to return
+		startIndex=0,	# index of 1st result to return
+		pageCallback=None, # function(list of records), called w/
+				#  each page (bufferSize) of results,
+				#  returns False to stop paging
+		numResults=None	# ignored, we always know the total
+		):
+	''' Return (total num of matching articles, list of the article
+	    records (dicts) from startIndex, up to numToGet of them)
+	'''
+	articles = self.index.getArticles()
+	ids = self.getMatchingIds(query)
+	results = [ articles[i] for i in ids[startIndex:startIndex+numToGet] ]
+	if pageCallback == None:
+	    return (len(ids), results)
+	for start in range(0, len(results), self.bufferSize):
+	    if not pageCallback( results[start:start+self.bufferSize] ):
+		return (len(ids), results[:start+self.bufferSize])
+	return (len(ids), results)
+
+# end class LocalSciDirect -------------------------- ]
+
+DATEFORMATS = [ '%d %B %Y', '%B %Y', '%Y-%m-%d', '%Y' ]
+
+def pubDate( coverDate	# string, SciDirect cover date, like "15 March 2013"
+    ):
+    ''' Return coverDate as 'yyyymmdd' or '' if we cannot parse it.
+	SciDirect cover dates come in various forms, "15 March 2013",
+	"March 2013", "1-15 March 2013", ...
+    '''
+    s = coverDate.strip()
+    s = re.sub(r'^\d+\s*[-\xe2\x80\x93]+\s*(\d+)', r'\1', s) # day ranges
+    s = re.sub(r'\b(\w+)\s*[-/]\s*\w+\s+(\d{4})$', r'\1 \2', s) # month ranges
+    for fmt in DATEFORMATS:
+	try:
+	    return time.strftime('%Y%m%d', time.strptime(s, fmt))
+	except ValueError:
+	    pass
+    m = re.search(r'\b(19|20)\d\d\b', s)	# fall back to just the year
+    if m: return m.group(0) + '0101'
+    return ''
+# end pubDate() ----------------------------------
+
+def corpusRecord( sdRef		# SciDirect result record (dict)
+    ):
+    ''' Return a corpus record (dict w/ CORPUSFIELDS) for the SciDirect
+	result record.
+    '''
+    rcd = {}
+    for f in CORPUSFIELDS:
+	v = sdRef.get(f, '')
+	if v == 'none': v = ''
+	rcd[f] = stringIt(v)
+    if rcd['pubDate'] == '':
+	rcd['pubDate'] = pubDate( rcd['coverDate'] )
+    return rcd
+# end corpusRecord() ----------------------------------
+
+def saveCorpus( filename,	# string
+		articles	# list of corpus records
+    ):
+    ''' Write the corpus records to filename, one json record per line.
+    '''
+    fp = open(filename, 'w')
+    for a in articles:
+	fp.write( json.dumps(a, sort_keys=True) + '\n')
+    fp.close()
+# end saveCorpus() ----------------------------------
+
+def loadCorpus( filename	# string
+    ):
+    ''' Return list of corpus records read from filename
+    '''
+    articles = []
+    fp = open(filename, 'r')
+    for line in fp:
+	if line.strip() == '': continue
+	a = {}
+	for (k, v) in json.loads(line).items():
+	    a[stringIt(k)] = stringIt(v)
+	articles.append(a)
+    fp.close()
+    return articles
+# end loadCorpus() ----------------------------------
+
+if __name__ == "__main__":
+
+    # some test code
+    articles = [ corpusRecord(r) for r in [
+	{ 'DOI' : '10.1016/1', 'title' : 'Knockout mice lacking Pax6',
+	  'abstract' : 'Pax6-/- embryos show a sarcoma phenotype.',
+	  'journal' : 'Developmental Biology', 'coverDate' : '15 March 2013'},
+	{ 'DOI' : '10.1016/2', 'title' : 'A rat study',
+	  'abstract' : 'Osteosarcoma in the rat, heterozygous for Trp53',
+	  'journal' : 'Cell', 'coverDate' : 'March 2012'},
+	{ 'DOI' : '10.1016/3', 'title' : 'Mouse knockout strategies',
+	  'abstract' : 'We review how to knockout genes in the mouse.',
+	  'journal' : 'Cell Reports', 'coverDate' : '1-15 January 2013'},
+	] ]
+    index = CorpusIndex(articles)
+    sd = LocalSciDirect(index)
+    tests = [
+	('ALL(mice)', 1),
+	('ALL("knockout mice")', 1),
+	('ALL("knockout mouse")', 0),
+	('ALL(knockout W/2 mouse)', 1),
+	('ALL(mouse PRE/1 knockout)', 1),
+	('ALL(*sarcoma)', 2),
+	('ALL(heterozygo*)', 1),
+	('ALL({/-})', 1),
+	('srctitle("Cell")', 2),
+	('ALL(mouse OR mice OR rat) AND NOT TITLE(review OR study)', 2),
+	('Pub-Date AFT 20121231 AND ALL(knockout)', 2),
+	]
+    for (q, expected) in tests:
+	sd.setQuery(q)
+	n = sd.doCount()
+	if n == expected: status = 'ok'
+	else: status = 'WRONG, expected %d' % expected
+	print "%-60s %d %s" % (q, n, status)
+
+    sd.setStartDate('20121231')
+    sd.setEndDate('20140101')
+    sd.setQuery('ALL(mouse OR mice)')
+    (total, results) = sd.doQuery(numToGet=10)
+    print "With dates: %d %s" % (total, [ r['DOI'] for r in results ])
@@ -1,8 +1,12 @@
 
 import sys
+import os
 import string
+import operator
 
 from tabledatasetlib import *
+from MgiRefStore import *
+from MgiRefDb import SqliteRefTable
 
 class TriageCategory (object): #[
     ''' Represents a triage category  (A, G, T, E)
@@ -45,14 +49,64 @@ class MgiRefs (object): #[
 
     Customizes the TableDataSet for the needs of this program:
 	populates field: startingPage
+
+    storage says how to load and hold the references:
+	'tabledataset'	- TextFileTableDataSet
+	'snapshot'	- FastRefTable (MgiRefStore.py), which parses the file
+			  in one pass and keeps a binary snapshot next to it
+			  for fast loading next time (a cache, it is loaded
+			  whole, not mmap'ed).
+			  snapshotCheck says how to tell if the snapshot is
+			  out of date, 'mtime' or 'md5'
+	'columnar'	- ColumnarRefTable (MgiRefStore.py), uses much less
+			  memory. Records are RefRow views, not dicts, but
+			  work the same for reading fields: r['Jnum']
+	'lazy'		- LazyRefTable (MgiRefStore.py), like columnar but
+			  only keeps IDs, journal, volume and triage
+			  categories. Reads other fields of a row from the
+			  file when they are used (e.g., false negatives)
+	'sqlite'	- SqliteRefTable (MgiRefDb.py), filename is a SQLite
+			  store loaded from the MGI database by loadMGIrefs.py
+    Either way, self.mgiDs has getRecords() and getRecordsByIndex()
+
+    Our own indexes (triage category, DOI, pubmed, journal/vol/page) hold
+    row keys, not refs: for columnar and lazy storage, the row number, so
+    we don't keep a RefRow for every ref. The RefRow is made when a ref is
+    looked up. For the other storages the records are dicts that are in
+    memory anyway, so the row key is the record itself.
     '''
-    def __init__(self, filename):
+    def __init__(self,
+		filename,
+		storage='tabledataset',	# see above
+		snapshotCheck='mtime'	# see above
+		):
 	print "Reading MGI references from %s ..." % filename
 	sys.stdout.flush()
-	self.mgiDs = TextFileTableDataSet( "MGI References",
-		    filename,
-		    readNow=0)
-	self._initRefDataSet()
+	if storage == 'snapshot':
+	    self.mgiDs = FastRefTable( filename, check=snapshotCheck)
+	    print "(from %s)" % self.mgiDs.getLoadedFrom()
+	elif storage == 'columnar':
+	    self.mgiDs = ColumnarRefTable( filename)
+	elif storage == 'lazy':
+	    self.mgiDs = LazyRefTable( filename)
+	elif storage == 'sqlite':
+	    self.mgiDs = SqliteRefTable( filename)
+	    print "(from %s)" % self.mgiDs.getLoadedFrom()
+	elif storage == 'tabledataset':
+	    self.mgiDs = TextFileTableDataSet( "MGI References",
+			filename,
+			readNow=0)
+	    self._initRefDataSet()
+	else:
+	    raise ValueError( "unknown MGI references storage '%s'" % storage)
+	if isinstance(self.mgiDs, ColumnarRefTable):
+	    self.refOf = self.mgiDs.getRecord	# row key -> RefRow
+	else:
+	    self.refOf = None			# row key is the ref
+	self.ambiguousIds = {}	# dict[(field, value)] = num of MGI refs it
+				#   matches, for IDs that match more than one
+	self._initTriageIndex()
+	self._initIdIndexes()
 	print "done"
 	sys.stdout.flush()
     # end __init__() ----------------------------
@@ -74,18 +128,141 @@ class MgiRefs (object): #[
 	self.mgiDs.addField( 'endingPage', None)
 
 	for r in self.mgiDs.getRecords():
-	    pgs = r['pgs'].strip()
-	    pages = pgs.split('-')	# MGI's pgs fmt is like "87-94"
-	    sp = pages[0]
-	    if len(pages) == 2:
-		ep = pages[1]
-	    else:
-		ep = ""
+	    (sp, ep) = splitPages( r['pgs'])
 	    self.mgiDs.updateFields( r['_rcdkey'], 'startingPage', sp)
 	    self.mgiDs.updateFields( r['_rcdkey'], 'endingPage', ep)
 
     # end _initRefDataSet() ---------------------------
 
+    def _initTriageIndex(self):
+	''' Precompute each reference's triage category bitmask and an index
+	    of the refs in each (journal, triage category).
+	    The triage category fields are the fields whose values are all
+	    'true' or 'false' (A_P, GO, Expr, Tumor, ...).
+	'''
+	self.tcBits = {}	# dict[triage category field] = bit number
+	self.masks = None	# dict[_rcdkey] = bitmask,
+				#  None => self.mgiDs has the masks
+	if hasattr(self.mgiDs, 'getTriageMask'):  # ColumnarRefTable has them
+	    for f in self.mgiDs.getFieldNames():
+		if self.mgiDs.getBoolBit(f) != None:
+		    self.tcBits[f] = self.mgiDs.getBoolBit(f)
+	    getMask = self.mgiDs.getTriageMasks().__getitem__	# by row num
+	else:
+	    rcds = self.mgiDs.getRecords()
+	    fields = []
+	    if len(rcds) > 0:
+		fields = sorted( [ f for f in rcds[0].keys() if f[0] != '_' ] )
+	    for f in fields:
+		isBool = True
+		for r in rcds:
+		    if r[f] != 'true' and r[f] != 'false':
+			isBool = False
+			break
+		if isBool: self.tcBits[f] = len(self.tcBits)
+	    self.masks = {}
+	    bits = self.tcBits.items()
+	    for r in rcds:
+		mask = 0
+		for (f, bit) in bits:
+		    if r[f] == 'true': mask |= 1 << bit
+		self.masks[ r['_rcdkey'] ] = mask
+	    getMask = self.getTriageMask
+
+	self.tcIndex = {}	# dict[(MGI journal name, triage category
+				#   field)] = list of row keys
+	bits = self.tcBits.items()
+	(keys, [getJournal]) = self._getKeyColumns( ['journal'])
+	for key in keys:
+	    mask = getMask(key)
+	    if mask == 0: continue
+	    jname = getJournal(key)
+	    for (f, bit) in bits:
+		if (mask >> bit) & 1:
+		    self.tcIndex.setdefault( (jname, f), []).append(key)
+    # end _initTriageIndex() ---------------------------
+
+    def _initIdIndexes(self):
+	''' Index the refs by normalized DOI and integer pubmed ID, so
+	    IDs match regardless of case, "doi:" prefixes, URL forms,
+	    leading zeros...
+	    Also index them by (journal, volume, starting page), for
+	    matching articles that have no ID we can match on.
+	'''
+	self.doiIndex = {}	# dict[normalized DOI] = row key(s)
+	self.pubmedIndex = {}	# dict[pubmed key] = row key(s)
+	self.jvpIndex = {}	# dict[jvpKey()] = row key(s)
+				#  (see _addToIndex())
+	(keys, [getDoi, getPubmed, getJournal, getVol, getPage]) = \
+		self._getKeyColumns( ['DOI', 'pubmed', 'journal', 'vol',
+							    'startingPage'])
+	for key in keys:
+	    doi = normalizeDoi( getDoi(key))
+	    if doi != None:
+		self._addToIndex( self.doiIndex, doi, key)
+	    pubmed = pubmedKey( getPubmed(key))
+	    if pubmed != None:
+		self._addToIndex( self.pubmedIndex, pubmed, key)
+	    jvp = jvpKey( getJournal(key), getVol(key), getPage(key))
+	    if jvp != None:
+		self._addToIndex( self.jvpIndex, jvp, key)
+    # end _initIdIndexes() ---------------------------
+
+    def _getKeyColumns(self,
+		    fields	# list of field names
+	):
+	''' Return (row keys of all the refs, list of function(row key)
+	    returning the field's value, for each of fields).
+	    For columnar and lazy storage, the row keys are row numbers, and
+	    the functions go straight to the columns: no RefRows are made,
+	    and (for the LazyRefTable fields we index on) no rows are read
+	    from the file.
+	'''
+	if self.refOf == None:
+	    return ( self.mgiDs.getRecords(),
+			    [ operator.itemgetter(f) for f in fields ] )
+	return ( xrange( self.mgiDs.getNumRecords()),
+			    [ self.mgiDs.getFieldGetter(f) for f in fields ] )
+
+    def _addToIndex(self, index, k, rowKey):
+	''' Add rowKey to index[k]. Most keys (IDs) are unique, so we store
+	    a single row key as is, and only make a list for duplicates
+	    (like ColumnarRefTable's indexes).
+	'''
+	rows = index.get(k)
+	if rows == None:
+	    index[k] = rowKey
+	elif type(rows) == type([]):
+	    rows.append(rowKey)
+	else:
+	    index[k] = [rows, rowKey]
+
+    def _getRefs(self, index, k):
+	''' Return list of the refs under k in one of our indexes
+	'''
+	rows = index.get(k)
+	if rows == None: return []
+	if type(rows) != type([]): rows = [rows]
+	if self.refOf == None: return list(rows)
+	return map( self.refOf, rows)
+
+    def getTriageMask(self,
+		    ref		# reference record
+	):
+	''' Return the ref's triage category bitmask
+	'''
+	if self.masks == None:
+	    return self.mgiDs.getTriageMask( ref['_rcdkey'])
+	return self.masks[ ref['_rcdkey'] ]
+
+    def getTriageBit(self,
+		    tc		# TriageCategory object
+	):
+	''' Return the bit number for tc in the triage category bitmasks,
+	    None if there isn't one (e.g., the "None" tc).
+	'''
+	return self.tcBits.get( tc.getMgiCode() )
+
     def getMgiRefsByJournal(self,
     		   j		# Journal, the Journal to get list of pubs from
 		   ):
@@ -94,64 +271,165 @@ class MgiRefs (object): #[
 	return self.mgiDs.getRecordsByIndex( 'journal', j.getMgiJname() )
     # end getMgiRefsByJournal() -----------------------------
 
+    def getMgiRefsByTriageCategory(self,
+		   j,		# Journal, the Journal to get list of pubs from
+		   tc		# TriageCategory object
+		   ):
+	''' Return the list of MGI refs from Journal j that are in the
+	    TriageCategory
+	'''
+	field = tc.getMgiCode()
+	if field == '':			# must be the "None" tc
+	    return self.getMgiRefsByJournal( j)
+	if self.tcBits.has_key(field):
+	    return self._getRefs( self.tcIndex, (j.getMgiJname(), field) )
+	return [ r for r in self.getMgiRefsByJournal( j)
+					if self.refInTriageCategory(r, tc) ]
+    # end getMgiRefsByTriageCategory() -----------------------------
+
     def matchRefById(self,
 		    f,	# string, name of a field, typically "DOI" or "pubmed"
 		    s	# string, the value of the ID to check
 		  ):
 	''' Return MGI reference record matching ID field f == s.
+	    DOI and pubmed are matched by their normalized forms
+	    (see normalizeDoi(), pubmedKey()).
 	    (if s == "None" or None, we don't count it as a match)
-	    Return None if no match.
-	    Throw exception if s matches more than one rcd (shouldn't happen)
+	    Return None if no match, or if s matches more than one rcd
+	    (e.g., DOIs that only differ in case, see _oneMatch()).
 	'''
 	if s == "none" or s == None: return None
 
-	rcds = self.mgiDs.getRecordsByIndex( f, s)
+	if f == 'DOI':
+	    rcds = self._getRefs( self.doiIndex, normalizeDoi(s))
+	elif f == 'pubmed':
+	    rcds = self._getRefs( self.pubmedIndex, pubmedKey(s))
+	else:
+	    rcds = self.mgiDs.getRecordsByIndex( f, s)
+	return self._oneMatch( rcds, f, s)
+    # end matchRefById() ----------------------
+
+    def matchRefsByIds(self,
+		    sdRefs,	# list of SciDirect result records
+		    j=None	# Journal the records are from. If given, records
+				#  w/o a DOI or pubmed match are matched by
+				#  journal, volume and starting page
+		  ):
+	''' Return list of the MGI reference records matching each SciDirect
+	    record, by DOI, then pubmed ID, then (if j) journal/volume/page.
+	    None where there is no match. A DOI that matches several refs
+	    falls back to the pubmed ID, if that matches any.
+	    None if the ID matches several refs (see _oneMatch()).
+	    Same as calling matchRefById() for DOI then pubmed for each, but
+	    in one pass w/o the per call overhead, for a whole page of
+	    results at once.
+	'''
+	getRefs = self._getRefs
+	doiIndex = self.doiIndex
+	pubmedIndex = self.pubmedIndex
+	matches = []
+	for sdRef in sdRefs:
+	    doi = normalizeDoi( sdRef['DOI'])
+	    rcds = getRefs(doiIndex, doi)
+	    f = 'DOI'
+	    if len(rcds) != 1:
+		pubmedRcds = getRefs( pubmedIndex, pubmedKey(sdRef['pubmed']))
+		if pubmedRcds or not rcds:
+		    f = 'pubmed'
+		    rcds = pubmedRcds
+	    if len(rcds) == 1:
+		matches.append( rcds[0])
+	    elif len(rcds) == 0 and j != None:
+		matches.append( self._matchSdRefByJVP(sdRef, j, doi) )
+	    else:
+		matches.append( self._oneMatch(rcds, f, sdRef[f]) )
+	return matches
+    # end matchRefsByIds() ----------------------
+
+    def _oneMatch(self, rcds, f, s):
+	''' Return the one rcd in rcds, None if empty.
+	    If more than one, we can't tell which it is, so return None
+	    (like _matchSdRefByJVP()), and warn the first time we see the ID.
+	    Can be called from the fetch thread (early stop callbacks), so
+	    just the one dict update.
+	'''
 	if len(rcds) == 0:
 	    return None
 	if len(rcds) == 1:
 	    return rcds[0]
-	else:
-	    raise JournalCompError(  \
-		'%s: "%s" matches more than one MGI ref\n' % (f, s))
-    # end matchRefById() ----------------------
+	if not self.ambiguousIds.has_key( (f, s) ):
+	    self.ambiguousIds[ (f, s) ] = len(rcds)
+	    sys.stderr.write('Warning: %s "%s" matches %d MGI refs, treated ' \
+		'as no match\n' % (f, s, len(rcds)) )
+	return None
+
+    def getAmbiguousIds(self):
+	''' Return dict[(field, value)] = num of MGI refs, for the IDs we saw
+	    that match more than one MGI ref
+	'''
+	return self.ambiguousIds
 
     def matchRefByJVP(self,
 		    j, 		# Journal
 		    v,		# string, representing a volume
 		    sp,		# string, representing starting Page number
-		    ep		# string, representing ending Page number
+		    ep=None	# string, representing ending Page number,
+		    		#  only used to pick between several matches
 		    ):
 	''' Return MGI reference record matching Journal j, volume v, and
-		startingPage p
-	    (if any of j, v, p are None or "None", we don't count as a match)
-	    Return None if no match.
-	    Throw exception if j v p matches more than one rcd
-	    (because it seems like this shouldn't happen. An alternative would
-	     be to just return None)
-	    JIM: no longer used
+		startingPage sp (compared in normalized form, see jvpKey())
+	    (if any of j, v, sp are None or "None", we don't count as a match)
+	    Return None if no match, or if j v sp (and ep) matches more than
+	    one rcd.
 	'''
 	if j == None: return None
-	if v == None or v == "none": return None
-	if p == None or p == "none": return None
-
-	matchingRef = None
-	jname = j.getMgiJname()
-				# iterating over startingPage values seems
-				#  more efficient than by journal or volume
-	for mgiRef in self.mgiDs.getRecordsByIndex( 'startingPage', sp):
-	    if mgiRef['journal'] == jname and mgiRef['vol'] == v \
-	    	and mgiRef['endingPage'] == ep:
-		if matchingRef == None:		# have a 1st match
-		    matchingRef = mgiRef
-		else:				# have a 2nd match
-		    raise JournalCompError(  \
-			'%s vol:%s page:%s matches more than one MGI ref\n' \
-			% (jname, v, p))
-
-	return matchingRef
-
+	rcds = self._getJVPMatches( j, v, sp, ep)
+	return self._oneMatch( rcds, 'journal/vol/page',
+					'%s %s:%s' % (j.getMgiJname(), v, sp))
     # end matchRefByJVP() ----------------------
 
+    def _getJVPMatches(self, j, v, sp, ep):
+	''' Return list of the MGI refs from journal j, volume v, starting
+	    page sp. If there are several, narrow them down by ending page ep.
+	'''
+	rcds = self._getRefs( self.jvpIndex, jvpKey(j.getMgiJname(), v, sp))
+	if len(rcds) == 0:
+	    rcds = self._getEPageMatches( j, v, sp)
+	if len(rcds) > 1 and normalizePage(ep) != None:
+	    ep = normalizePage(ep)
+	    rcds = [ r for r in rcds if normalizePage(r['endingPage']) == ep ]
+	return rcds
+
+    def _getEPageMatches(self, j, v, sp):
+	''' When nothing matches starting page sp, try it as the other kind
+	    of page: an electronic article number (E123) for print page 123,
+	    or the other way around, since one side sometimes has one where
+	    the other has the other.
+	    Return the ref only if there is exactly one, else [].
+	'''
+	p = normalizePage(sp)
+	if p == None: return []
+	if p[0] == 'E' and p[1:].isdigit(): other = p[1:]
+	elif p.isdigit(): other = 'E' + p
+	else: return []
+	rcds = self._getRefs( self.jvpIndex, jvpKey(j.getMgiJname(), v, other))
+	if len(rcds) != 1: return []
+	return rcds
+
+    def _matchSdRefByJVP(self, sdRef, j, doi):
+	''' Return the MGI ref matching the SciDirect record by journal j,
+	    volume and starting page, None if no match.
+	    Since there is no ID to go on, we are careful: no match if
+	    several refs match, or if the ref has a DOI that differs from
+	    the SciDirect record's (normalized) doi.
+	'''
+	rcds = self._getJVPMatches( j, sdRef['volume'], sdRef['startingPage'],
+							sdRef['endingPage'])
+	if len(rcds) != 1: return None
+	mgiDoi = normalizeDoi( rcds[0]['DOI'])
+	if doi != None and mgiDoi != None and mgiDoi != doi: return None
+	return rcds[0]
+
     def refInTriageCategory(self,
 		    ref,	# reference record
 		    tc		# TriageCategory object
@@ -162,8 +440,221 @@ class MgiRefs (object): #[
 	field = tc.getMgiCode()
 	if field == '':		# must be the "None" tc
 	    return True		# always match. Sort of means ignore tc.
-	else:
+	bit = self.tcBits.get(field)
+	if bit == None:		# not a true/false field
 	    return ref[field] == 'true'
+	return (self.getTriageMask(ref) >> bit) & 1 == 1
 
 # end class MgiRefs --------------------- ]
 
+
+def normalizeDoi( doi	# string, DOI from SciDirect or MGI
+    ):
+    ''' Return DOI in a standard form (lower case, no "doi:" or resolver
+	URL prefix), None if there isn't one.
+	DOIs are case insensitive.
+    '''
+    if doi == None: return None
+    d = doi.strip().lower()
+    for prefix in ['http://dx.doi.org/', 'https://dx.doi.org/',
+		    'http://doi.org/', 'https://doi.org/', 'doi:']:
+	if d.startswith(prefix):
+	    d = d[len(prefix):].strip()
+	    break
+    if d == '' or d == 'none': return None
+    return d
+# end normalizeDoi() ----------------------------------
+
+def normalizePii( pii	# string, Elsevier PII, like "S0092-8674(13)00001-X"
+    ):
+    ''' Return PII in a standard form (upper case, just letters & digits),
+	None if there isn't one.
+    '''
+    if pii == None: return None
+    p = ''.join( [ c for c in pii.upper() if c.isalnum() ] )
+    if p == '' or p == 'NONE': return None
+    return p
+# end normalizePii() ----------------------------------
+
+def normalizePubmed( pubmed	# string, pubmed ID
+    ):
+    ''' Return pubmed ID in a standard form (no leading zeros or spaces),
+	None if there isn't one.
+    '''
+    if pubmed == None: return None
+    p = pubmed.strip()
+    if p.isdigit(): return str(int(p))
+    if p == '' or p.lower() == 'none': return None
+    return p
+# end normalizePubmed() ----------------------------------
+
+def pubmedKey( pubmed	# string, pubmed ID
+    ):
+    ''' Return key to index pubmed IDs by: an int for numeric IDs,
+	normalized string for others, None if there isn't one.
+    '''
+    p = normalizePubmed(pubmed)
+    if p != None and p.isdigit(): return int(p)
+    return p
+# end pubmedKey() ----------------------------------
+
+def normalizePage( page	# string, a page number or range, like "87-94",
+			#  "e123", "S1-S5"
+    ):
+    ''' Return the (starting) page in a standard form, None if there isn't
+	one: upper case, no leading zeros, prefixes kept ("s01-s05" -> "S1",
+	"e0123" -> "E123"). Electronic article number E123 is not page 123
+	(but see MgiRefs._getEPageMatches()).
+    '''
+    if page == None: return None
+    p = page.strip().upper().split('-')[0].strip()
+    if p == '' or p == 'NONE': return None
+    prefix = ''
+    if len(p) > 1 and p[0].isalpha() and p[1:].isdigit():
+	prefix = p[0]
+	p = p[1:]
+    if p.isdigit(): p = str(int(p))
+    return prefix + p
+# end normalizePage() ----------------------------------
+
+def normalizeVolume( vol	# string, journal volume
+    ):
+    ''' Return volume in a standard form (upper case, no leading zeros or
+	"Vol." prefix), None if there isn't one.
+    '''
+    if vol == None: return None
+    v = vol.strip().upper()
+    for prefix in ['VOLUME', 'VOL.', 'VOL']:
+	if v.startswith(prefix):
+	    v = v[len(prefix):].strip()
+	    break
+    if v == '' or v == 'NONE': return None
+    if v.isdigit(): v = str(int(v))
+    return v
+# end normalizeVolume() ----------------------------------
+
+def jvpKey( jname,	# string, MGI journal name
+	    vol,	# string, volume
+	    page	# string, starting page (or page range)
+    ):
+    ''' Return key to index refs by journal, volume and starting page,
+	None if any of them is missing.
+    '''
+    v = normalizeVolume(vol)
+    p = normalizePage(page)
+    if not jname or v == None or p == None: return None
+    return (jname, v, p)
+# end jvpKey() ----------------------------------
+
+class RefResolver (object): #[
+    '''
+    A RefResolver matches SciDirect result records to MGI references, and
+    remembers the answers.
+    The same article comes back from the queries for each triage category
+    (and the term analysis variants), so we match it (by DOI, then
+    pubmed ID) just the first time we see it. After that, it is a lookup
+    by its normalized DOI, PII or pubmed ID.
+    Given the Journal the records are from, articles w/o a DOI or pubmed
+    match are matched by journal, volume and starting page (see
+    MgiRefs.matchRefsByIds()).
+    Checking whether the MGI ref is in a given triage category is up to
+    the caller (MgiRefs.refInTriageCategory() is a cheap bit test).
+    '''
+    def __init__(self,
+		mgiRefs		# MgiRefs to match against
+		):
+	self.mgiRefs = mgiRefs
+	self.cache = {}		# dict[id key] = matching MGI ref, or None
+	self.numHits = 0	# num of resolve() calls answered from cache
+	self.numMisses = 0	# num of resolve() calls we had to match
+    # end __init__() ----------------------------
+
+    def getIdKeys(self, sdRef	# SciDirect result record
+	):
+	''' Return list of keys for the article's normalized IDs
+	'''
+	keys = []
+	doi = normalizeDoi( sdRef.get('DOI'))
+	if doi != None: keys.append('doi:' + doi)
+	pii = normalizePii( sdRef.get('pii'))
+	if pii != None: keys.append('pii:' + pii)
+	pubmed = normalizePubmed( sdRef.get('pubmed'))
+	if pubmed != None: keys.append('pubmed:' + pubmed)
+	return keys
+
+    def resolve(self, sdRef,	# SciDirect result record
+		j=None		# Journal the record is from
+	):
+	''' Return the MGI reference record matching the SciDirect record,
+	    None if there isn't one.
+	'''
+	keys = self.getIdKeys(sdRef)
+	for k in keys:
+	    if self.cache.has_key(k):
+		self.numHits += 1
+		return self.cache[k]
+
+	self.numMisses += 1
+	mgiRef = self.mgiRefs.matchRefsByIds( [sdRef], j)[0]
+	for k in keys:
+	    self.cache[k] = mgiRef
+	return mgiRef
+    # end resolve() ----------------------------
+
+    def resolveAll(self, sdRefs,	# list of SciDirect result records
+		j=None		# Journal the records are from
+	):
+	''' Return list of the MGI reference records matching each of the
+	    SciDirect records (None for no match).
+	    The ones we have not seen before are matched in one
+	    MgiRefs.matchRefsByIds() call.
+	'''
+	cache = self.cache
+	matches = [None] * len(sdRefs)
+	toMatch = []		# list of (position, keys) not in cache
+	for i in range(len(sdRefs)):
+	    keys = self.getIdKeys( sdRefs[i])
+	    for k in keys:
+		if cache.has_key(k):
+		    matches[i] = cache[k]
+		    self.numHits += 1
+		    break
+	    else:
+		toMatch.append( (i, keys) )
+
+	if toMatch:
+	    self.numMisses += len(toMatch)
+	    found = self.mgiRefs.matchRefsByIds( [ sdRefs[i] for (i, keys)
+							    in toMatch ], j)
+	    for ((i, keys), mgiRef) in zip(toMatch, found):
+		matches[i] = mgiRef
+		for k in keys:
+		    cache[k] = mgiRef
+	return matches
+    # end resolveAll() ----------------------------
+
+    def getNumHits(self):
+	return self.numHits
+
+    def getNumMisses(self):
+	return self.numMisses
+
+    def getHitRate(self):
+	''' Return fraction of resolve() calls answered from cache
+	'''
+	n = self.numHits + self.numMisses
+	if n == 0: return 0.0
+	return float(self.numHits) / n
+
+# end class RefResolver --------------------- ]
+
+if __name__ == "__main__":
+
+    # memory used by the MGI refs, loaded each way, end to end (table plus
+    #   MgiRefs' indexes). Usage: MGIarticles.py MGI_refs_file
+    memoryBenchmark( sys.argv[1],
+		[ ('MgiRefs(%s)' % storage, lambda f, s=storage: MgiRefs(f, s))
+		    for storage in ['tabledataset', 'snapshot', 'columnar',
+								    'lazy'] ])
+    snapshot = sys.argv[1] + SNAPSHOT_SUFFIX
+    if os.path.exists(snapshot): os.remove(snapshot)
@@ -0,0 +1,324 @@
+#!/usr/bin/python
+# Load MGI references straight from the MGI database into a local SQLite
+#   store that MgiRefs can read (storage = sqlite), instead of going through
+#   a tab-delimited file.
+#
+# connectMgiDb() - DB-API connection to the MGI database, as configured in
+#	the [MGI Database] config section
+#
+# loadRefs() - run the getMGIrefs.sql query on any DB-API connection,
+#	streaming the rows into a SQLite file w/ indexes on DOI, pubmed,
+#	journal and the triage flags.
+#
+# Class SqliteRefTable - holds the MGI references from a SQLite store. Has
+#	the same getRecords() and getRecordsByIndex() methods as FastRefTable
+#	(MgiRefStore.py), so MgiRefs can use it in its place.
+#
+# makeStandInDb() - a SQLite stand-in for the MGI database (the few tables
+#	getMGIrefs.sql and getMGIrefTcCounts.py need), populated from MGI
+#	references tsv files, for testing w/o the real database.
+
+import sys
+import os
+import time
+import threading
+import sqlite3
+
+from MgiRefStore import splitPages
+
+REFSTABLE = 'refs'		# table in the store holding the references
+METATABLE = 'loadInfo'		# table in the store saying how it was loaded
+
+# fields we index, plus the triage flags (TRIAGEDATASETS)
+INDEXFIELDS = [ 'DOI', 'pubmed', 'journal', 'startingPage' ]
+
+# MGI triage datasets: (field in getMGIrefs.sql output, _dataset_key,
+#   bib_dataset abbreviation)
+TRIAGEDATASETS = [ ('A_P',   1002, 'Alleles & Phenotypes'),
+		   ('Expr',  1004, 'Expression'),
+		   ('GO',    1005, 'Gene Ontology'),
+		   ('Tumor', 1007, 'Tumor'),
+		 ]
+
+# MGI _logicaldb_keys of accession IDs
+LDB_MGI    = 1			# J numbers
+LDB_PUBMED = 29
+LDB_DOI    = 65
+
+def readSqlFile( filename,	# file of SQL statements separated by "||"
+		 year		# year to substitute for %(year)s
+    ):
+    ''' Return list of the SQL statements in the file, skipping ones that
+	are only comments.
+    '''
+    fp = open(filename, 'r')
+    text = fp.read()
+    fp.close()
+    statements = []
+    for s in text.split('||'):
+	lines = [ l for l in s.split('\n') if l.strip() != ''
+					    and not l.strip().startswith('--') ]
+	if len(lines) == 0: continue
+	statements.append( s.strip() % {'year' : int(year)} )
+    return statements
+# end readSqlFile() ----------------------------------
+
+def streamingCursor( conn	# DB-API connection
+    ):
+    ''' Return a cursor that streams rows from the server as we fetch them,
+	rather than holding the whole result in memory.
+	psycopg2 does that for named (server side) cursors. Other modules
+	don't take a name (and many stream anyway), so we fall back to a
+	plain cursor.
+    '''
+    try:
+	return conn.cursor('mgirefs')
+    except TypeError:
+	return conn.cursor()
+# end streamingCursor() ----------------------------------
+
+def connectMgiDb( config	# ConfigParser w/ [MGI Database] section
+    ):
+    ''' Return DB-API connection to the MGI database
+    '''
+    section = 'MGI Database'
+    moduleName = config.get(section, 'module')
+    try:
+	dbModule = __import__(moduleName)
+    except ImportError:
+	sys.stderr.write("Cannot import DB-API module '%s' " \
+			    "([MGI Database] module in config)\n" % moduleName)
+	sys.exit(1)
+    return dbModule.connect( host=config.get(section, 'host'),
+			    database=config.get(section, 'database'),
+			    user=config.get(section, 'user'),
+			    password=config.get(section, 'password') )
+# end connectMgiDb() ----------------------------------
+
+def loadRefs( conn,		# DB-API connection to the MGI database
+	      statements,	# list of SQL statements, the last one returns
+	      			#  the references (see readSqlFile())
+	      dbFile,		# SQLite file to write
+	      batchSize=2000,	# num of rows to fetch/insert at a time
+	      source='',	# string saying where the rows came from
+	      verbose=True
+    ):
+    ''' Run the statements, write the rows from the last one (plus
+	startingPage and endingPage from 'pgs') to a new SQLite store.
+	Writes to a temp file and renames, so readers never see half
+	written stores.
+	Return the num of references loaded.
+    '''
+    startTime = time.time()
+    for s in statements[:-1]:		# set up statements, if any
+	cursor = conn.cursor()
+	cursor.execute(s)
+	cursor.close()
+
+    cursor = streamingCursor(conn)
+    cursor.arraysize = batchSize
+    cursor.execute( statements[-1])
+    rows = cursor.fetchmany(batchSize)	# named cursors have no description
+					#  until the 1st fetch
+    fieldNames = [ d[0] for d in cursor.description ]
+    pgsCol = fieldNames.index('pgs')
+
+    tmpName = "%s.%d.tmp" % (dbFile, os.getpid())
+    if os.path.exists(tmpName): os.remove(tmpName)
+    store = sqlite3.connect(tmpName)
+    store.text_factory = str
+    columns = fieldNames + ['startingPage', 'endingPage']
+    store.execute( "create table %s (%s)" % (REFSTABLE,
+			', '.join( [ '"%s" text' % c for c in columns ] )) )
+    insert = "insert into %s values (%s)" % (REFSTABLE,
+					    ', '.join( ['?'] * len(columns)) )
+    numRefs = 0
+    while rows:
+	batch = []
+	for row in rows:
+	    values = [ v != None and str(v) or None for v in row ]
+	    values.extend( splitPages( values[pgsCol] or '') )
+	    batch.append(values)
+	store.executemany(insert, batch)
+	numRefs += len(batch)
+	if verbose:
+	    sys.stderr.write("%d references loaded\r" % numRefs)
+	rows = cursor.fetchmany(batchSize)
+    cursor.close()
+
+    for f in INDEXFIELDS:
+	store.execute( 'create index "%s_%s" on %s ("%s")' % \
+						(REFSTABLE, f, REFSTABLE, f))
+    for (f, key, abbrev) in TRIAGEDATASETS:
+	if f in fieldNames:		# flag, then journal: serves both
+	    store.execute( 'create index "%s_%s" on %s ("%s", journal)' % \
+						(REFSTABLE, f, REFSTABLE, f))
+    store.execute("create table %s (name text, value text)" % METATABLE)
+    store.executemany("insert into %s values (?, ?)" % METATABLE,
+		    [ ('source', source),
+		      ('loaded', time.strftime('%Y-%m-%d %H:%M:%S')),
+		      ('numRefs', str(numRefs)),
+		    ] )
+    store.commit()
+    store.close()
+    os.rename(tmpName, dbFile)
+    if verbose:
+	sys.stderr.write("%d references loaded into %s in %.2f secs\n" % \
+			    (numRefs, dbFile, time.time() - startTime))
+    return numRefs
+# end loadRefs() ----------------------------------
+
+class SqliteRefTable (object): #[
+    '''
+    A SqliteRefTable holds the MGI reference records from a SQLite store
+    written by loadRefs(). Each record is a dict, keyed by field name plus
+	_rcdkey	     - the record's position in the store (0..n-1)
+    (startingPage and endingPage are in the store). NULLs are '', like in
+    the tsv files.
+    getRecordsByIndex() looks up the store's indexes, but returns the same
+    record objects as getRecords().
+    '''
+    def __init__(self,
+		filename	# SQLite store from loadRefs()
+		):
+	if not os.path.exists(filename):	# sqlite3 would create it
+	    raise IOError( "no MGI references store %s" % filename)
+	self.filename = filename
+	self.conn = sqlite3.connect(filename, check_same_thread=False)
+	self.conn.text_factory = str
+	self.lock = threading.Lock()
+
+	cursor = self.conn.execute("select rowid, * from %s order by rowid" \
+								    % REFSTABLE)
+	self.fieldNames = [ intern(d[0]) for d in cursor.description[1:] ]
+	rcdkey = intern('_rcdkey')
+	self.records = []
+	self.rowids = {}		# dict[rowid] = record
+	for row in cursor:
+	    r = dict( zip(self.fieldNames, [ v or '' for v in row[1:] ]) )
+	    r[rcdkey] = len(self.records)
+	    self.records.append(r)
+	    self.rowids[row[0]] = r
+
+	self.indexedFields = set()
+	for (name, sql) in self.conn.execute("select name, sql from " \
+		"sqlite_master where type = 'index' and tbl_name = ?",
+		(REFSTABLE,)):
+	    for f in self.fieldNames:		# 1st field of the index
+		if sql and sql.find('("%s"' % f) >= 0:
+		    self.indexedFields.add(f)
+	self.loadInfo = dict( self.conn.execute("select name, value from %s" \
+								% METATABLE) )
+    # end __init__() ----------------------------
+
+    def getLoadedFrom(self):
+	return "%s, loaded %s from %s" % (self.filename,
+		self.loadInfo.get('loaded', '?'), self.loadInfo.get('source', '?'))
+
+    def getFieldNames(self):
+	return self.fieldNames
+
+    def getNumRecords(self):
+	return len(self.records)
+
+    def getRecords(self):
+	return self.records
+
+    def getRecordsByIndex(self,
+		field,		# name of a field
+		value		# value to look up
+		):
+	''' Return list of records w/ field == value
+	'''
+	if field not in self.indexedFields:
+	    return [ r for r in self.records if r.get(field) == value ]
+	self.lock.acquire()
+	try:
+	    rowids = self.conn.execute('select rowid from %s where "%s" = ? '\
+		    'order by rowid' % (REFSTABLE, field), (value,)).fetchall()
+	finally:
+	    self.lock.release()
+	return [ self.rowids[rowid] for (rowid,) in rowids ]
+
+# end class SqliteRefTable -------------------------- ]
+
+def makeStandInDb( tsvFiles,		# list of MGI references tsv files
+		   dbFile=':memory:'	# SQLite file to write
+    ):
+    ''' Return SQLite connection to a stand-in for the MGI database,
+	w/ the references in the tsv files in the tables (and columns) that
+	getMGIrefs.sql and getMGIrefTcCounts.py use:
+	    bib_refs, acc_accession, bib_dataset, bib_dataset_assoc
+    '''
+    conn = sqlite3.connect(dbFile)
+    conn.text_factory = str
+    conn.executescript('''
+	create table bib_refs (_refs_key int primary key, title text,
+		title2 text, authors text, authors2 text, journal text,
+		vol text, issue text, date text, year int, pgs text,
+		_primary text);
+	create table acc_accession (_object_key int, _logicaldb_key int,
+		prefixpart text, accid text);
+	create table bib_dataset (_dataset_key int primary key,
+		abbreviation text);
+	create table bib_dataset_assoc (_refs_key int, _dataset_key int);
+	''')
+    conn.executemany("insert into bib_dataset values (?, ?)",
+		    [ (key, abbrev) for (f, key, abbrev) in TRIAGEDATASETS ])
+    refsKey = 0
+    for filename in tsvFiles:
+	fp = open(filename, 'r')
+	fieldNames = fp.readline().rstrip('\r\n').split('\t')
+	for line in fp:
+	    line = line.rstrip('\r\n')
+	    if line == '': continue
+	    values = line.split('\t')
+	    values += [''] * (len(fieldNames) - len(values))
+	    r = dict( zip(fieldNames, [ v or None for v in values ]) )
+	    refsKey += 1
+	    conn.execute("insert into bib_refs values (?, ?, ?, ?, ?, ?, ?, " \
+		"?, ?, ?, ?, ?)", (refsKey, r['title'], r['title2'],
+		r['authors'], r['authors2'], r['journal'], r['vol'],
+		r['issue'], r['date'], int(r['year']), r['pgs'],
+		r['firstAuthor']) )
+	    for (f, ldb, prefix) in [ ('Jnum', LDB_MGI, 'J:'),
+				      ('pubmed', LDB_PUBMED, None),
+				      ('DOI', LDB_DOI, None) ]:
+		if r[f]:
+		    conn.execute("insert into acc_accession values (?,?,?,?)",
+					(refsKey, ldb, prefix, r[f]) )
+	    for (f, key, abbrev) in TRIAGEDATASETS:
+		if r.get(f) == 'true':
+		    conn.execute("insert into bib_dataset_assoc values (?, ?)",
+					(refsKey, key) )
+	fp.close()
+    conn.commit()
+    return conn
+# end makeStandInDb() ----------------------------------
+
+if __name__ == "__main__":
+
+    # some test code: load refs from a stand-in built from a tsv file, and
+    #  check we get the same records back.
+    # Usage: MgiRefDb.py MGI_refs_2013.tsv getMGIrefs.sql
+    import tempfile
+    from MgiRefStore import FastRefTable
+
+    tsvFile = sys.argv[1]
+    sqlFile = sys.argv[2]
+    fromTsv = FastRefTable(tsvFile, useSnapshot=False)
+    year = fromTsv.getRecords()[0]['year']
+
+    dbFile = os.path.join( tempfile.mkdtemp(), 'refs.sqlite')
+    conn = makeStandInDb( [tsvFile] )
+    loadRefs( conn, readSqlFile(sqlFile, year), dbFile, batchSize=7,
+						    source='stand-in')
+    fromDb = SqliteRefTable(dbFile)
+    print fromDb.getLoadedFrom()
+    print "Indexed fields: %s" % sorted(fromDb.indexedFields)
+    print "Same records: %s" % (fromDb.getRecords() == fromTsv.getRecords())
+    j = fromTsv.getRecords()[0]['journal']
+    print "%s refs: %d %d" % (j, len(fromDb.getRecordsByIndex('journal', j)),
+			    len(fromTsv.getRecordsByIndex('journal', j)) )
+    os.remove(dbFile)
+    os.rmdir( os.path.dirname(dbFile))
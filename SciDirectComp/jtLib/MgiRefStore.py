@@ -0,0 +1,702 @@
+#!/usr/bin/python
+# Fast loading of MGI reference files (tab-delimited, 1st line = field names)
+#
+# Class FastRefTable - holds the MGI references from a file, with indexes.
+#	Has the same getRecords() and getRecordsByIndex() methods as the
+#	TableDataSet MgiRefs used to use, so it can be used in its place.
+#	Parses the whole file in one pass and keeps a binary snapshot next to
+#	it, so later runs can skip the parsing.
+#
+# Class ColumnarRefTable - same, but stores the references by column to save
+#	memory, and returns RefRow views instead of dicts.
+#
+# Class LazyRefTable - a ColumnarRefTable that just keeps the IDs, journal
+#	and triage categories, and reads whole rows from the file when they
+#	are used.
+#
+# splitPages() - break MGI 'pgs' into starting and ending pages
+
+import sys
+import os
+import mmap
+import marshal
+import hashlib
+import gc
+from array import array
+
+SNAPSHOT_MAGIC = 'MgiRefs snapshot'
+SNAPSHOT_VERSION = 1		# bump when the snapshot contents change
+SNAPSHOT_SUFFIX = '.snapshot'
+
+# fields we index
+INDEXFIELDS = [ 'DOI', 'pubmed', 'journal', 'startingPage' ]
+
+def splitPages( pgs	# string, MGI's pgs field, like "87-94"
+    ):
+    ''' Return (startingPage, endingPage) strings. endingPage is '' if
+	there isn't one.
+    '''
+    pages = pgs.strip().split('-')
+    sp = pages[0]
+    if len(pages) == 2:
+	ep = pages[1]
+    else:
+	ep = ""
+    return (sp, ep)
+# end splitPages() ----------------------------------
+
+def fileMd5( filename):
+    ''' Return md5 hex digest of the file's contents
+    '''
+    m = hashlib.md5()
+    fp = open(filename, 'rb')
+    while True:
+	block = fp.read(1024*1024)
+	if block == '': break
+	m.update(block)
+    fp.close()
+    return m.hexdigest()
+# end fileMd5() ----------------------------------
+
+class FastRefTable (object): #[
+    '''
+    A FastRefTable holds the MGI reference records from a tab-delimited
+    file. Each record is a dict, keyed by field name (from the 1st line of
+    the file) plus:
+	_rcdkey	     - the record's position in the file (0..n-1)
+	startingPage - from 'pgs'
+	endingPage   - from 'pgs'
+    Records are indexed by INDEXFIELDS.
+
+    When we parse the file, we write a snapshot (marshal'ed records and
+    indexes) to filename + SNAPSHOT_SUFFIX. Later, if the snapshot is
+    still valid, we load it instead of parsing the file: one
+    marshal.load() of the whole snapshot, no splitting or indexing.
+    The snapshot is a fast-parse cache, not a memory-mappable file used
+    in place: every record is still built in memory at load (about half
+    the time of parsing the file, not milliseconds). That's because the
+    records are dicts that MgiRefs (and the rest of the program) use as
+    is, and MgiRefs reads every record at load to build its own indexes,
+    so a fixed layout file would just be turned into the same objects.
+    For less memory, see ColumnarRefTable and LazyRefTable, which keep
+    the file mmap'ed and read the long fields from it as they are used.
+    The snapshot is invalid if its version is not SNAPSHOT_VERSION or
+    the file has changed since the snapshot was written:
+	check='mtime' - file's size or modification time is different
+	check='md5'   - file's contents are different (reads the file,
+			but is still much faster than parsing it)
+    '''
+    def __init__(self,
+		filename,	# tab-delimited MGI references file
+		useSnapshot=True, # False => always parse the file
+		check='mtime'	# how to tell if the snapshot is out of date
+		):
+	self.filename = filename
+	self.snapshotName = filename + SNAPSHOT_SUFFIX
+	self.check = check
+	self.loadedFrom = None		# 'snapshot' or 'file'
+
+	# We create lots of objects but no garbage, so the cyclic garbage
+	#   collector would just burn time (about half the load time).
+	gcWasEnabled = gc.isenabled()
+	gc.disable()
+	try:
+	    if not (useSnapshot and self._loadSnapshot()):
+		self._parseFile()
+		self.loadedFrom = 'file'
+		if useSnapshot:
+		    self._writeSnapshot()
+	finally:
+	    if gcWasEnabled: gc.enable()
+    # end __init__() ----------------------------
+
+    def getLoadedFrom(self):
+	return self.loadedFrom
+
+    def getFieldNames(self):
+	return self.fieldNames
+
+    def getNumRecords(self):
+	return len(self.records)
+
+    def getRecords(self):
+	return self.records
+
+    def getRecordsByIndex(self,
+		field,		# name of an indexed field
+		value		# value to look up
+		):
+	''' Return list of records w/ field == value
+	'''
+	rcds = self.records
+	return [ rcds[i] for i in self.indexes[field].get(value, []) ]
+
+    def _parseFile(self):
+	''' Read the file, build the records and indexes in one pass
+	'''
+	fp = open(self.filename, 'r')
+	lines = fp.read().split('\n')
+	fp.close()
+
+	# intern the field names so all the records share the same key
+	#   strings, and the snapshot stores each just once
+	self.fieldNames = [ intern(f) for f in
+					lines[0].rstrip('\r').split('\t') ]
+	keys = dict( [ (k, intern(k)) for k in
+				    ['_rcdkey', 'startingPage', 'endingPage'] ] )
+	nFields = len(self.fieldNames)
+	self.records = []
+	self.indexes = dict( [ (f, {}) for f in INDEXFIELDS ] )
+	indexItems = self.indexes.items()
+	for line in lines[1:]:
+	    line = line.rstrip('\r')
+	    if line == '': continue
+	    values = line.split('\t')
+	    if len(values) < nFields:		# be forgiving of missing
+		values += [''] * (nFields - len(values))   # trailing tabs
+	    r = dict( zip(self.fieldNames, values) )
+	    rcdkey = len(self.records)
+	    r[keys['_rcdkey']] = rcdkey
+	    (r[keys['startingPage']], r[keys['endingPage']]) = \
+						splitPages( r.get('pgs',''))
+	    self.records.append(r)
+	    for (f, index) in indexItems:
+		v = r.get(f)
+		if v == None: continue
+		if index.has_key(v): index[v].append(rcdkey)
+		else: index[v] = [rcdkey]
+    # end _parseFile() ----------------------------
+
+    def _fileSignature(self):
+	''' Return string describing the current state of the file, to
+	    compare to the one saved in the snapshot.
+	'''
+	if self.check == 'md5':
+	    return 'md5:' + fileMd5(self.filename)
+	st = os.stat(self.filename)
+	return 'mtime:%d:%d' % (st.st_size, int(st.st_mtime))
+
+    def _writeSnapshot(self):
+	''' Write snapshot of the records and indexes. Writes to a temp
+	    file and renames, so readers never see half written files.
+	    If we cannot write it (e.g., no permission), just say so.
+	'''
+	header = "%s\t%d\t%s\n" % (SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+						    self._fileSignature())
+	tmpName = "%s.%d.tmp" % (self.snapshotName, os.getpid())
+	try:
+	    fp = open(tmpName, 'wb')
+	    fp.write(header)
+	    marshal.dump( (self.fieldNames, self.records, self.indexes), fp)
+	    fp.close()
+	    os.rename(tmpName, self.snapshotName)
+	except (IOError, OSError), e:
+	    print "Could not write snapshot %s: %s" % (self.snapshotName, e)
+    # end _writeSnapshot() ----------------------------
+
+    def _loadSnapshot(self):
+	''' Load the records and indexes from the snapshot.
+	    Return True if we did, False if there is no valid snapshot.
+	'''
+	if not os.path.exists(self.snapshotName): return False
+	if os.path.getsize(self.snapshotName) == 0: return False
+	fp = open(self.snapshotName, 'rb')
+	try:
+	    header = fp.readline().rstrip('\n').split('\t')
+	    if len(header) != 3 or header[0] != SNAPSHOT_MAGIC \
+		or header[1] != str(SNAPSHOT_VERSION) \
+		or header[2] != self._fileSignature():
+		return False
+	    (self.fieldNames, self.records, self.indexes) = marshal.load(fp)
+	except (ValueError, EOFError, TypeError):	# corrupt snapshot
+	    return False
+	finally:
+	    fp.close()
+	self.loadedFrom = 'snapshot'
+	return True
+    # end _loadSnapshot() ----------------------------
+
+# end class FastRefTable -------------------------- ]
+
+class RefRow (object): #[
+    '''
+    A RefRow is a view of one row of a ColumnarRefTable that acts like the
+    dict records FastRefTable and TableDataSet have: r['Jnum'], r.get(),
+    r.has_key(), r.keys().
+    Two RefRows for the same row of the same table are equal.
+    '''
+    __slots__ = ( 'table', 'row')
+
+    def __init__(self, table, row):
+	self.table = table
+	self.row = row
+
+    def __getitem__(self, field):
+	return self.table.getters[field](self.row)
+
+    def get(self, field, default=None):
+	getter = self.table.getters.get(field)
+	if getter == None: return default
+	return getter(self.row)
+
+    def has_key(self, field):
+	return self.table.getters.has_key(field)
+
+    def __contains__(self, field):
+	return self.table.getters.has_key(field)
+
+    def keys(self):
+	return self.table.getters.keys()
+
+    def __eq__(self, other):
+	return isinstance(other, RefRow) and self.table is other.table \
+						    and self.row == other.row
+
+    def __ne__(self, other):
+	return not self.__eq__(other)
+
+    def __hash__(self):
+	return hash( (id(self.table), self.row) )
+
+    def __repr__(self):
+	return "RefRow(%d, %s)" % (self.row, self.get('Jnum'))
+# end class RefRow -------------------------- ]
+
+# ColumnarRefTable column kinds
+BOOLCOL	  = 'bool'	# 'true'/'false' values, packed into each row's bitmask
+CODEDCOL  = 'coded'	# few distinct values, stored as codes into value list
+INTCOL	  = 'int'	# prefix + integer IDs, ints stored in an array
+STRCOL	  = 'str'	# list of strings
+LAZYCOL	  = 'lazy'	# not stored, read from the file when asked for
+
+# fields that are coded, int or lazy. Any other field that only has 'true'
+#   or 'false' values (like the triage category fields) is a BOOLCOL, the
+#   rest are STRCOLs
+CODEDFIELDS = [ 'journal', 'year', 'vol', 'issue', 'date' ]
+INTFIELDS   = { 'pubmed' : '', 'Jnum' : 'J:' }	# dict[field] = prefix
+LAZYFIELDS  = [ 'title', 'title2', 'authors', 'authors2', 'firstAuthor',
+		'pgs' ]
+
+class ColumnarRefTable (object): #[
+    '''
+    A ColumnarRefTable holds the MGI reference records from a tab-delimited
+    file, like FastRefTable, but stores them by column to save memory:
+	journal & other CODEDFIELDS: one array of ints per field, coding
+			into a list of the distinct values (interned)
+	pubmed, Jnum:	array of ints (IDs that don't fit are kept aside)
+	'true'/'false' fields (e.g., triage categories): bits in one int per
+			row (see getTriageMask(), getBoolBit())
+	LAZYFIELDS (long text, fields we rarely look at): not kept at all.
+			We mmap the file and keep each row's offsets, and
+			read the value from there when it is asked for.
+	the rest: lists of strings
+    getRecords() and getRecordsByIndex() return RefRows, which can be used
+    like the dict records, r['Jnum'] etc.
+    Like FastRefTable, rows also have _rcdkey, startingPage (coded),
+    endingPage (computed from pgs when asked for).
+    '''
+    def __init__(self,
+		filename	# tab-delimited MGI references file
+		):
+	self.filename = filename
+	gcWasEnabled = gc.isenabled()	# we make no garbage, see
+	gc.disable()			#   FastRefTable.__init__()
+	try:
+	    self._parseFile()
+	finally:
+	    if gcWasEnabled: gc.enable()
+	self._initGetters()
+    # end __init__() ----------------------------
+
+    def getLoadedFrom(self):
+	return 'file'
+
+    def getFieldNames(self):
+	return self.fieldNames
+
+    def getNumRecords(self):
+	return len(self.lineStarts)
+
+    def getRecords(self):
+	return [ RefRow(self, i) for i in xrange(len(self.lineStarts)) ]
+
+    def getRecord(self, row):
+	''' Return RefRow for row number row (same as its _rcdkey)
+	'''
+	return RefRow(self, row)
+
+    def getFieldGetter(self, field):
+	''' Return function(row number) returning field's value for the row,
+	    for going down a column w/o making RefRows.
+	    (For a LAZYCOL field, it reads the row from the file.)
+	'''
+	return self.getters[field]
+
+    def getRecordsByIndex(self,
+		field,		# name of an indexed field
+		value		# value to look up
+		):
+	''' Return list of RefRows w/ field == value
+	'''
+	rows = self.indexes[field].get(value)
+	if rows == None: return []
+	if type(rows) == type(0): return [ RefRow(self, rows) ]
+	return [ RefRow(self, i) for i in rows ]
+
+    def getBoolBit(self, field):
+	''' Return the bit number for the 'true'/'false' field in the row
+	    masks, None if field is not stored that way.
+	'''
+	return self.boolBits.get(field)
+
+    def getTriageMask(self, row):
+	''' Return the bitmask of the 'true'/'false' fields for row
+	'''
+	return self.masks[row]
+
+    def getTriageMasks(self):
+	''' Return array of the bitmask of the 'true'/'false' fields for
+	    each row
+	'''
+	return self.masks
+
+    def getCodedColumn(self, field):
+	''' Return (array of each row's code, list of the values the codes
+	    stand for) for CODEDCOL field
+	'''
+	return (self.codes[field], self.codeValues[field])
+
+    def _parseFile(self):
+	''' Read the file, build the columns and indexes in one pass
+	'''
+	self.fp = open(self.filename, 'rb')
+	if os.path.getsize(self.filename) > 0:
+	    self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+	else:
+	    self.mm = ''
+	data = self.fp.read()	# parse from a copy, so we don't leave all
+				#   the mmap pages in memory
+
+	headerEnd = data.find('\n')
+	if headerEnd == -1: headerEnd = len(data)
+	self.fieldNames = [ intern(f) for f in
+				    data[:headerEnd].rstrip('\r').split('\t') ]
+	nFields = len(self.fieldNames)
+	self.fieldPos = dict( [ (f, c) for (c, f) in enumerate(self.fieldNames)])
+
+	self.kinds = {}		# dict[field] = column kind
+	for f in self.fieldNames:
+	    self.kinds[f] = self._fieldKind(f)
+	self.lineStarts = array('l')	# row's offsets in the file
+	self.lineEnds	= array('l')
+	self.masks	= array('L')	# row's BOOLCOL bits
+	self.boolBits	= {}		# dict[field] = bit num in masks
+	self.strColumns = {}		# dict[field] = list of strings
+	self.codes	= {}		# dict[field] = array of codes
+	self.codeValues = {}		# dict[field] = list of values
+	codeOf		= {}		# dict[field] = dict[value] = code
+	self.ints	= {}		# dict[field] = array of ints,
+					#   -1 => see intOther
+	self.intOther	= {}		# dict[field] = dict[row] = value that
+					#   is not prefix + int
+	for f in self.fieldNames:
+	    kind = self.kinds[f]
+	    if kind == BOOLCOL:
+		self.boolBits[f] = len(self.boolBits)
+	    elif kind == CODEDCOL:
+		self.codes[f] = array('l')
+		self.codeValues[f] = []
+		codeOf[f] = {}
+	    elif kind == INTCOL:
+		self.ints[f] = array('l')
+		self.intOther[f] = {}
+	    elif kind == STRCOL:
+		self.strColumns[f] = []
+	self.codes['startingPage'] = array('l')	# derived from pgs
+	self.codeValues['startingPage'] = []
+	codeOf['startingPage'] = {}
+	self.indexes = dict( [ (f, {}) for f in INDEXFIELDS ] )
+
+	pgsPos = self.fieldPos.get('pgs')
+	cols = [ (c, f) for (c, f) in enumerate(self.fieldNames)
+					    if self.kinds[f] != LAZYCOL ]
+	start = headerEnd + 1
+	while start < len(data):
+	    end = data.find('\n', start)
+	    if end == -1: end = len(data)
+	    line = data[start:end].rstrip('\r')
+	    if line == '':
+		start = end + 1
+		continue
+	    row = len(self.lineStarts)
+	    self.lineStarts.append(start)
+	    self.lineEnds.append(start + len(line))
+	    start = end + 1
+
+	    values = line.split('\t')
+	    if len(values) < nFields:
+		values += [''] * (nFields - len(values))
+	    mask = 0
+	    for (c, f) in cols:
+		v = values[c]
+		kind = self.kinds[f]
+		if kind == BOOLCOL:
+		    if v == 'true': mask |= 1 << self.boolBits[f]
+		    elif v != 'false':		# not a bool field after all
+			self._notBool(f, row)
+			if self.kinds[f] == STRCOL:
+			    self.strColumns[f].append(v)
+		elif kind == CODEDCOL:
+		    self._addCode(f, v, codeOf[f])
+		elif kind == INTCOL:
+		    prefix = INTFIELDS[f]
+		    n = v[len(prefix):]
+		    if v.startswith(prefix) and n.isdigit() and str(int(n)) == n:
+			self.ints[f].append( int(n) )
+		    else:
+			self.ints[f].append(-1)
+			self.intOther[f][row] = v
+		elif kind == STRCOL:
+		    self.strColumns[f].append(v)
+	    self.masks.append(mask)
+
+	    sp = ''
+	    if pgsPos != None: sp = splitPages( values[pgsPos])[0]
+	    self._addCode('startingPage', sp, codeOf['startingPage'])
+
+	    for f in INDEXFIELDS:
+		if f == 'startingPage': v = sp
+		elif self.fieldPos.has_key(f): v = values[self.fieldPos[f]]
+		else: continue
+		self._addToIndex(self.indexes[f], v, row)
+    # end _parseFile() ----------------------------
+
+    def _fieldKind(self, f):
+	''' Return the column kind to store field f as (BOOLCOL until we see
+	    otherwise)
+	'''
+	if f in LAZYFIELDS:    return LAZYCOL
+	elif f in CODEDFIELDS: return CODEDCOL
+	elif f in INTFIELDS:   return INTCOL
+	else:		       return BOOLCOL
+
+    def _addCode(self, f, v, codeOf):
+	''' Append the code for value v to CODEDCOL f's codes.
+	    codeOf is dict[value] = code for f.
+	'''
+	code = codeOf.get(v)
+	if code == None:
+	    code = len(self.codeValues[f])
+	    codeOf[v] = code
+	    self.codeValues[f].append( intern(v) )
+	self.codes[f].append(code)
+
+    def _notBool(self, f, row):
+	''' We thought field f was a BOOLCOL, but row has another value.
+	    Turn f into a STRCOL w/ the values from the rows before row.
+	'''
+	bit = self.boolBits[f]
+	self.strColumns[f] = [ (self.masks[i] >> bit) & 1 and 'true' or 'false'
+						    for i in xrange(row) ]
+	self.kinds[f] = STRCOL
+	del self.boolBits[f]		# (bit stays unused)
+
+    def _addToIndex(self, index, v, row):
+	''' Add row to index[v]. Most values (IDs) are unique, so we store a
+	    single row as an int, and only make a list for duplicates.
+	'''
+	rows = index.get(v)
+	if rows == None:
+	    index[v] = row
+	elif type(rows) == type(0):
+	    index[v] = [rows, row]
+	else:
+	    rows.append(row)
+
+    def _initGetters(self):
+	''' Set up self.getters: dict[field] = function(row) returning
+	    the field's value for the row, as a string (_rcdkey is an int)
+	'''
+	self.getters = { '_rcdkey' : lambda i: i }
+	for (f, kind) in self.kinds.items():
+	    if kind == BOOLCOL:
+		self.getters[f] = lambda i, m=self.masks, b=self.boolBits[f]: \
+					    (m[i] >> b) & 1 and 'true' or 'false'
+	    elif kind == CODEDCOL:
+		self.getters[f] = lambda i, c=self.codes[f], \
+				    vals=self.codeValues[f]: vals[ c[i] ]
+	    elif kind == INTCOL:
+		self.getters[f] = lambda i, f=f: self._getInt(f, i)
+	    elif kind == LAZYCOL:
+		self.getters[f] = lambda i, c=self.fieldPos[f]: \
+						    self._getLazy(i, c)
+	    else:
+		self.getters[f] = self.strColumns[f].__getitem__
+	self.getters['startingPage'] = lambda i, c=self.codes['startingPage'],\
+		vals=self.codeValues['startingPage']: vals[ c[i] ]
+	self.getters['endingPage']   = lambda i: self._getPages(i)[1]
+
+    def _getInt(self, f, row):
+	n = self.ints[f][row]
+	if n == -1: return self.intOther[f][row]
+	return INTFIELDS[f] + str(n)
+
+    def _getPages(self, row):
+	if not self.fieldPos.has_key('pgs'): return ('', '')
+	return splitPages( self._getLazy(row, self.fieldPos['pgs']) )
+
+    def _getLazy(self, row, c):
+	''' Return the value of column c for the row, from the file
+	'''
+	values = self.mm[ self.lineStarts[row] : self.lineEnds[row] ].split('\t')
+	if c < len(values): return values[c]
+	return ''
+
+# end class ColumnarRefTable -------------------------- ]
+
+# fields LazyRefTable keeps in memory (plus the 'true'/'false' fields):
+#   dict[field] = column kind
+LAZYKEEPFIELDS = { 'journal' : CODEDCOL,
+		   'vol'     : CODEDCOL,
+		   'Jnum'    : INTCOL,
+		   'pubmed'  : INTCOL,
+		   'DOI'     : STRCOL,
+		 }
+
+class LazyRefTable (ColumnarRefTable): #[
+    '''
+    A LazyRefTable is a ColumnarRefTable that only keeps what we need to
+    match and count references: the LAZYKEEPFIELDS (IDs, journal, volume),
+    startingPage, the 'true'/'false' fields (triage categories), the
+    indexes, and each row's offsets in the (mmap'ed) file.
+    The first time any other field of a row is asked for (e.g., the title
+    of a false negative we are writing out), the whole row is read from
+    the file and kept. So memory grows with the rows actually used, not
+    the size of the file.
+    '''
+    def __init__(self,
+		filename	# tab-delimited MGI references file
+		):
+	self.rows = {}		# dict[row] = list of values, rows read so far
+	ColumnarRefTable.__init__(self, filename)
+
+    def getLoadedFrom(self):
+	return 'file (lazy)'
+
+    def getNumRowsRead(self):
+	''' Return num of rows we have read whole from the file
+	'''
+	return len(self.rows)
+
+    def _fieldKind(self, f):
+	return LAZYKEEPFIELDS.get(f, BOOLCOL)
+
+    def _notBool(self, f, row):
+	''' Field f is not a BOOLCOL after all, so we don't keep it
+	'''
+	self.kinds[f] = LAZYCOL
+	del self.boolBits[f]		# (bit stays unused)
+
+    def _getLazy(self, row, c):
+	''' Return the value of column c for the row, reading the whole row
+	    from the file the first time.
+	'''
+	values = self.rows.get(row)
+	if values == None:
+	    values = self.mm[ self.lineStarts[row] : self.lineEnds[row] ] \
+								.split('\t')
+	    if len(values) < len(self.fieldNames):
+		values += [''] * (len(self.fieldNames) - len(values))
+	    self.rows[row] = values
+	return values[c]
+
+# end class LazyRefTable -------------------------- ]
+
+def rssKb():
+    ''' Return this process's resident memory size in KB (Linux only)
+    '''
+    for line in open('/proc/self/status'):
+	if line.startswith('VmRSS:'):
+	    return int(line.split()[1])
+    return 0
+# end rssKb() ----------------------------------
+
+def memoryBenchmark( filename,	# MGI references file
+		    loaders	# list of (label, function(filename) that
+				#   loads the refs), e.g., a table class
+    ):
+    ''' For each loader, load the file in a child process and report how
+	much memory what it loaded takes. (In a child process so each
+	measurement starts from the same place.)
+    '''
+    for (label, load) in loaders:
+	pid = os.fork()
+	if pid == 0:			# child
+	    gc.collect()
+	    before = rssKb()
+	    t = load(filename)
+	    gc.collect()
+	    after = rssKb()
+	    print "%-24s %8d KB" % (label, after - before)
+	    sys.stdout.flush()
+	    os._exit(0)
+	os.waitpid(pid, 0)
+# end memoryBenchmark() ----------------------------------
+
+if __name__ == "__main__":
+
+    # some test code. Usage: MgiRefStore.py MGI_refs_file
+    import time
+
+    filename = sys.argv[1]
+    if os.path.exists(filename + SNAPSHOT_SUFFIX):
+	os.remove(filename + SNAPSHOT_SUFFIX)
+
+    for (label, check) in [ ('cold', 'mtime'), ('warm', 'mtime'),
+							    ('warm', 'md5') ]:
+	start = time.time()
+	t = FastRefTable(filename, check=check)
+	print "%s start (%s check): %d records from %s in %.4f secs" % \
+		(label, check, t.getNumRecords(), t.getLoadedFrom(),
+		time.time() - start)
+	if check == 'md5':		# md5 signature != mtime signature
+	    t = FastRefTable(filename, check=check)
+	    print "warm again (md5 check): loaded from %s" % t.getLoadedFrom()
+
+    r = t.getRecords()[0]
+    print "1st record: Jnum %s DOI %s startingPage %s" % \
+		(r['Jnum'], r['DOI'], r['startingPage'])
+    print "by DOI: %d records" % len(t.getRecordsByIndex('DOI', r['DOI']))
+    print "in journal %s: %d" % \
+	    (r['journal'], len(t.getRecordsByIndex('journal', r['journal'])))
+    os.remove(filename + SNAPSHOT_SUFFIX)
+
+    # columnar table should have the same values
+    start = time.time()
+    c = ColumnarRefTable(filename)
+    print "columnar: %d records in %.4f secs" % (c.getNumRecords(),
+							time.time() - start)
+    numDiffs = 0
+    for (r, cr) in zip(t.getRecords(), c.getRecords()):
+	for f in r.keys():
+	    if r[f] != cr[f]: numDiffs += 1
+    print "columnar differences from FastRefTable: %d" % numDiffs
+    print "by DOI: %s" % c.getRecordsByIndex('DOI', r['DOI'])
+
+    # lazy table too, and it should only read the rows we use
+    c = LazyRefTable(filename)
+    numDiffs = 0
+    for (r, cr) in zip(t.getRecords(), c.getRecords()):
+	if r['Jnum'] != cr['Jnum'] or r['DOI'] != cr['DOI']: numDiffs += 1
+    print "lazy ID differences from FastRefTable: %d, %d rows read" % \
+						(numDiffs, c.getNumRowsRead())
+    for (r, cr) in zip(t.getRecords(), c.getRecords()):
+	for f in r.keys():
+	    if r[f] != cr[f]: numDiffs += 1
+    print "lazy differences from FastRefTable: %d, %d rows read" % \
+						(numDiffs, c.getNumRowsRead())
+
+    print "Memory used by each kind of table:"
+    memoryBenchmark( filename, [ (cls.__name__, cls) for cls in
+			    [FastRefTable, ColumnarRefTable, LazyRefTable] ])
+    os.remove(filename + SNAPSHOT_SUFFIX)
@@ -0,0 +1,175 @@
+#!/usr/bin/python
+# Simple producer/consumer plumbing so I/O bound work (like SciDirect queries)
+#   can overlap with the CPU bound work that consumes its results.
+#
+# Class FetchPipeline - runs a fetch function over a list of work items in a
+#			background thread and hands the results to the consumer
+#			through a bounded queue.
+# parallelMap()       - runs a function over a list of items in several threads
+
+import sys
+import threading
+import Queue
+
+class FetchPipeline (object): #[
+    '''
+    A FetchPipeline takes a list of work items and a function that "fetches"
+    the data for an item. A background (producer) thread calls the fetch
+    function on each item, in order, and puts the results on a queue.
+    Iterating over the FetchPipeline returns (item, fetched result) pairs,
+    in the same order as the items, so the consumer can be working on item n
+    while the producer is fetching item n+1.
+
+    The queue is bounded (maxQueued), so the producer never gets more than
+    maxQueued results ahead of the consumer. This keeps memory capped no
+    matter how many items there are.
+
+    If the fetch function raises an exception, the producer stops and the
+    exception is re-raised in the consumer when it reaches that item.
+    If the consumer stops iterating early, the producer is told to stop too.
+    '''
+    def __init__(self,
+		 items,		# list (or iterator) of work items
+		 fetch,		# function(item) returns the fetched data
+		 maxQueued=2	# max num of fetched items waiting for the
+				#   consumer
+		):
+	self.items = items
+	self.fetch = fetch
+	self.queue = Queue.Queue( max(1, maxQueued) )
+	self.stopping = threading.Event()
+	self.thread = None
+    # end __init__() ----------------------------
+
+    def __iter__(self):
+	self.thread = threading.Thread( target=self._produce,
+						name="FetchPipeline")
+	self.thread.daemon = True	# don't hang the program on exit
+	self.thread.start()
+	try:
+	    while True:
+		(kind, item, value) = self.queue.get()
+		if kind == 'done':
+		    break
+		elif kind == 'error':	# value is sys.exc_info() from producer
+		    raise value[0], value[1], value[2]
+		else:
+		    yield (item, value)
+	finally:
+	    self.stop()
+    # end __iter__() ----------------------------
+
+    def stop(self):
+	''' Tell the producer to stop and wait for it to finish.
+	'''
+	self.stopping.set()
+	while self.thread != None and self.thread.is_alive():
+	    try:			# make room so a blocked put() returns
+		self.queue.get_nowait()
+	    except Queue.Empty:
+		pass
+	    self.thread.join(0.1)
+    # end stop() ----------------------------
+
+    def _produce(self):
+	''' Producer thread: fetch each item and queue up the results.
+	'''
+	try:
+	    for item in self.items:
+		if self.stopping.is_set(): return
+		data = self.fetch(item)
+		if not self._put( ('item', item, data) ): return
+	except:
+	    self._put( ('error', None, sys.exc_info()) )
+	    return
+	self._put( ('done', None, None) )
+    # end _produce() ----------------------------
+
+    def _put(self, entry):
+	''' Put entry on the queue, waiting for room, unless we are told to
+	    stop. Return True if the entry was queued.
+	'''
+	while not self.stopping.is_set():
+	    try:
+		self.queue.put( entry, True, 0.1)
+		return True
+	    except Queue.Full:
+		pass
+	return False
+    # end _put() ----------------------------
+
+# end class FetchPipeline -------------------------- ]
+
+def parallelMap( func,		# function(item) to run for each item
+		 items,		# list of items
+		 numThreads=4	# max num of threads to run at once
+    ):
+    ''' Call func(item) for each item using up to numThreads threads.
+	Return the list of func's return values, in the same order as items.
+	If any call raises an exception, the first one (in item order) is
+	re-raised here after all the threads finish.
+	Intended for I/O bound work (API calls) - the GIL keeps CPU bound
+	funcs from running any faster.
+    '''
+    items = list(items)
+    results = [None] * len(items)
+    errors  = [None] * len(items)	# sys.exc_info() for failed items
+    todo = Queue.Queue()
+    for i in range(len(items)):
+	todo.put(i)
+
+    def worker():
+	while True:
+	    try:
+		i = todo.get_nowait()
+	    except Queue.Empty:
+		return
+	    try:
+		results[i] = func( items[i])
+	    except:
+		errors[i] = sys.exc_info()
+
+    threads = []
+    for n in range( max(1, min(numThreads, len(items))) ):
+	t = threading.Thread( target=worker, name="parallelMap-%d" % n)
+	t.daemon = True
+	t.start()
+	threads.append(t)
+    for t in threads:
+	t.join()
+
+    for e in errors:
+	if e != None:
+	    raise e[0], e[1], e[2]
+    return results
+# end parallelMap() ----------------------------
+
+if __name__ == "__main__":
+
+    # some test code
+    import time
+
+    def slowSquare( n):
+	time.sleep(0.1)			# pretend to be a slow API call
+	return n*n
+
+    start = time.time()
+    for (n, sq) in FetchPipeline( range(10), slowSquare, maxQueued=2):
+	time.sleep(0.1)			# pretend to do some real work
+	print "%d squared is %d" % (n, sq)
+    print "Elapsed: %4.2f seconds (about 1.1 if overlapped, 2.0 if not)" % \
+						    (time.time() - start)
+
+    def badFetch( n):
+	if n == 3: raise ValueError("can't fetch %d" % n)
+	return n
+    try:
+	for (n, x) in FetchPipeline( range(10), badFetch):
+	    print "fetched %d" % n
+    except ValueError, e:
+	print "Got expected exception: %s" % e
+
+    start = time.time()
+    print parallelMap( slowSquare, range(8), numThreads=4)
+    print "Elapsed: %4.2f seconds (about 0.2 with 4 threads)" % \
+						    (time.time() - start)
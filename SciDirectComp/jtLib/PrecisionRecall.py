@@ -4,8 +4,30 @@
 # Class PrecisionRecallStats - holds stats and computes P/R numeric values
 # Class PrecisionRecallCalculator - computes P/R for a given result set
 #   				See Class comments for an overview.
+# Class StreamingPrecisionRecall - same, but keeps just the counts and the
+#				first few false positives/negatives
+# Class RankedPrecisionRecall - precision/recall at each rank, average
+#				precision, for results in relevance order
+# bootstrapPR() - bootstrap confidence intervals for precision and recall
+# binomialDraw() - a random binomial draw, for bootstrapPR() w/o NumPy
+# bootstrapMany() - bootstrapPR() for many queries, in a process pool
+# Class StratifiedRatioEstimate - estimates a ratio like precision from
+#				samples of strata of the results
+# Class ArticleIdSpace - numbers article keys 0..n-1 for BatchPrecisionRecall
+# Class BatchPrecisionRecall - computes P/R counts for many (result set,
+#				gold set) pairs at once, as bitsets
 
 import collections
+import binascii
+import math
+import random
+import multiprocessing
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class PrecisionRecallStats(object):
     '''
@@ -23,6 +45,8 @@ class PrecisionRecallStats(object):
 	self.numTruePositives = 0	# total number of results counted as
 					#    "positives"
 	self.numGoldPositives = 0	# total number of true positives
+	self.precisionInterval = None	# (low, high) confidence interval
+	self.recallInterval = None	#   if we have one, see bootstrapPR()
 
     def incNumTruePositives(self, inc=1):
 	''' Increment the number of true positive results
@@ -67,6 +91,18 @@ class PrecisionRecallStats(object):
 
     def getRecall(self):
 	return float(self.numTruePositives)/float(self.numGoldPositives)
+
+    def setIntervals(self,
+		intervals	# (precision interval, recall interval), each
+				#   (low, high) or None, e.g., from bootstrapPR()
+		):
+	(self.precisionInterval, self.recallInterval) = intervals
+
+    def getPrecisionInterval(self):
+	return self.precisionInterval
+
+    def getRecallInterval(self):
+	return self.recallInterval
 # end class PrecisionRecallStats ---------------------
 
 class PrecisionRecallCalculator(PrecisionRecallStats):
@@ -180,8 +216,615 @@ class PrecisionRecallCalculator(PrecisionRecallStats):
 	else:
 	    return self.falseNegs.values()
 
+    def getNumFalsePositives(self):
+	return len(self.falsePos)
+
+    def getNumFalseNegatives(self):
+	return len(self.falseNegs)
+
 # end class PrecisionRecallCalculator -------------------
 
+class StreamingPrecisionRecall (PrecisionRecallStats): #[
+    '''
+    Computes Precision/Recall like PrecisionRecallCalculator (same results,
+    goldstd, findGoldstd and goldKey params), but for long runs that keep
+    the P/R of every query around:
+	- the results can be any iterator, they are consumed once
+	- true positives are just counted
+	- only the first maxFalsePositives false positives (in result
+	  order) and maxFalseNegatives false negatives (in goldstd order)
+	  are kept, e.g., the ones a report shows
+	- the gold objs not matched yet are only held while calculating
+    To get all the false positives/negatives (e.g., to write them to a
+    file), pass sink functions that are called w/ each one as it is found.
+    If the results are matched to the goldstd as they are produced, pass
+    findGoldstd=None and have results be (result obj, matching goldstd obj
+    or None) pairs. The false positives (kept and sunk) are still just
+    the result objs.
+    '''
+    def __init__(self,
+		 results,		# list or iterator of result objects
+		 goldstd,		# list or iterator of goldstd objects
+		 findGoldstd,		# function(result obj) returns the
+		 			#  matching goldstd obj or None.
+					#  None => results are pairs, see above
+		 goldKey=None,		# function(goldstd obj) returns a
+		 			#  hashable key, None if goldstd objs
+					#  are hashable
+		 maxFalsePositives=0,	# num of false positives to keep
+		 maxFalseNegatives=0,	# num of false negatives to keep
+		 falsePositiveSink=None, # function(result obj), called w/
+		 			#  each false positive
+		 falseNegativeSink=None	# function(goldstd obj), called w/
+		 			#  each false negative
+		):
+	super(StreamingPrecisionRecall, self).__init__()
+	self.results = results
+	self.goldstd = goldstd
+	self.findGoldstd = findGoldstd
+	self.goldKey = goldKey
+	self.maxFalsePositives = maxFalsePositives
+	self.maxFalseNegatives = maxFalseNegatives
+	self.falsePositiveSink = falsePositiveSink
+	self.falseNegativeSink = falseNegativeSink
+	self.falsePos = []		# the first few false positives
+	self.falseNegs = []		# the first few false negatives
+	self.numFalsePositives = 0
+	self.numFalseNegatives = 0
+
+    def calculate(self):
+	key = self.goldKey or (lambda g: g)
+	unmatched = {}			# dict[gold key] = goldstd obj
+	goldOrder = []			# gold keys in goldstd order
+	for g in self.goldstd:
+	    k = key(g)
+	    if not unmatched.has_key(k):
+		unmatched[k] = g
+		goldOrder.append(k)
+	self.incNumGoldPositives( len(goldOrder) )
+
+	if self.findGoldstd == None:
+	    pairs = self.results
+	else:
+	    pairs = ( (r, self.findGoldstd(r)) for r in self.results )
+	for (r, matchingGold) in pairs:
+	    self.incNumResults()
+	    if matchingGold != None:	# true positive
+		self.incNumTruePositives()
+		unmatched.pop( key(matchingGold), None)
+	    else:			# false positive
+		self.numFalsePositives += 1
+		if len(self.falsePos) < self.maxFalsePositives:
+		    self.falsePos.append(r)
+		if self.falsePositiveSink != None:
+		    self.falsePositiveSink(r)
+
+	for k in goldOrder:
+	    g = unmatched.get(k)
+	    if g == None: continue
+	    self.numFalseNegatives += 1
+	    if len(self.falseNegs) < self.maxFalseNegatives:
+		self.falseNegs.append(g)
+	    if self.falseNegativeSink != None:
+		self.falseNegativeSink(g)
+
+	self.results = None		# let go of them
+	self.goldstd = None
+	return self
+
+    def getFalsePositives(self):
+	''' Return list of the first maxFalsePositives false positives
+	'''
+	return self.falsePos
+
+    def getFalseNegatives(self):
+	''' Return list of the first maxFalseNegatives false negatives
+	'''
+	return self.falseNegs
+
+    def getNumFalsePositives(self):
+	return self.numFalsePositives
+
+    def getNumFalseNegatives(self):
+	return self.numFalseNegatives
+# end class StreamingPrecisionRecall -------------------------- ]
+
+class RankedPrecisionRecall (object): #[
+    '''
+    A RankedPrecisionRecall computes precision/recall by rank, for results
+    in relevance order (SciDirect returns them that way), in one pass as
+    the results come in (e.g., a page at a time). For each rank k:
+	precision@k = true positives in the first k results / k
+	recall@k    = true positives in the first k results / numGold
+    (if there are fewer than k results, the missing ones count as not
+    positive). Also:
+	average precision - the sum of precision@k over the ranks k of the
+		true positives, / numGold
+	PR curve - (k, precision@k, recall@k) for each rank k
+
+    To decide how deep it is worth paging a query, isPlateaued() says if
+    the last few results found too few true positives, and
+    makePageCallback() gives a function a SciDirect connection's
+    doQuery() can call w/ each page to stop paging when they don't.
+    '''
+    def __init__(self,
+		numGoldPositives	# num of gold positives for the query
+		):
+	self.numGold = numGoldPositives
+	self.tpAt = array('l')	# tpAt[k-1] = num of true positives in the
+				#   first k results
+	self.sumPrecision = 0.0	# sum of precision@k at true positive ranks
+
+    def add(self, isPositive):
+	''' Add the next result, isPositive = True if a true positive
+	'''
+	numTP = self.getNumTruePositives()
+	if isPositive:
+	    numTP += 1
+	    self.sumPrecision += float(numTP) / (len(self.tpAt) + 1)
+	self.tpAt.append(numTP)
+
+    def addPage(self, flags):
+	''' Add the next results, flags = list of isPositive for each
+	'''
+	for f in flags:
+	    self.add(f)
+
+    def getNumResults(self):
+	return len(self.tpAt)
+
+    def getNumTruePositives(self):
+	if len(self.tpAt) == 0: return 0
+	return self.tpAt[-1]
+
+    def getNumGoldPositives(self):
+	return self.numGold
+
+    def getTruePositivesAt(self, k):
+	if k <= 0 or len(self.tpAt) == 0: return 0
+	return self.tpAt[ min(k, len(self.tpAt)) - 1 ]
+
+    def getPrecisionAt(self, k):
+	return float( self.getTruePositivesAt(k)) / k
+
+    def recallIsDefined(self):
+	return self.numGold != 0
+
+    def getRecallAt(self, k):
+	return float( self.getTruePositivesAt(k)) / self.numGold
+
+    def getAveragePrecision(self):
+	''' Needs recallIsDefined()
+	'''
+	return self.sumPrecision / self.numGold
+
+    def getPRCurve(self):
+	''' Return list of (k, precision@k, recall@k) for k = 1..numResults
+	    (recall is None if not recallIsDefined())
+	'''
+	curve = []
+	for k in range(1, len(self.tpAt) + 1):
+	    recall = None
+	    if self.numGold: recall = float(self.tpAt[k-1]) / self.numGold
+	    curve.append( (k, float(self.tpAt[k-1]) / k, recall) )
+	return curve
+
+    def isPlateaued(self,
+		window,		# num of results to look back over
+		minGain=1	# num of true positives they need to have
+		):
+	''' Return True if the last window results have fewer than minGain
+	    true positives, or we have all the gold positives
+	'''
+	n = len(self.tpAt)
+	if self.numGold and self.getNumTruePositives() >= self.numGold:
+	    return True
+	if n < window: return False
+	return self.getNumTruePositives() - self.getTruePositivesAt(n-window) \
+								    < minGain
+
+    def makePageCallback(self,
+		isPositive,	# function(result obj) returns True if it is
+				#  a true positive
+		window,		# see isPlateaued()
+		minGain=1
+		):
+	''' Return function(page) for a SciDirect connection's doQuery()
+	    pageCallback: adds the page's results, returns False (stop
+	    paging) once recall has plateaued.
+	'''
+	def pageCallback(page):
+	    self.addPage( [ isPositive(r) for r in page ] )
+	    return not self.isPlateaued(window, minGain)
+	return pageCallback
+# end class RankedPrecisionRecall -------------------------- ]
+
+class ArticleIdSpace (object): #[
+    '''
+    An ArticleIdSpace gives each article key (any hashable, e.g., a J
+    number or DOI) a small int id, 0..n-1, in the order first seen.
+    Result sets and gold sets that use the same ArticleIdSpace can be
+    compared as bitsets.
+    '''
+    def __init__(self):
+	self.ids = {}		# dict[key] = id
+	self.keys = []		# list of keys, by id
+
+    def getId(self, key):
+	id = self.ids.get(key)
+	if id == None:
+	    id = len(self.ids)
+	    self.ids[key] = id
+	    self.keys.append(key)
+	return id
+
+    def getKey(self, id):
+	return self.keys[id]
+
+    def getIds(self, keys):
+	return [ self.getId(k) for k in keys ]
+
+    def getSize(self):
+	return len(self.ids)
+# end class ArticleIdSpace -------------------------- ]
+
+class BatchPrecisionRecall (object): #[
+    '''
+    A BatchPrecisionRecall computes the precision/recall counts for many
+    (result set, gold set) pairs at once, e.g., for every query variant x
+    journal in a query sweep.
+
+    Result sets and gold sets are given as lists of article keys, named so
+    many pairs can share them (e.g., all the query variants for a journal
+    share the journal's gold set). A result that matches a gold article
+    should have the gold article's key (e.g., its J number), other results
+    any other key (e.g., their DOI).
+    Each set becomes a bitset over a shared ArticleIdSpace, and for each
+    pair:
+	numResults = |results|, numTruePositives = |results & gold|,
+	numGoldPositives = |gold|
+    Unlike PrecisionRecallCalculator, a set counts each key once, even if
+    it is in the list more than once.
+
+    With NumPy, gold sets are rows of a boolean array over the id space,
+    and the true positives for all the pairs are computed together
+    (chunkSize pairs at a time to bound the memory used) by looking up
+    the result sets' ids in them. Without NumPy, the sets are python longs.
+
+    Use:
+	bpr = BatchPrecisionRecall()
+	bpr.addResultSet('q1/Cell', keys)...; bpr.addGoldSet('Cell', keys)...
+	bpr.addPair( ('q1', 'Cell'), 'q1/Cell', 'Cell')...
+	bpr.calculate()
+	bpr.getStats( ('q1', 'Cell') ) - a PrecisionRecallStats
+    '''
+    def __init__(self,
+		idSpace=None	# ArticleIdSpace to use, None for a new one
+		):
+	if idSpace == None: idSpace = ArticleIdSpace()
+	self.idSpace = idSpace
+	self.resultSets = {}	# dict[name] = list of ids
+	self.goldSets = {}	# dict[name] = list of ids
+	self.pairs = []		# list of (label, result set name, gold name)
+	self.counts = {}	# dict[label] = (numResults, numTruePositives,
+				#		 numGoldPositives)
+
+    def addResultSet(self, name, keys):
+	self.resultSets[name] = self.idSpace.getIds(keys)
+
+    def addGoldSet(self, name, keys):
+	self.goldSets[name] = self.idSpace.getIds(keys)
+
+    def addPair(self,
+		label,		# any hashable, to get the pair's counts by
+		resultName,	# name of a result set
+		goldName	# name of a gold set
+		):
+	self.pairs.append( (label, resultName, goldName) )
+
+    def calculate(self,
+		chunkSize=1024	# num of pairs to compute at a time (NumPy)
+		):
+	''' Compute the counts for all the pairs
+	'''
+	rNames = sorted(self.resultSets.keys())
+	gNames = sorted(self.goldSets.keys())
+	rIndex = dict( [ (n, i) for (i, n) in enumerate(rNames) ] )
+	gIndex = dict( [ (n, i) for (i, n) in enumerate(gNames) ] )
+	ri = [ rIndex[r] for (label, r, g) in self.pairs ]
+	gi = [ gIndex[g] for (label, r, g) in self.pairs ]
+
+	if numpy != None:
+	    (rSizes, gSizes, tps) = self._countNumpy(
+			[ self.resultSets[n] for n in rNames ],
+			[ self.goldSets[n] for n in gNames ], ri, gi, chunkSize)
+	else:
+	    (rSizes, gSizes, tps) = self._countPython(
+			[ self.resultSets[n] for n in rNames ],
+			[ self.goldSets[n] for n in gNames ], ri, gi)
+
+	for (k, (label, r, g)) in enumerate(self.pairs):
+	    self.counts[label] = (rSizes[ri[k]], tps[k], gSizes[gi[k]])
+	return self
+
+    def _countNumpy(self, rSets, gSets, ri, gi, chunkSize):
+	''' Return (list of result set sizes, list of gold set sizes,
+	    list of true positive counts for each pair)
+	'''
+	nIds = max(self.idSpace.getSize(), 1)
+	gBits = numpy.zeros( (len(gSets), nIds), dtype=bool)
+	for (i, ids) in enumerate(gSets):
+	    gBits[i, ids] = True
+	gSizes = gBits.sum(axis=1).tolist()
+	rArrays = [ numpy.unique( numpy.array(ids, dtype=numpy.int64) )
+							    for ids in rSets ]
+	rSizes = [ len(a) for a in rArrays ]
+
+	# Result sets are small compared to the id space, so rather than AND
+	#   whole bitsets, look up each pair's result ids in its gold bitset.
+	#   owner[k] = which pair (in the chunk) the k-th id belongs to
+	tps = []
+	for start in range(0, len(ri), chunkSize):
+	    cri = ri[start:start+chunkSize]
+	    cgi = numpy.array( gi[start:start+chunkSize], dtype=numpy.int64)
+	    lengths = [ rSizes[r] for r in cri ]
+	    if sum(lengths) == 0:
+		tps.extend( [0] * len(cri) )
+		continue
+	    owner = numpy.repeat( numpy.arange(len(cri)), lengths)
+	    ids = numpy.concatenate( [ rArrays[r] for r in cri ] )
+	    hits = gBits[ cgi[owner], ids ]
+	    tps.extend( numpy.bincount( owner[hits],
+				    minlength=len(cri) ).tolist() )
+	return (rSizes, gSizes, tps)
+
+    def _countPython(self, rSets, gSets, ri, gi):
+	nBytes = (self.idSpace.getSize() + 7) / 8
+	def toLong(ids):
+	    bits = bytearray(nBytes)
+	    for id in ids:
+		bits[id >> 3] |= 1 << (id & 7)
+	    bits.reverse()		# most significant byte first
+	    return long( binascii.hexlify(bits) or '0', 16)
+	rBits = [ toLong(ids) for ids in rSets ]
+	gBits = [ toLong(ids) for ids in gSets ]
+	rSizes = [ bin(b).count('1') for b in rBits ]
+	gSizes = [ bin(b).count('1') for b in gBits ]
+	tps = [ bin( rBits[r] & gBits[g] ).count('1') for (r, g) in zip(ri, gi) ]
+	return (rSizes, gSizes, tps)
+
+    def getLabels(self):
+	return [ label for (label, r, g) in self.pairs ]
+
+    def getCounts(self, label):
+	''' Return (numResults, numTruePositives, numFalsePositives,
+	    numFalseNegatives) for the pair
+	'''
+	(n, tp, gold) = self.counts[label]
+	return (n, tp, n - tp, gold - tp)
+
+    def getStats(self, label):
+	''' Return PrecisionRecallStats for the pair
+	'''
+	return self.getTotalStats( [label] )
+
+    def getTotalStats(self, labels):
+	''' Return PrecisionRecallStats w/ the counts of the pairs added up,
+	    (as PrecisionRecallStats.incAll() would)
+	'''
+	stats = PrecisionRecallStats()
+	for label in labels:
+	    (n, tp, gold) = self.counts[label]
+	    stats.incNumResults(n)
+	    stats.incNumTruePositives(tp)
+	    stats.incNumGoldPositives(gold)
+	return stats
+# end class BatchPrecisionRecall -------------------------- ]
+
+def binomialDraw( rng,		# random.Random
+		  n,		# num of trials
+		  p		# probability of success
+    ):
+    ''' Return a random draw from the binomial distribution (n, p), in
+	constant expected time: by inversion (walking up the probabilities)
+	when the mean is small, else by rejection from a Lorentzian
+	(Cauchy) envelope, as in Numerical Recipes' bnldev().
+    '''
+    if p <= 0.0 or n == 0: return 0
+    if p >= 1.0: return n
+    if p > 0.5: return n - binomialDraw(rng, n, 1.0 - p)
+    mean = n * p
+    if mean < 30.0:			# inversion, ~mean steps
+	s = p / (1.0 - p)
+	a = (n + 1) * s
+	r = (1.0 - p) ** n		# P(x == 0)
+	u = rng.random()
+	x = 0
+	while u > r and x < n:
+	    u -= r
+	    x += 1
+	    r *= a / x - s		# P(x) from P(x-1)
+	return x
+    logP = math.log(p)
+    logQ = math.log(1.0 - p)
+    lgN = math.lgamma(n + 1.0)
+    sq = math.sqrt(2.0 * mean * (1.0 - p))
+    while True:
+	y = math.tan( math.pi * rng.random())
+	x = sq * y + mean
+	if x < 0.0 or x >= n + 1.0: continue
+	x = math.floor(x)
+	t = 1.2 * sq * (1.0 + y * y) * math.exp( lgN - math.lgamma(x + 1.0)
+			- math.lgamma(n - x + 1.0) + x * logP + (n - x) * logQ)
+	if rng.random() <= t:
+	    return int(x)
+# end binomialDraw() ----------------------------------
+
+def bootstrapPR( strata,	# list of (numTP, numFP, numFN), e.g., one per
+			#   journal
+		 numSamples=1000,	# num of bootstrap samples
+		 confidence=0.95,
+		 seed=None		# random seed, for repeatable intervals
+    ):
+    ''' Return (precision interval, recall interval), each (low, high) or
+	None if precision/recall is undefined in (almost) all the samples.
+	Each bootstrap sample resamples each stratum's articles (its TP, FP
+	and FN indicator array) w/ replacement, and adds up the strata.
+	Resampling an indicator array is the same as a multinomial draw of
+	its three counts, so w/ NumPy we draw all the samples at once.
+	W/o NumPy we draw each sample's counts as two binomials (TP out of
+	all, then FP out of the rest), so it takes time in proportion to
+	numSamples * num of strata, not the num of articles.
+    '''
+    strata = [ s for s in strata if sum(s) > 0 ]
+    if numpy != None:
+	rng = numpy.random.RandomState(seed)
+	totals = numpy.zeros( (numSamples, 3), dtype=numpy.int64)
+	for (tp, fp, fn) in strata:
+	    n = tp + fp + fn
+	    totals += rng.multinomial( n, [ float(tp)/n, float(fp)/n,
+						float(fn)/n ], size=numSamples)
+	(tps, fps, fns) = (totals[:,0], totals[:,1], totals[:,2])
+    else:
+	rng = random.Random(seed)
+	(tps, fps, fns) = ([], [], [])
+	for i in range(numSamples):
+	    (tpTotal, fpTotal, fnTotal) = (0, 0, 0)
+	    for (tp, fp, fn) in strata:
+		n = tp + fp + fn
+		tpDraw = binomialDraw(rng, n, float(tp) / n)
+		fpDraw = 0
+		if fp + fn > 0:
+		    fpDraw = binomialDraw(rng, n - tpDraw, float(fp) / (fp + fn))
+		tpTotal += tpDraw
+		fpTotal += fpDraw
+		fnTotal += n - tpDraw - fpDraw
+	    tps.append(tpTotal)
+	    fps.append(fpTotal)
+	    fns.append(fnTotal)
+
+    def interval(numers, denoms):
+	values = sorted( [ float(t)/d for (t, d) in zip(numers, denoms)
+								    if d > 0 ] )
+	if len(values) < numSamples / 2: return None
+	tail = (1.0 - confidence) / 2
+	return ( values[ int(tail * (len(values) - 1)) ],
+		 values[ int( round( (1.0 - tail) * (len(values) - 1))) ] )
+
+    tps = list(tps)
+    return ( interval(tps, [ t + f for (t, f) in zip(tps, list(fps)) ]),
+	     interval(tps, [ t + f for (t, f) in zip(tps, list(fns)) ]) )
+# end bootstrapPR() ----------------------------------
+
+def bootstrapTask( args		# (strata, numSamples, confidence, seed)
+    ):
+    return bootstrapPR(*args)
+# end bootstrapTask() ----------------------------------
+
+def bootstrapMany( tasks,	# list of (strata, numSamples, confidence, seed)
+		   processes=1	# num of worker processes
+    ):
+    ''' Return list of bootstrapPR() results for the tasks, computed in
+	a process pool if processes > 1
+    '''
+    if processes <= 1 or len(tasks) <= 1:
+	return map(bootstrapTask, tasks)
+    pool = multiprocessing.Pool( min(processes, len(tasks)) )
+    try:
+	return pool.map(bootstrapTask, tasks)
+    finally:
+	pool.close()
+	pool.join()
+# end bootstrapMany() ----------------------------------
+
+def normalQuantile( p		# probability, 0 < p < 1
+    ):
+    ''' Return z such that P(Z < z) = p for a standard normal Z
+    '''
+    (low, high) = (-10.0, 10.0)
+    for i in range(60):			# bisection on the normal CDF
+	mid = (low + high) / 2
+	if 0.5 * (1 + math.erf(mid / math.sqrt(2))) < p: low = mid
+	else: high = mid
+    return (low + high) / 2
+# end normalQuantile() ----------------------------------
+
+class StratifiedRatioEstimate (object): #[
+    '''
+    A StratifiedRatioEstimate estimates the ratio of two totals, Y/X, over
+    a population split into strata, from a random sample of each stratum.
+    E.g., precision = true positives / results for a query w/ too many
+    results to fetch: the strata are bands of result ranks, the sample
+    from each is a page of results, and for each sampled result
+	y = 1 if it is a true positive, x = 1 if it counts as a result.
+    Totals are estimated stratum by stratum (size * sample mean), and the
+    standard errors are the usual linearized ones for a stratified ratio
+    estimate, treating each stratum's sample as a simple random sample.
+    (A page is a run of consecutive results, not a simple random sample,
+    so the errors are approximate.) A stratum sampled completely adds no
+    error, so a query fetched completely gives its exact values.
+    Estimates for several queries can be added up w/ addAll().
+    '''
+    def __init__(self):
+	self.strata = []	# list of (stratum size, list of y, list of x)
+
+    def addStratum(self,
+		size,		# num of items in the stratum
+		ys,		# list of y values of the sampled items
+		xs		# list of x values, same order as ys
+		):
+	if len(ys) > 0:
+	    self.strata.append( (size, ys, xs) )
+
+    def addAll(self, other):
+	''' Add the strata of another StratifiedRatioEstimate
+	'''
+	self.strata.extend(other.strata)
+
+    def getPopulationSize(self):
+	return sum( [ size for (size, ys, xs) in self.strata ] )
+
+    def getSampleSize(self):
+	return sum( [ len(ys) for (size, ys, xs) in self.strata ] )
+
+    def getTotalY(self):
+	return sum( [ size * float(sum(ys)) / len(ys)
+					for (size, ys, xs) in self.strata ] )
+
+    def getTotalX(self):
+	return sum( [ size * float(sum(xs)) / len(xs)
+					for (size, ys, xs) in self.strata ] )
+
+    def ratioIsDefined(self):
+	return self.getTotalX() > 0
+
+    def getRatio(self):
+	return self.getTotalY() / self.getTotalX()
+
+    def getTotalYStdErr(self):
+	return math.sqrt( self._variance( lambda y, x: y) )
+
+    def getRatioStdErr(self):
+	ratio = self.getRatio()
+	return math.sqrt( self._variance( lambda y, x: y - ratio * x) ) / \
+							    self.getTotalX()
+
+    def _variance(self,
+		value		# function(y, x) to get each item's value
+		):
+	''' Return the variance of the estimated total of value(y, x)
+	'''
+	variance = 0.0
+	for (size, ys, xs) in self.strata:
+	    n = len(ys)
+	    if n < 2 or n >= size: continue	# no error from this stratum
+	    values = [ value(y, x) for (y, x) in zip(ys, xs) ]
+	    mean = float( sum(values) ) / n
+	    s2 = sum( [ (v - mean) ** 2 for v in values ] ) / (n - 1)
+	    variance += size * size * (1.0 - float(n) / size) * s2 / n
+	return variance
+# end class StratifiedRatioEstimate -------------------------- ]
+
 if __name__ == "__main__":
 
     # some test code
@@ -240,3 +883,120 @@ if __name__ == "__main__":
     print "NumGoldPositives: %d" % pr.getNumGoldPositives()
     print "Precision: %f (should be 1/2)" % pr.getPrecision()
     print "Recall   : %f (should be 1/2)" % pr.getRecall()
+
+    # streaming version of the second example, from an iterator of
+    #   (result, matching gold) pairs
+    print
+    print "Streaming Example"
+    allFalsePos = []
+    allFalseNegs = []
+    pr = StreamingPrecisionRecall( ( (r, myFindGold2(r)) for r in results),
+		    goldstd, None,
+		    goldKey=goldKey, maxFalsePositives=1, maxFalseNegatives=0,
+		    falsePositiveSink=allFalsePos.append,
+		    falseNegativeSink=allFalseNegs.append).calculate()
+    print "False Positives (kept 1 of %d): %s, sink got: %s" % \
+	    (pr.getNumFalsePositives(), pr.getFalsePositives(), allFalsePos)
+    print "False Negatives (kept 0 of %d): %s, sink got: %s" % \
+	    (pr.getNumFalseNegatives(), pr.getFalseNegatives(), allFalseNegs)
+    print "Precision: %f (should be 1/2)" % pr.getPrecision()
+    print "Recall   : %f (should be 1/2)" % pr.getRecall()
+
+    # ranked version: TP at ranks 1, 3, 6, then 3 FP - stop paging there
+    print
+    print "Ranked Example"
+    ranked = RankedPrecisionRecall(4)
+    pageCallback = ranked.makePageCallback( lambda r: r == 'tp', window=3)
+    pages = [ ['tp','fp','tp'], ['fp','fp','tp'], ['fp','fp','fp'], ['tp'] ]
+    for page in pages:
+	if not pageCallback(page): break
+    print "Stopped after %d results (should be 9)" % ranked.getNumResults()
+    print "P@5 %4.2f (should be 0.40)  R@5 %4.2f (should be 0.50)" % \
+			    (ranked.getPrecisionAt(5), ranked.getRecallAt(5))
+    print "Average precision %5.3f (should be %5.3f)" % \
+		(ranked.getAveragePrecision(), (1 + 2/3.0 + 3/6.0) / 4)
+    print "PR curve: %s" % [ "%d:%4.2f/%4.2f" % p for p in
+						    ranked.getPRCurve()[:3] ]
+
+    # batch version: random query variants x journals, should agree w/
+    #   PrecisionRecallCalculator
+    import random
+    import time
+    random.seed(1)
+    print
+    print "Batch Example"
+    numVariants = 200
+    journals = [ 'j%d' % i for i in range(20) ]
+    gold = dict( [ (j, [ '%s-%d' % (j, i) for i in range(300) ])
+							    for j in journals ])
+    bpr = BatchPrecisionRecall()
+    for j in journals:
+	bpr.addGoldSet(j, gold[j])
+    results = {}
+    for v in range(numVariants):
+	for j in journals:
+	    hits = random.sample( gold[j], random.randint(0, 100) )
+	    misses = [ 'doi-%d' % random.randint(0, 50000)
+					for i in range(random.randint(0, 100)) ]
+	    results[ (v, j) ] = list( set(hits + misses) )
+	    bpr.addResultSet( (v, j), results[ (v, j) ] )
+	    bpr.addPair( (v, j), (v, j), j)
+    start = time.time()
+    bpr.calculate()
+    print "%d pairs in %.3f secs (numpy: %s)" % \
+		    (len(bpr.getLabels()), time.time() - start, numpy != None)
+    numDiffs = 0
+    for (v, j) in bpr.getLabels():
+	goldSet = set(gold[j])
+	pr = PrecisionRecallCalculator( results[ (v, j) ], gold[j],
+			    lambda r: r in goldSet and r or None).calculate()
+	s = bpr.getStats( (v, j) )
+	if (s.getNumResults(), s.getNumTruePositives(),
+	    s.getNumGoldPositives()) != (pr.getNumResults(),
+	    pr.getNumTruePositives(), pr.getNumGoldPositives()):
+	    numDiffs += 1
+    print "Differences from PrecisionRecallCalculator: %d" % numDiffs
+
+    # bootstrap intervals for the batch example's variants (fewer w/o
+    #   NumPy, it is slow)
+    print
+    print "Bootstrap Example"
+    tasks = []
+    if numpy == None: numVariants = 8
+    for v in range(numVariants):
+	strata = [ bpr.getCounts( (v, j) )[1:] for j in journals ]
+	tasks.append( (strata, 1000, 0.95, v) )
+    start = time.time()
+    intervals = bootstrapMany(tasks, processes=4)
+    print "%d intervals in %.3f secs (numpy: %s)" % (len(intervals),
+					time.time() - start, numpy != None)
+    s = bpr.getTotalStats( [ (0, j) for j in journals ] )
+    print "Variant 0: precision %5.3f in [%5.3f, %5.3f], " \
+	    "recall %5.3f in [%5.3f, %5.3f]" % ( (s.getPrecision(),) +
+	    intervals[0][0] + (s.getRecall(),) + intervals[0][1] )
+    print "Undefined: %s (should be (None, None))" % \
+		    (bootstrapPR( [ (0, 0, 0) ] ),)
+
+    # stratified estimate of precision from one page of 25 per band of
+    #   ranks, for 10000 results whose precision falls off w/ rank
+    print
+    print "Stratified Estimate Example"
+    population = [ int(random.random() < 0.5 * (1 - i / 10000.0))
+						    for i in range(10000) ]
+    numBands = 8
+    misses = 0
+    for trial in range(200):
+	est = StratifiedRatioEstimate()
+	for b in range(numBands):
+	    (lo, hi) = (b * 10000 / numBands, (b + 1) * 10000 / numBands)
+	    start = random.randint(lo, hi - 25)
+	    est.addStratum(hi - lo, population[start:start+25], [1] * 25)
+	err = 1.96 * est.getRatioStdErr()
+	if abs(est.getRatio() - sum(population) / 10000.0) > err:
+	    misses += 1
+    print "Precision %5.3f, last estimate %5.3f +/- %5.3f from %d results"\
+	    % (sum(population) / 10000.0, est.getRatio(), err,
+						    est.getSampleSize())
+    print "Intervals missing the true precision: %d of 200 (about 10)" % \
+								    misses
+    print "z for 0.975: %5.3f (should be 1.960)" % normalQuantile(0.975)
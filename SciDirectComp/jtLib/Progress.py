@@ -0,0 +1,276 @@
+#!/usr/bin/python
+# Class ProgressTracker - keeps track of how far along a long run is (units of
+#			work done, records fetched, API calls), predicts how
+#			long the rest will take, and times the phases of the
+#			work.
+
+import sys
+import os
+import time
+import json
+import threading
+from contextlib import contextmanager
+
+def formatSeconds( secs	# number of seconds, or None
+    ):
+    ''' Return secs as 'h:mm:ss' string, '?' if secs is None
+    '''
+    if secs == None: return '?'
+    secs = int(round(secs))
+    return "%d:%02d:%02d" % (secs / 3600, (secs % 3600) / 60, secs % 60)
+# end formatSeconds() ----------------------------------
+
+class ProgressTracker (object): #[
+    '''
+    A ProgressTracker follows a run through a list of units of work
+    (any hashable objects, e.g., (triage category, journal) pairs).
+
+    Tell it:
+	setExpected(unit, n) - n records are expected for the unit (e.g.,
+				from a SciDirect count probe)
+	apiCall()	     - an API call was made
+	fetched(unit, n)     - n records were fetched for the unit
+	setStat(name, value) - any other stat to include in the status
+	unitDone(unit)	     - the unit is finished
+	with tracker.phase(name): ... - time spent in a phase of the work
+	finish()	     - the run is done
+
+    It reports:
+	a compact one line status to the console (stderr), at most every
+	    updateInterval seconds
+	the same status as json to progressFile (if given), so other
+	    programs can watch the run
+	a breakdown of the time spent in each phase, at the end
+
+    The ETA is from the records still expected for unfinished units and
+    the records/sec so far. Without expected counts, it is from the
+    average time per unit.
+
+    Safe to call from several threads. Phase times from different threads
+    overlap, so they can add up to more than the elapsed time.
+    '''
+    def __init__(self,
+		label,		# string to tag output with, e.g., the year
+		numUnits,	# int, num of units of work in the run
+		progressFile=None, # filename to write json status to
+		updateInterval=2.0, # min seconds between console updates
+		stream=sys.stderr # where to write console updates
+		):
+	self.label = label
+	self.numUnits = numUnits
+	self.progressFile = progressFile
+	self.updateInterval = updateInterval
+	self.stream = stream
+
+	self.lock = threading.RLock()
+	self.startTime = time.time()
+	self.lastUpdate = 0		# time of last console update
+	self.state = 'running'
+	self.unitsDone = set()
+	self.numRecords = 0		# num of records fetched
+	self.numApiCalls = 0
+	self.expected = {}		# dict[unit] = num of records expected
+	self.phaseTimes = {}		# dict[phase name] = seconds
+	self.phaseNames = []		# phase names in order first seen
+	self.stats = {}			# dict[name] = value, other stats
+    # end __init__() ----------------------------
+
+    def setExpected(self, unit, n):
+	self.lock.acquire()
+	try:
+	    self.expected[unit] = n
+	finally:
+	    self.lock.release()
+
+    def apiCall(self, n=1):
+	self.lock.acquire()
+	try:
+	    self.numApiCalls += n
+	finally:
+	    self.lock.release()
+
+    def fetched(self, unit, n):
+	self.lock.acquire()
+	try:
+	    self.numRecords += n
+	finally:
+	    self.lock.release()
+
+    def setStat(self, name, value):
+	self.lock.acquire()
+	try:
+	    self.stats[name] = value
+	finally:
+	    self.lock.release()
+
+    def unitDone(self, unit):
+	self.lock.acquire()
+	try:
+	    self.unitsDone.add(unit)
+	finally:
+	    self.lock.release()
+	self.update()
+
+    def addPhaseTime(self, name, secs):
+	self.lock.acquire()
+	try:
+	    if not self.phaseTimes.has_key(name):
+		self.phaseTimes[name] = 0.0
+		self.phaseNames.append(name)
+	    self.phaseTimes[name] += secs
+	finally:
+	    self.lock.release()
+
+    @contextmanager
+    def phase(self, name):
+	''' Use as: with tracker.phase('fetch'): ...
+	'''
+	start = time.time()
+	try:
+	    yield
+	finally:
+	    self.addPhaseTime(name, time.time() - start)
+
+    def getElapsed(self):
+	return time.time() - self.startTime
+
+    def getRate(self):
+	''' Return records fetched per second so far
+	'''
+	elapsed = self.getElapsed()
+	if elapsed <= 0: return 0.0
+	return self.numRecords / elapsed
+
+    def getEta(self):
+	''' Return predicted seconds until the run is done, None if we cannot
+	    tell yet.
+	'''
+	self.lock.acquire()
+	try:
+	    numLeft = self.numUnits - len(self.unitsDone)
+	    if numLeft <= 0: return 0.0
+	    if len(self.unitsDone) == 0: return None
+	    rate = self.getRate()
+	    if len(self.expected) > 0 and rate > 0:
+		recordsLeft = sum( [ n for (u, n) in self.expected.items()
+						if u not in self.unitsDone ] )
+		return recordsLeft / rate
+	    return self.getElapsed() / len(self.unitsDone) * numLeft
+	finally:
+	    self.lock.release()
+    # end getEta() ----------------------------
+
+    def getStatus(self):
+	''' Return dict of the current status
+	'''
+	self.lock.acquire()
+	try:
+	    return {
+		'label'		  : self.label,
+		'state'		  : self.state,
+		'unitsDone'	  : len(self.unitsDone),
+		'unitsTotal'	  : self.numUnits,
+		'recordsFetched'  : self.numRecords,
+		'recordsExpected' : sum(self.expected.values()),
+		'recordsPerSec'	  : round(self.getRate(), 2),
+		'apiCalls'	  : self.numApiCalls,
+		'elapsedSecs'	  : round(self.getElapsed(), 1),
+		'etaSecs'	  : self.getEta(),
+		'phaseSecs'	  : dict( [ (n, round(s, 2)) for (n, s) in
+					    self.phaseTimes.items() ] ),
+		'stats'		  : dict(self.stats),
+		'updated'	  : time.strftime('%Y-%m-%d %H:%M:%S'),
+		}
+	finally:
+	    self.lock.release()
+    # end getStatus() ----------------------------
+
+    def getStatusLine(self):
+	''' Return compact one line status string
+	'''
+	s = self.getStatus()
+	return "Progress%s: %d/%d units  %d records  %.1f rcds/sec  " \
+		"%d API calls  elapsed %s  ETA %s" % \
+		(self.label and " (%s)" % self.label or '',
+		s['unitsDone'], s['unitsTotal'], s['recordsFetched'],
+		s['recordsPerSec'], s['apiCalls'],
+		formatSeconds(s['elapsedSecs']), formatSeconds(s['etaSecs']))
+
+    def update(self,
+		force=False	# True => update even if we just did
+		):
+	''' Write status to the console and progress file, unless we did
+	    within the last updateInterval seconds.
+	'''
+	self.lock.acquire()
+	try:
+	    now = time.time()
+	    if not force and now - self.lastUpdate < self.updateInterval:
+		return
+	    self.lastUpdate = now
+	    self.stream.write( self.getStatusLine() + '\n')
+	    self.stream.flush()
+	    self.writeProgressFile()
+	finally:
+	    self.lock.release()
+    # end update() ----------------------------
+
+    def writeProgressFile(self):
+	''' Write status as json to the progress file (if we have one).
+	    Writes to a temp file and renames, so readers never see half
+	    written files.
+	'''
+	if not self.progressFile: return
+	tmpName = "%s.%d.tmp" % (self.progressFile, os.getpid())
+	fp = open(tmpName, 'w')
+	json.dump( self.getStatus(), fp, indent=2, sort_keys=True)
+	fp.write('\n')
+	fp.close()
+	os.rename(tmpName, self.progressFile)
+
+    def finish(self):
+	''' The run is done. Write final status and the phase breakdown.
+	'''
+	self.lock.acquire()
+	try:
+	    self.state = 'done'
+	    self.update(force=True)
+	    self.stream.write( self.getPhaseReport() + '\n')
+	    self.stream.flush()
+	finally:
+	    self.lock.release()
+
+    def getPhaseReport(self):
+	''' Return string w/ time spent in each phase
+	'''
+	elapsed = self.getElapsed()
+	lines = [ "Timing%s: elapsed %s" % \
+		    (self.label and " (%s)" % self.label or '',
+		    formatSeconds(elapsed)) ]
+	for name in self.phaseNames:
+	    secs = self.phaseTimes[name]
+	    pct = 0.0
+	    if elapsed > 0: pct = 100.0 * secs / elapsed
+	    lines.append( "  %-10s %10.2f secs %5.1f%%" % (name, secs, pct) )
+	return '\n'.join(lines)
+
+# end class ProgressTracker -------------------------- ]
+
+if __name__ == "__main__":
+
+    # some test code
+    tracker = ProgressTracker('test', 5, updateInterval=0,
+					    progressFile='/tmp/progress.json')
+    for u in range(5):
+	tracker.setExpected(u, 100)
+    for u in range(5):
+	with tracker.phase('fetch'):
+	    time.sleep(0.05)
+	    tracker.apiCall(2)
+	    tracker.fetched(u, 100)
+	with tracker.phase('match'):
+	    time.sleep(0.02)
+	tracker.unitDone(u)
+    tracker.finish()
+    print open('/tmp/progress.json').read()
+    os.remove('/tmp/progress.json')
@@ -0,0 +1,111 @@
+#!/usr/bin/python
+# Render report pages from Jinja2 templates.
+# Each page is streamed to its file as the template generates it
+#   (Template.generate()), rather than rendered into one string first, and
+#   a run's many pages (per category, per journal) are rendered at once in
+#   a process pool.
+#
+# renderPage() - render one page to its file
+# renderPages() - render a list of pages, in a process pool
+# pageFilename() - a file name for a page from names w/ odd characters
+
+import re
+import codecs
+import hashlib
+import multiprocessing
+from jinja2 import Environment, FileSystemLoader
+
+env = None		# jinja2 Environment for this process, see initRenderer()
+
+def initRenderer( templateDir	# directory the templates are in
+    ):
+    ''' Set up the jinja2 Environment for renderPage() in this process
+    '''
+    global env
+    env = Environment( loader=FileSystemLoader(templateDir), trim_blocks=True)
+# end initRenderer() ----------------------------------
+
+def renderPage( page	# (template name, dict of template data, filename)
+    ):
+    ''' Render the template w/ the data to the file, a chunk at a time.
+	Return the filename.
+    '''
+    (templateName, data, filename) = page
+    t = env.get_template(templateName)
+    fp = codecs.open(filename, 'w', 'utf-8')
+    for chunk in t.generate(data):
+	fp.write(chunk)
+    fp.close()
+    return filename
+# end renderPage() ----------------------------------
+
+def renderPages( templateDir,	# directory the templates are in
+		pages,		# list of (template name, data, filename)
+		processes=1	# num of processes to render them in
+    ):
+    ''' Render all the pages. The template data must pickle to go to the
+	worker processes, so it should be plain dicts, lists and strings.
+	Return the number of pages rendered.
+    '''
+    if processes <= 1 or len(pages) < 2:	# not worth a pool
+	initRenderer(templateDir)
+	for page in pages:
+	    renderPage(page)
+	return len(pages)
+
+    pool = multiprocessing.Pool( min(processes, len(pages)),
+				initializer=initRenderer, initargs=(templateDir,))
+    try:
+	n = len( pool.map(renderPage, pages, chunksize=4) )
+    finally:
+	pool.close()
+	pool.join()
+    return n
+# end renderPages() ----------------------------------
+
+def pageFilename( prefix,	# e.g., 'journal'
+		*names		# strings to make the name from
+    ):
+    ''' Return file name like prefix_name1_name2_1a2b3c4d.html, w/ the
+	characters in the names that are not letters, digits, '-' or '.'
+	replaced by '_'. The last part is from a hash of the names as
+	given, so names that only differ in those characters ("Cell & Bio",
+	"Cell Bio") still get different files, the same ones every run.
+    '''
+    parts = [prefix] + [ re.sub(r'[^A-Za-z0-9.-]+', '_', n) for n in names ]
+    key = '\t'.join(names)
+    if isinstance(key, unicode): key = key.encode('utf-8')
+    digest = hashlib.md5(key).hexdigest()
+    return '_'.join(parts + [ digest[:8] ]) + '.html'
+# end pageFilename() ----------------------------------
+
+if __name__ == "__main__":
+
+    # render a few pages from a template in a temp dir, w/ and w/o a pool
+    import os
+    import time
+    import tempfile
+    tmpDir = tempfile.mkdtemp()
+    fp = open( os.path.join(tmpDir, 'test.html'), 'w')
+    fp.write("<h1>{{ title }}</h1>\n{% for r in rows %}\n<p>{{ r }}\n"
+								"{% endfor %}\n")
+    fp.close()
+    pages = [ ('test.html', { 'title' : 'Page %d' % i,
+			      'rows' : [ 'row %d' % k for k in range(5000) ] },
+		os.path.join(tmpDir, pageFilename('page', str(i), 'A & P')) )
+		    for i in range(20) ]
+    for processes in [1, 4]:
+	start = time.time()
+	n = renderPages(tmpDir, pages, processes)
+	print "%d pages in %d processes: %.2f secs" % (n, processes,
+						    time.time() - start)
+    text = open(pages[3][2]).read()
+    print "%s: %d lines, ok: %s" % (os.path.basename(pages[3][2]),
+		    len( text.split('\n') ),
+		    text.startswith('<h1>Page 3</h1>') and 'row 4999' in text)
+    for (t, d, f) in pages: os.remove(f)
+    os.remove( os.path.join(tmpDir, 'test.html') )
+    os.rmdir(tmpDir)
+
+    print pageFilename('journal', 'A', 'Cell & Bio')
+    print pageFilename('journal', 'A', 'Cell Bio')
@@ -0,0 +1,334 @@
+#!/usr/bin/python
+# Set algebra over SciDirect query results we already have, so we can see
+#   what combinations of query fragments (OR, AND, AND NOT) would return
+#   without submitting each combination to SciDirect.
+#
+# Class ResultSet - a set of articles as a bitset over an ArticleIdSpace,
+#	w/ | & - operators and P/R against a gold set.
+# Class ResultAlgebra - holds the results of each fetched query as a
+#	compressed bitset, keyed by canonical query, and evaluates query
+#	trees (SciDirectQuery.py) from them.
+
+import zlib
+import binascii
+import threading
+
+from PrecisionRecall import ArticleIdSpace, PrecisionRecallStats
+from SciDirectQuery import *
+
+def idsToBits( ids		# iterable of article ids
+    ):
+    ''' Return python long w/ the bits for the ids set
+    '''
+    ids = list(ids)
+    if len(ids) == 0: return 0L
+    bits = bytearray( max(ids)/8 + 1)
+    for id in ids:
+	bits[id >> 3] |= 1 << (id & 7)
+    bits.reverse()			# most significant byte first
+    return long( binascii.hexlify(bits), 16)
+# end idsToBits() ----------------------------------
+
+def bitsToIds( bits		# python long
+    ):
+    ''' Return sorted list of the ids whose bits are set
+    '''
+    ids = []
+    base = 0
+    while bits:
+	chunk = int(bits & 0xffffffff)
+	while chunk:
+	    low = chunk & -chunk		# lowest set bit
+	    ids.append( base + low.bit_length() - 1)
+	    chunk ^= low
+	bits >>= 32
+	base += 32
+    return ids
+# end bitsToIds() ----------------------------------
+
+def compressBits( bits		# python long
+    ):
+    ''' Return bits as a zlib compressed string.
+	Result sets are sparse over the id space, so mostly 0 bytes that
+	compress very well.
+    '''
+    h = '%x' % bits
+    if len(h) % 2: h = '0' + h
+    return zlib.compress( binascii.unhexlify(h))
+# end compressBits() ----------------------------------
+
+def uncompressBits( data	# string from compressBits()
+    ):
+    return long( binascii.hexlify( zlib.decompress(data)) or '0', 16)
+# end uncompressBits() ----------------------------------
+
+class QueryNotCachedError (Exception):
+    ''' The results for (part of) a query are not in the ResultAlgebra, and
+	can't be computed from the results that are.
+    '''
+    def __init__(self, query):
+	self.query = query		# canonical query we needed
+    def __str__(self):
+	return "no results for query: %s" % self.query
+# end class QueryNotCachedError ----------------------------------
+
+class ResultSet (object): #[
+    '''
+    A ResultSet is a set of articles, as a bitset (python long) over an
+    ArticleIdSpace. Combine them w/ | (union), & (intersection) and
+    - (difference).
+    '''
+    def __init__(self,
+		bits,		# python long
+		idSpace		# ArticleIdSpace the bits are over
+		):
+	self.bits = bits
+	self.idSpace = idSpace
+
+    def __or__(self, other):
+	return ResultSet(self.bits | other.bits, self.idSpace)
+
+    def __and__(self, other):
+	return ResultSet(self.bits & other.bits, self.idSpace)
+
+    def __sub__(self, other):
+	return ResultSet(self.bits & ~other.bits, self.idSpace)
+
+    def __eq__(self, other):
+	return self.bits == other.bits
+
+    def __ne__(self, other):
+	return self.bits != other.bits
+
+    def __len__(self):
+	return bin(self.bits).count('1')
+
+    def getKeys(self):
+	''' Return list of the article keys in the set
+	'''
+	return [ self.idSpace.getKey(id) for id in bitsToIds(self.bits) ]
+
+    def getStats(self,
+		gold		# ResultSet of the gold articles
+		):
+	''' Return PrecisionRecallStats for this set of results
+	'''
+	stats = PrecisionRecallStats()
+	stats.incNumResults( len(self) )
+	stats.incNumTruePositives( len(self & gold) )
+	stats.incNumGoldPositives( len(gold) )
+	return stats
+# end class ResultSet -------------------------- ]
+
+class ResultAlgebra (object): #[
+    '''
+    A ResultAlgebra holds the results of the queries we have fetched, each
+    as a compressed bitset keyed by the query's canonical form, and
+    evaluates other queries from them:
+	- a query (or sub query) whose results we have is looked up
+	- A OR B   is the union of A and B
+	- A AND B  is the intersection of A and B
+	- A AND NOT B  is A minus B. Only B's results that are in A
+		matter, so for B we can also use the results of
+		X AND B for any X that contains A. E.g., for
+		srctitle("Cell") AND x AND NOT y, we can use the results of
+		srctitle("Cell") AND y instead of (all of) y's.
+	- F(a OR b) (a field query) is the same as F(a) OR F(b), and
+	  x AND (a OR b) is (x AND a) OR (x AND b), so if we don't have the
+	  results of an AND, we try splitting it up on its OR operands.
+    Otherwise evaluate() raises QueryNotCachedError.
+
+    Articles are given by key (e.g., a J number for results that match
+    MGI refs, otherwise the DOI), and a gold set from makeSet() w/ the
+    same kind of keys gives P/R for any evaluated set.
+
+    Use:
+	alg = ResultAlgebra()
+	alg.addResults('srctitle("Cell") AND a', keys)...
+	s = alg.evaluate('srctitle("Cell") AND (a OR b) AND NOT c')
+	s.getStats( alg.makeSet(goldKeys) ) - a PrecisionRecallStats
+    '''
+    def __init__(self,
+		idSpace=None	# ArticleIdSpace to use, None for a new one
+		):
+	if idSpace == None: idSpace = ArticleIdSpace()
+	self.idSpace = idSpace
+	self.bitmaps = {}	# dict[canonical query] = compressed bitset
+	self.lock = threading.Lock()	# results may be added from several
+					#   threads
+
+    def addResults(self,
+		query,		# query string or QueryNode
+		keys		# list of article keys of the query's results
+		):
+	canonical = self.canonical(query)
+	self.lock.acquire()
+	try:
+	    bits = idsToBits( self.idSpace.getIds(keys) )
+	finally:
+	    self.lock.release()
+	self.bitmaps[canonical] = compressBits(bits)
+
+    def hasResults(self, query):
+	return self.bitmaps.has_key( self.canonical(query) )
+
+    def getNumQueries(self):
+	return len(self.bitmaps)
+
+    def getCompressedSize(self):
+	''' Return total num of bytes the result bitsets take
+	'''
+	return sum( [ len(b) for b in self.bitmaps.values() ] )
+
+    def canonical(self, query):
+	if isinstance(query, QueryNode): return query.canonical()
+	return canonicalQuery(query)
+
+    def makeSet(self, keys):
+	''' Return ResultSet for the article keys (e.g., a gold set)
+	'''
+	self.lock.acquire()
+	try:
+	    return ResultSet( idsToBits( self.idSpace.getIds(keys) ),
+							    self.idSpace)
+	finally:
+	    self.lock.release()
+
+    def evaluate(self,
+		query		# query string or QueryNode
+		):
+	''' Return ResultSet of the query's results, computed from the
+	    results we have.
+	'''
+	if not isinstance(query, QueryNode): query = parseQuery(query)
+	return ResultSet( self._eval(query, {}), self.idSpace)
+
+    def _eval(self, node, memo):
+	''' Return the bits for node's results, raise QueryNotCachedError
+	    if we can't. memo: dict[canonical] = bits or the error, for
+	    sub queries we have already tried.
+	'''
+	canonical = node.canonical()
+	if memo.has_key(canonical):
+	    found = memo[canonical]
+	    if isinstance(found, QueryNotCachedError): raise found
+	    return found
+	try:
+	    bits = self._evalNode(node, canonical, memo)
+	except QueryNotCachedError, e:
+	    memo[canonical] = e
+	    raise
+	memo[canonical] = bits
+	return bits
+
+    def _evalNode(self, node, canonical, memo):
+	data = self.bitmaps.get(canonical)
+	if data != None:
+	    return uncompressBits(data)
+
+	if isinstance(node, OrQuery):
+	    bits = 0L
+	    for c in node.flatten():
+		bits |= self._eval(c, memo)
+	    return bits
+
+	if isinstance(node, FieldQuery) and isinstance(node.child, OrQuery):
+	    return self._eval( self._splitOr(node), memo)
+
+	if isinstance(node, AndQuery):
+	    operands = node.flatten()
+	    try:
+		bits = self._eval(operands[0], memo)
+		for c in operands[1:]:
+		    bits &= self._eval(c, memo)
+		return bits
+	    except QueryNotCachedError:
+		pass
+	    for i in range(len(operands)):	# split up on an OR operand
+		orNode = self._splitOr(operands[i])
+		if orNode == None: continue
+		others = operands[:i] + operands[i+1:]
+		return self._eval( OrQuery( [ AndQuery( others + [c] )
+					for c in orNode.children ] ), memo)
+	    raise QueryNotCachedError(canonical)
+
+	if isinstance(node, AndNotQuery):
+	    left = self._eval(node.left, memo)
+	    if left == 0: return left
+	    for scope in [None] + self._scopes(node.left):
+		right = node.right
+		if scope != None: right = AndQuery( [scope, node.right] )
+		try:
+		    return left & ~self._eval(right, memo)
+		except QueryNotCachedError:
+		    pass
+	    raise QueryNotCachedError(node.right.canonical())
+
+	raise QueryNotCachedError(canonical)
+
+    def _splitOr(self, node):
+	''' Return node as an OrQuery if it is one, or is a field query of
+	    one (pushing the field down to the operands), else None
+	'''
+	if isinstance(node, OrQuery):
+	    return node
+	if isinstance(node, FieldQuery) and isinstance(node.child, OrQuery):
+	    return OrQuery( [ FieldQuery(node.field, c)
+				    for c in node.child.flatten() ] )
+	return None
+
+    def _scopes(self, node):
+	''' Return list of queries whose results contain node's results:
+	    its AND operands, then node itself
+	'''
+	if isinstance(node, AndNotQuery):
+	    return self._scopes(node.left)
+	if isinstance(node, AndQuery):
+	    return node.flatten() + [node]
+	return [node]
+# end class ResultAlgebra -------------------------- ]
+
+if __name__ == "__main__":
+
+    # some test code: random article sets for a few query fragments,
+    #   check evaluated combinations against python sets
+    import random
+    random.seed(1)
+    articles = [ 'doi-%d' % i for i in range(5000) ]
+    frag = {}		# dict[fragment query] = set of article keys
+    for f in [ 'ALL(a)', 'ALL(b)', 'ALL(c)', 'ALL(x)', 'ALL(y)' ]:
+	frag[f] = set( random.sample(articles, 800) )
+    journal = set( random.sample(articles, 2000) )
+
+    alg = ResultAlgebra()
+    for f in frag.keys():
+	alg.addResults('srctitle("Cell") AND %s' % f, frag[f] & journal)
+    alg.addResults('srctitle("Cell") AND ALL(a OR b) AND ALL(x)',
+	    (frag['ALL(a)'] | frag['ALL(b)']) & frag['ALL(x)'] & journal)
+    print "%d queries, %d bytes compressed" % (alg.getNumQueries(),
+						    alg.getCompressedSize())
+
+    tests = [
+	('srctitle("Cell") AND (ALL(a) OR ALL(c))',
+		(frag['ALL(a)'] | frag['ALL(c)']) & journal),
+	('srctitle("Cell") AND ALL(a OR b OR c)',
+		(frag['ALL(a)'] | frag['ALL(b)'] | frag['ALL(c)']) & journal),
+	('srctitle("Cell") AND ALL(a OR b) AND ALL(x) AND NOT ALL(y)',
+		(frag['ALL(a)'] | frag['ALL(b)']) & frag['ALL(x)'] & journal
+							- frag['ALL(y)']),
+	('srctitle("Cell") AND ALL(c) AND NOT ALL(x OR y)',
+		frag['ALL(c)'] & journal - frag['ALL(x)'] - frag['ALL(y)']),
+	]
+    gold = set( random.sample( sorted(journal), 300) )
+    goldSet = alg.makeSet(gold)
+    for (q, expected) in tests:
+	s = alg.evaluate(q)
+	pr = s.getStats(goldSet)
+	print "%s: %d results, %d TP, ok: %s" % (q, len(s),
+		pr.getNumTruePositives(), set(s.getKeys()) == expected and
+			pr.getNumTruePositives() == len(expected & gold))
+    try:
+	alg.evaluate('srctitle("Cell") AND ALL(z)')
+	print "Should have failed"
+    except QueryNotCachedError, e:
+	print "Expected error: %s" % e
@@ -0,0 +1,135 @@
+#!/usr/bin/python
+# Class ResultCache - a thread-safe cache for SciDirect query results so we
+#			don't pay for the same API calls twice.
+
+import os
+import threading
+import hashlib
+import cPickle
+
+class ResultCache (object): #[
+    '''
+    A ResultCache maps string keys (typically built from a canonical query
+    string and the search parameters, see makeKey()) to query results
+    (any picklable python value).
+
+    Results are always kept in memory. If a cache directory is given, they
+    are also written there (one pickle file per key), so later runs can
+    reuse them without hitting SciDirect again.
+
+    Safe to share between threads.
+    '''
+    def __init__(self,
+		 cacheDir=None	# directory to keep results in between runs.
+				#   None or '' means memory only
+		):
+	self.cacheDir = cacheDir
+	if self.cacheDir and not os.path.isdir(self.cacheDir):
+	    os.makedirs(self.cacheDir)
+	self.results = {}		# dict[key] = result
+	self.lock = threading.Lock()
+	self.numHits = 0
+	self.numMisses = 0
+    # end __init__() ----------------------------
+
+    def makeKey(self, *parts):
+	''' Return a key (string) from the parts (strings or anything w/ str())
+	'''
+	return '|'.join( [ str(p) for p in parts ] )
+
+    def get(self, key):
+	''' Return the result for key, or None if it is not in the cache.
+	'''
+	self.lock.acquire()
+	try:
+	    if self.results.has_key(key):
+		self.numHits += 1
+		return self.results[key]
+	finally:
+	    self.lock.release()
+
+	result = self._readFile(key)
+
+	self.lock.acquire()
+	try:
+	    if result == None:
+		self.numMisses += 1
+	    else:
+		self.numHits += 1
+		self.results[key] = result
+	finally:
+	    self.lock.release()
+	return result
+    # end get() ----------------------------
+
+    def put(self, key, result):
+	''' Add result to the cache.
+	'''
+	self.lock.acquire()
+	try:
+	    self.results[key] = result
+	finally:
+	    self.lock.release()
+	self._writeFile(key, result)
+    # end put() ----------------------------
+
+    def getNumHits(self):
+	return self.numHits
+
+    def getNumMisses(self):
+	return self.numMisses
+
+    def _filename(self, key):
+	return os.path.join( self.cacheDir,
+				hashlib.md5(key).hexdigest() + '.pickle')
+
+    def _readFile(self, key):
+	''' Return result for key from the cache directory, or None.
+	'''
+	if not self.cacheDir: return None
+	filename = self._filename(key)
+	if not os.path.exists(filename): return None
+	fp = open(filename, 'rb')
+	try:
+	    (fileKey, result) = cPickle.load(fp)
+	finally:
+	    fp.close()
+	if fileKey != key: return None		# md5 collision, really?
+	return result
+    # end _readFile() ----------------------------
+
+    def _writeFile(self, key, result):
+	''' Write result for key to the cache directory (if we have one).
+	    Writes to a temp file and renames, so readers never see half
+	    written files.
+	'''
+	if not self.cacheDir: return
+	filename = self._filename(key)
+	tmpName = "%s.%d.%s.tmp" % (filename, os.getpid(),
+					    threading.current_thread().name)
+	fp = open(tmpName, 'wb')
+	cPickle.dump( (key, result), fp, cPickle.HIGHEST_PROTOCOL)
+	fp.close()
+	os.rename(tmpName, filename)
+    # end _writeFile() ----------------------------
+
+# end class ResultCache -------------------------- ]
+
+if __name__ == "__main__":
+
+    # some test code
+    import tempfile
+    import shutil
+
+    tmpDir = tempfile.mkdtemp()
+    cache = ResultCache(tmpDir)
+    key = cache.makeKey('2013', 'ALL(mouse)', 'journals')
+    print "Get before put (should be None): %s" % cache.get(key)
+    cache.put(key, [ {'DOI' : '10.1016/x'} ])
+    print "Get after put: %s" % cache.get(key)
+
+    cache2 = ResultCache(tmpDir)	# a later run, reads from the dir
+    print "Get from cache dir: %s" % cache2.get(key)
+    print "Hits: %d  Misses: %d (should be 1 and 1)" % \
+				    (cache.getNumHits(), cache.getNumMisses())
+    shutil.rmtree(tmpDir)
@@ -9,10 +9,14 @@ class SciDirectJournal (object):
     Keeps dictionaries of both names to their corresponding SciDirectJournal
 	instances.
     Knows how to read in a file of SciDirectJournal records.
+    The dictionaries are class level, so there is only one list of journals
+	at a time. A JournalRegistry (below) holds its own list and lookups,
+	for several lists at once or for sharing w/ threads and processes.
     '''
     mgiNameIndex = {}	# dict MGI journal names: SciDirectJournal objects
     sdNameIndex = {}	# dict SciDirect journal names: SciDirectJournal objs
     journals = []	# list of all SciDirectJournal objects in this class
+    classifier = None	# JournalClassifier for journals, built when needed
 
     def __init__(self,
     		 mgiJname,
@@ -20,16 +24,19 @@ class SciDirectJournal (object):
 		 prefixMatch=False,	# True => this journal name has variable
 		 			#  suffixes in SciDirect, and sdJname
 					# is the common prefix to match
-		triagedBy=''		# String, if this journal is triaged,
+		triagedBy='',		# String, if this journal is triaged,
 					#  name of curator responsible
+		register=True		# True => add to the class level
+					#  dictionaries and list of journals
 	    ):
 	self.mgiJname = mgiJname
 	self.sdJname  = sdJname
 	self.prefixMatch = prefixMatch
 	self.triagedBy = triagedBy
-	self.__class__.mgiNameIndex[mgiJname] = self
-	self.__class__.sdNameIndex[sdJname]  = self
-	self.__class__.journals.append(self)
+	if register:
+	    self.__class__.mgiNameIndex[mgiJname] = self
+	    self.__class__.sdNameIndex[sdJname]  = self
+	    self.__class__.journals.append(self)
     # end __init__() -----------------------------------------
 
     def getMgiJname(self):
@@ -59,6 +66,14 @@ class SciDirectJournal (object):
 	'''
 	return cls.sdNameIndex[sdJname]
 
+    @classmethod
+    def getClassifier( cls):
+	''' Return JournalClassifier for all the SciDirectJournals
+	'''
+	if cls.classifier == None:
+	    cls.classifier = JournalClassifier(cls.journals)
+	return cls.classifier
+
     @classmethod
     def mgiName2Journal( cls, mgiJname):
 	''' Return the SciDirectJournal object whose MGI name is 'mgiJname'
@@ -68,38 +83,16 @@ class SciDirectJournal (object):
 
     @classmethod
     def initSciDirectJournals( cls, filename):
-	''' Read in the SciDirect Journals from the specified file and create
-	    a SciDirectJournal object for each one.
-	    Assumes file is tab delimited:
-	      MGI_Journal_Name	SciDirect_Journal_Name Prefix_Match TriagedBy
-	    w/ header line.
-	    Skips lines that start w/ "#"
-	    TriagedBy column is optional.
-	    Prefix_Match column is 'true' or 'false'.
-	    TriagedBy is blank or name of curator who triages the journal.
+	''' Read in the SciDirect Journals from the specified file (see
+	    readSciDirectJournals()) and make them the class level list of
+	    journals, replacing any from before.
 	    Returns list of SciDirectJournal objects.
 	'''
-	cls.journals = []
-
-	fp = open( filename, 'r')
-	lines = fp.readlines()
-	fp.close()
-
-	for line in lines[1:]:		# skip header line
-	    if line[0] == "#": 	# skip comment lines
-		continue
-
-	    values = map(string.strip, line.split('\t'))
-	    if len(values) == 3:	# no triaged by value
-		values.append('')	# add null TriagedBy field
-	    (mgi_name, sd_name, prefixMatch, triagedBy) = values
-
-	    #print "'%s'	'%s'	'%s' '%s'" % \
-	    #	    (mgi_name, sd_name, prefixMatch, triagedBy)
-	    pmVal = prefixMatch.lower()=="true"
-
-	    j = SciDirectJournal(mgi_name, sd_name, prefixMatch=pmVal,
-							triagedBy=triagedBy)
+	registry = JournalRegistry.fromFile(filename)
+	cls.mgiNameIndex = dict(registry.mgiNameIndex)
+	cls.sdNameIndex = dict(registry.sdNameIndex)
+	cls.journals = registry.getJournals()
+	cls.classifier = registry.getClassifier()
 	return cls.journals
 
     @classmethod
@@ -121,6 +114,171 @@ class SciDirectJournal (object):
 
 # end class SciDirectJournal -----------------------
 
+def readSciDirectJournals( filename):
+    ''' Read in the SciDirect Journals from the specified file and create
+	a SciDirectJournal object for each one (not added to the class level
+	dictionaries).
+	Assumes file is tab delimited:
+	  MGI_Journal_Name	SciDirect_Journal_Name Prefix_Match TriagedBy
+	w/ header line.
+	Skips lines that start w/ "#"
+	TriagedBy column is optional.
+	Prefix_Match column is 'true' or 'false'.
+	TriagedBy is blank or name of curator who triages the journal.
+	Returns list of SciDirectJournal objects.
+    '''
+    fp = open( filename, 'r')
+    lines = fp.readlines()
+    fp.close()
+
+    journals = []
+    for line in lines[1:]:		# skip header line
+	if line[0] == "#": 	# skip comment lines
+	    continue
+
+	values = map(string.strip, line.split('\t'))
+	if len(values) == 3:	# no triaged by value
+	    values.append('')	# add null TriagedBy field
+	(mgi_name, sd_name, prefixMatch, triagedBy) = values
+
+	pmVal = prefixMatch.lower()=="true"
+
+	journals.append( SciDirectJournal(mgi_name, sd_name,
+		    prefixMatch=pmVal, triagedBy=triagedBy, register=False) )
+    return journals
+# end readSciDirectJournals() -----------------------
+
+class JournalRegistry (object):
+    '''
+    A JournalRegistry holds a list of SciDirectJournals and the lookups for
+	them, all computed up front: MGI name and SciDirect name to journal,
+	the triaged journals, and a JournalClassifier (exact names + prefix
+	trie) for the journal names of SciDirect results.
+    Unlike the SciDirectJournal class level dictionaries, each registry
+	is independent, so several journal lists (or years) can be in one
+	process. Nothing changes it after __init__ (the classifier only
+	remembers lookups), so threads can share one, and it pickles (w/
+	its journals) for process pool workers.
+    '''
+    def __init__(self,
+		journals	# list of SciDirectJournals
+	    ):
+	self.journals = tuple(journals)
+	self.mgiNameIndex = {}	# dict MGI journal names: SciDirectJournals
+	self.sdNameIndex = {}	# dict SciDirect journal names: SDJournals
+	for j in self.journals:
+	    self.mgiNameIndex[j.getMgiJname()] = j
+	    self.sdNameIndex[j.getSdJname()] = j
+	self.triagedJournals = tuple( [ j for j in self.journals
+					    if j.getTriagedBy() != '' ] )
+	self.classifier = JournalClassifier(self.journals)
+    # end __init__() -----------------------------------------
+
+    @classmethod
+    def fromFile( cls, filename):
+	''' Return JournalRegistry for the journals in the file
+	    (see readSciDirectJournals())
+	'''
+	return cls( readSciDirectJournals(filename) )
+
+    def getJournals(self):
+	''' Return list of SciDirectJournals
+	'''
+	return list(self.journals)
+
+    def getTriagedJournals(self):
+	''' Return list of triaged SciDirectJournals
+	'''
+	return list(self.triagedJournals)
+
+    def sdName2Journal(self, sdJname):
+	''' Return the SciDirectJournal whose SciDirect name is 'sdJname'
+	    Raise KeyError if there is none.
+	'''
+	return self.sdNameIndex[sdJname]
+
+    def mgiName2Journal(self, mgiJname):
+	''' Return the SciDirectJournal whose MGI name is 'mgiJname'
+	    Raise KeyError if there is none.
+	'''
+	return self.mgiNameIndex[mgiJname]
+
+    def getClassifier(self):
+	return self.classifier
+
+    def classify(self, name	# SciDirect journal name
+	):
+	''' Return the SciDirectJournal a SciDirect result's journal name is
+	    from, None if none
+	'''
+	return self.classifier.classify(name)
+
+# end class JournalRegistry -----------------------
+
+class JournalClassifier (object):
+    '''
+    A JournalClassifier maps SciDirect journal names (publicationName of
+	SciDirect results) to the SciDirectJournal they are from, in time
+	proportional to the name's length, however many journals there are.
+    Exact SciDirect names are in a dict. The names of prefixMatch journals
+	are in a trie (nested dicts, one level per character) that we walk
+	along the name. If several journals match, an exact match wins,
+	then the longest prefix.
+    Names that are not exact matches are remembered, w/ their journal or
+	None, so each one is only looked up in the trie once. Many results
+	are from the same few non-exact names (prefixMatch journal suffixes,
+	other journals w/ the same words), which get reported as
+	nonExactJournals.
+    '''
+    def __init__(self,
+		journals	# list of SciDirectJournals to classify into
+	    ):
+	self.exact = {}		# dict[SciDirect name] = SciDirectJournal
+	self.trie = {}		# dict[char] = dict[char] ...;  the node for
+				#  a prefixMatch journal name has
+				#  node[None] = the SciDirectJournal
+	self.nonExact = {}	# dict[SciDirect name] = SciDirectJournal or
+				#  None, for names classified via the trie.
+				#  Only a cache: threads may add to it
+				#  concurrently, and it is not pickled.
+	for j in journals:
+	    self.exact.setdefault(j.getSdJname(), j)
+	    if j.prefixMatch:
+		node = self.trie
+		for c in j.getSdJname():
+		    node = node.setdefault(c, {})
+		node.setdefault(None, j)
+    # end __init__() -----------------------------------------
+
+    def classify(self, name	# SciDirect journal name
+	):
+	''' Return the SciDirectJournal the name is from, None if none
+	'''
+	j = self.exact.get(name)
+	if j != None: return j
+	if self.nonExact.has_key(name): return self.nonExact[name]
+
+	node = self.trie
+	for c in name:
+	    node = node.get(c)
+	    if node == None: break
+	    j = node.get(None, j)	# longest prefix so far
+	self.nonExact[name] = j
+	return j
+    # end classify() -----------------------------------------
+
+    def isExact(self, name):
+	''' Return True iff name is a journal's exact SciDirect name
+	'''
+	return self.exact.has_key(name)
+
+    def __getstate__(self):
+	state = self.__dict__.copy()
+	state['nonExact'] = {}
+	return state
+
+# end class JournalClassifier -----------------------
+
 # jim: look up pubTypes - "none" or "editorial" can have no dc:title
 if __name__ == "__main__":
     
@@ -133,4 +291,28 @@ if __name__ == "__main__":
     print
     print "Triaged Journals"
     for j in SciDirectJournal.getTriagedJournals():
-	print "%s %s" % (j.getMgiJname(), j.getTriagedBy()) 
+	print "%s %s" % (j.getMgiJname(), j.getTriagedBy())
+
+    print
+    print "Classifier"
+    classifier = SciDirectJournal.getClassifier()
+    for name in [ j.getSdJname() for j in SciDirectJournal.getJournals() ] \
+			    + [ j.getSdJname() + ": Part B"
+				for j in SciDirectJournal.getJournals() ]:
+	j = classifier.classify(name)
+	print "'%s': %s" % (name, j and j.getMgiJname())
+
+    print
+    print "Registry"
+    import pickle
+    registry = JournalRegistry.fromFile(
+				"Data/Journals/MGI_SciDirect_Journals2.txt")
+    registry = pickle.loads( pickle.dumps(registry, 2) )
+    for j in registry.getJournals():
+	print "%s: %s" % (j.getMgiJname(),
+		registry.classify(j.getSdJname()) is
+			    registry.mgiName2Journal(j.getMgiJname()) )
+    print "Class level journals: %d, separate from the registry: %s" % \
+		    (len(SciDirectJournal.getJournals()),
+		     SciDirectJournal.getJournals()[0] is not
+					registry.getJournals()[0]) 
@@ -0,0 +1,507 @@
+#!/usr/bin/python
+# Parser for SciDirect boolean query strings.
+#
+# parseQuery() - parse a query string into a tree of QueryNode objects
+#
+# Query node classes:
+#   Term	- a single word, may have wildcards: mouse, *sarcoma, heterozygo*
+#   Phrase	- "loose phrase" or {exact phrase}
+#   FieldQuery	- a field restriction: ALL(...), srctitle(...), DOC-HEAD(...)
+#   DateQuery	- Pub-Date AFT|BEF|IS yyyymmdd
+#   OrQuery	- x OR y OR ...
+#   AndQuery	- x AND y AND ...   (adjacent terms are ANDed too)
+#   AndNotQuery - x AND NOT y
+#   NearQuery	- x W/n y, x PRE/n y
+#
+# Query syntax documentation:
+#   http://api.elsevier.com/documentation/search/SCIDIRSearchTips.htm
+# Operator precedence (tightest first): OR, W/n PRE/n, AND, AND NOT
+#
+# Each node knows how to turn itself back into a query string (toQuery())
+#   and into a canonical string (canonical()) that is the same for queries
+#   that differ only in case, spacing, parentheses, or the order of the
+#   operands of OR and AND. Canonical strings are handy keys for caching
+#   query results.
+#
+# Also some functions for generating query variants by editing the tree.
+
+import sys
+import re
+import string
+
+class QueryParseError (Exception):
+    ''' Exception class for query strings we cannot parse.
+    '''
+    def __init__(self, msg):
+	self.msg = msg
+    def __str__(self):
+	return repr(self.msg)
+# end class QueryParseError --------------------------
+
+class QueryNode (object): #[
+    ''' Base class for nodes in a parsed query tree.
+	Nodes should be treated as immutable, the variant functions below
+	build new trees instead of changing existing ones.
+    '''
+    children = ()
+
+    def toQuery(self):
+	''' Return SciDirect query string for this node (and its children)
+	'''
+	raise NotImplementedError
+
+    def canonical(self):
+	''' Return canonical string for this node (and its children)
+	'''
+	raise NotImplementedError
+
+    def __str__(self):
+	return self.toQuery()
+
+    def __repr__(self):
+	return "<%s %s>" % (self.__class__.__name__, self.toQuery())
+# end class QueryNode -------------------------- ]
+
+class Term (QueryNode):
+    ''' a single word. May contain wildcards: * (any chars) ? (one char)
+    '''
+    def __init__(self, text):
+	self.text = text
+
+    def toQuery(self):
+	return self.text
+
+    def canonical(self):
+	return self.text.lower()
+
+    def hasWildcard(self):
+	return '*' in self.text or '?' in self.text
+# end class Term --------------------------
+
+class Phrase (QueryNode):
+    ''' "loose phrase" (exact=False) or {exact phrase} (exact=True)
+    '''
+    def __init__(self, text, exact=False):
+	self.text = text
+	self.exact = exact
+
+    def toQuery(self):
+	if self.exact: return '{%s}' % self.text
+	return '"%s"' % self.text
+
+    def canonical(self):
+	if self.exact: return '{%s}' % self.text	# exact is case sensitive
+	return '"%s"' % string.join(self.text.lower().split(), ' ')
+
+    def getWords(self):
+	return self.text.split()
+# end class Phrase --------------------------
+
+class FieldQuery (QueryNode):
+    ''' Restrict the child query to a field: ALL(...), srctitle(...), etc.
+    '''
+    def __init__(self, field, child):
+	self.field = field
+	self.child = child
+	self.children = (child,)
+
+    def toQuery(self):
+	return '%s(%s)' % (self.field, self.child.toQuery())
+
+    def canonical(self):
+	return '%s(%s)' % (self.field.upper(), self.child.canonical())
+# end class FieldQuery --------------------------
+
+class DateQuery (QueryNode):
+    ''' Pub-Date AFT|BEF|IS yyyymmdd
+    '''
+    def __init__(self, field, op, value):
+	self.field = field
+	self.op = op
+	self.value = value
+
+    def toQuery(self):
+	return '%s %s %s' % (self.field, self.op, self.value)
+
+    def canonical(self):
+	return '%s %s %s' % (self.field.upper(), self.op.upper(), self.value)
+# end class DateQuery --------------------------
+
+class BoolQuery (QueryNode):
+    ''' Base class for OR and AND with 2 or more operands
+    '''
+    op = None		# 'OR' or 'AND', set by subclasses
+    precedence = 0	# higher binds tighter
+
+    def __init__(self, children):
+	self.children = tuple(children)
+
+    def toQuery(self):
+	parts = [ wrap(c, self.precedence) for c in self.children ]
+	return string.join(parts, ' %s ' % self.op)
+
+    def canonical(self):
+	# flatten nested nodes of the same type and sort the operands
+	parts = sorted( set( [ c.canonical() for c in self.flatten() ] ) )
+	if len(parts) == 1: return parts[0]
+	return '(%s)' % string.join(parts, ' %s ' % self.op)
+
+    def flatten(self):
+	''' Return list of operands, pulling up operands of nested nodes
+	    of the same type.
+	'''
+	operands = []
+	for c in self.children:
+	    if isinstance(c, self.__class__):
+		operands.extend( c.flatten() )
+	    else:
+		operands.append(c)
+	return operands
+# end class BoolQuery --------------------------
+
+class OrQuery (BoolQuery):
+    op = 'OR'
+    precedence = 4
+# end class OrQuery --------------------------
+
+class AndQuery (BoolQuery):
+    op = 'AND'
+    precedence = 2
+# end class AndQuery --------------------------
+
+class AndNotQuery (QueryNode):
+    ''' left AND NOT right
+    '''
+    precedence = 1
+
+    def __init__(self, left, right):
+	self.left = left
+	self.right = right
+	self.children = (left, right)
+
+    def toQuery(self):
+	return '%s AND NOT %s' % (wrap(self.left, self.precedence),
+				  wrap(self.right, self.precedence+1) )
+
+    def canonical(self):
+	return '(%s AND NOT %s)' % (self.left.canonical(),
+						    self.right.canonical())
+# end class AndNotQuery --------------------------
+
+class NearQuery (QueryNode):
+    ''' left W/n right  or  left PRE/n right
+    '''
+    precedence = 3
+
+    def __init__(self, op, distance, left, right):
+	self.op = op			# 'W' or 'PRE'
+	self.distance = distance	# int
+	self.left = left
+	self.right = right
+	self.children = (left, right)
+
+    def toQuery(self):
+	return '%s %s/%d %s' % (wrap(self.left, self.precedence), self.op,
+			self.distance, wrap(self.right, self.precedence+1) )
+
+    def canonical(self):
+	left = self.left.canonical()
+	right = self.right.canonical()
+	if self.op == 'W' and right < left:	# W/n is symmetric
+	    (left, right) = (right, left)
+	return '(%s %s/%d %s)' % (left, self.op, self.distance, right)
+# end class NearQuery --------------------------
+
+def wrap( node, precedence):
+    ''' Return node's query string, in parens if it binds looser than
+	precedence.
+    '''
+    nodePrecedence = getattr(node, 'precedence', 99)	# leaves bind tightest
+    if nodePrecedence < precedence:
+	return '(%s)' % node.toQuery()
+    return node.toQuery()
+# end wrap() ----------------------------------
+
+# -------------- Parsing ---------------------------------------
+
+TOKEN_RE = re.compile( r'''
+	(?P<space>\s+)
+	|(?P<lparen>\()
+	|(?P<rparen>\))
+	|(?P<phrase>"[^"]*")
+	|(?P<exact>\{[^}]*\})
+	|(?P<word>[^\s(){}"]+)
+	''', re.VERBOSE)
+
+NEAR_RE = re.compile( r'^(W|PRE)/(\d+)$', re.IGNORECASE)
+DATEOPS = ['AFT', 'BEF', 'IS']
+
+def tokenize( s		# query string
+    ):
+    ''' Return list of (kind, text) tokens for the query string.
+	kinds are: lparen, rparen, phrase, exact, word, field, and, or, not,
+	    near
+	A word immediately followed by '(' is a field name.
+    '''
+    tokens = []
+    pos = 0
+    while pos < len(s):
+	m = TOKEN_RE.match(s, pos)
+	if m == None:
+	    raise QueryParseError("Cannot tokenize query at: '%s'" % s[pos:])
+	pos = m.end()
+	kind = m.lastgroup
+	text = m.group(kind)
+	if kind == 'space':
+	    continue
+	elif kind == 'phrase':
+	    text = text[1:-1]
+	elif kind == 'exact':
+	    text = text[1:-1]
+	elif kind == 'word':
+	    if pos < len(s) and s[pos] == '(':
+		kind = 'field'
+	    elif text.upper() in ['AND', 'OR', 'NOT']:
+		kind = text.lower()
+	    elif NEAR_RE.match(text):
+		kind = 'near'
+	tokens.append( (kind, text) )
+    return tokens
+# end tokenize() ----------------------------------
+
+class QueryParser (object): #[
+    ''' Recursive descent parser for SciDirect query strings.
+	Grammar (tightest binding last):
+	    query	:= andExpr (AND NOT andExpr)*
+	    andExpr	:= nearExpr ( [AND] nearExpr )*
+	    nearExpr	:= orExpr ( W/n|PRE/n orExpr )*
+	    orExpr	:= primary ( OR primary )*
+	    primary	:= field '(' query ')' | '(' query ')' | NOT primary
+			   | phrase | exact | Pub-Date op value | word
+	A leading NOT (not preceded by AND) is treated as ALL() AND NOT.
+    '''
+    def __init__(self, s):
+	self.tokens = tokenize(s)
+	self.pos = 0
+
+    def parse(self):
+	if len(self.tokens) == 0:
+	    raise QueryParseError("Empty query")
+	node = self.parseQuery()
+	if self.pos != len(self.tokens):
+	    raise QueryParseError("Unexpected '%s' in query" % \
+						    self.tokens[self.pos][1])
+	return node
+
+    def peek(self, offset=0):
+	if self.pos + offset < len(self.tokens):
+	    return self.tokens[self.pos + offset][0]
+	return None
+
+    def next(self):
+	if self.pos >= len(self.tokens):
+	    raise QueryParseError("Unexpected end of query")
+	tok = self.tokens[self.pos]
+	self.pos += 1
+	return tok
+
+    def expect(self, kind):
+	tok = self.next()
+	if tok[0] != kind:
+	    raise QueryParseError("Expected %s, got '%s'" % (kind, tok[1]))
+	return tok
+
+    def parseQuery(self):
+	node = self.parseAnd()
+	while self.peek() == 'and' and self.peek(1) == 'not':
+	    self.pos += 2
+	    node = AndNotQuery( node, self.parseAnd())
+	return node
+
+    def parseAnd(self):
+	operands = [ self.parseNear() ]
+	while True:
+	    kind = self.peek()
+	    if kind == 'and' and self.peek(1) != 'not':
+		self.pos += 1
+		operands.append( self.parseNear() )
+	    elif kind in ['lparen', 'phrase', 'exact', 'word', 'field']:
+		operands.append( self.parseNear() )	# implicit AND
+	    else:
+		break
+	if len(operands) == 1: return operands[0]
+	return AndQuery(operands)
+
+    def parseNear(self):
+	node = self.parseOr()
+	while self.peek() == 'near':
+	    m = NEAR_RE.match( self.next()[1] )
+	    node = NearQuery( m.group(1).upper(), int(m.group(2)), node,
+							    self.parseOr() )
+	return node
+
+    def parseOr(self):
+	operands = [ self.parsePrimary() ]
+	while self.peek() == 'or':
+	    self.pos += 1
+	    operands.append( self.parsePrimary() )
+	if len(operands) == 1: return operands[0]
+	return OrQuery(operands)
+
+    def parsePrimary(self):
+	(kind, text) = self.next()
+	if kind == 'field':
+	    self.expect('lparen')
+	    child = self.parseQuery()
+	    self.expect('rparen')
+	    return FieldQuery(text, child)
+	elif kind == 'lparen':
+	    node = self.parseQuery()
+	    self.expect('rparen')
+	    return node
+	elif kind == 'phrase':
+	    return Phrase(text, exact=False)
+	elif kind == 'exact':
+	    return Phrase(text, exact=True)
+	elif kind == 'not':
+	    return AndNotQuery( FieldQuery('ALL', Term('*')),
+							self.parsePrimary() )
+	elif kind == 'word':
+	    if text.lower() == 'pub-date' and self.peek() == 'word' \
+			and self.tokens[self.pos][1].upper() in DATEOPS:
+		op = self.next()[1].upper()
+		value = self.expect('word')[1]
+		return DateQuery(text, op, value)
+	    return Term(text)
+	raise QueryParseError("Unexpected '%s' in query" % text)
+# end class QueryParser -------------------------- ]
+
+def parseQuery( s	# SciDirect query string
+    ):
+    ''' Return the QueryNode tree for the query string.
+	Raise QueryParseError if we cannot parse it.
+    '''
+    return QueryParser(s).parse()
+# end parseQuery() ----------------------------------
+
+def canonicalQuery( s	# SciDirect query string
+    ):
+    ''' Return the canonical string for the query string.
+    '''
+    return parseQuery(s).canonical()
+# end canonicalQuery() ----------------------------------
+
+# -------------- Query variants ---------------------------------------
+
+def replaceNode( root,		# QueryNode, root of the tree
+		 target,	# QueryNode in the tree to replace
+		 replacement	# QueryNode to put in target's place
+    ):
+    ''' Return a new tree, like root, but with target replaced.
+	Nodes that do not contain target are shared with the original tree.
+    '''
+    if root is target:
+	return replacement
+    if len(root.children) == 0:
+	return root
+
+    newChildren = [ replaceNode(c, target, replacement) for c in root.children]
+    if all( [ n is o for (n, o) in zip(newChildren, root.children) ] ):
+	return root			# target not under this node
+
+    if isinstance(root, BoolQuery):
+	return root.__class__(newChildren)
+    elif isinstance(root, FieldQuery):
+	return FieldQuery(root.field, newChildren[0])
+    elif isinstance(root, AndNotQuery):
+	return AndNotQuery(newChildren[0], newChildren[1])
+    elif isinstance(root, NearQuery):
+	return NearQuery(root.op, root.distance, newChildren[0],newChildren[1])
+    raise QueryParseError("Don't know how to copy %s" % repr(root))
+# end replaceNode() ----------------------------------
+
+def findTermLists( root		# QueryNode
+    ):
+    ''' Return list of the OrQuery nodes in the tree whose operands are all
+	terms or phrases, and that are in "positive" positions, i.e., not
+	negated by AND NOT or inside a proximity operator.
+	For these, the results of the whole query are the union of the
+	results of the query with the OrQuery replaced by each of its
+	operands - see termVariants().
+	The list is in the order the OrQueries appear in the query.
+    '''
+    found = []
+    def walk(node):
+	if isinstance(node, OrQuery) and \
+		all( [ isinstance(c, (Term, Phrase)) for c in node.children ] ):
+	    found.append(node)
+	elif isinstance(node, AndNotQuery):
+	    walk(node.left)		# right side is negated
+	elif isinstance(node, NearQuery):
+	    pass			# proximity of an OR is not a union
+	else:
+	    for c in node.children:
+		walk(c)
+    walk(root)
+    return found
+# end findTermLists() ----------------------------------
+
+def termVariants( root,		# QueryNode
+		  orNode	# OrQuery node in root, see findTermLists()
+    ):
+    ''' Return list of (term, singleTermQuery, leaveOneOutQuery) for each
+	term (operand) of orNode.
+	singleTermQuery  - root with orNode replaced by just the term
+	leaveOneOutQuery - root with the term removed from orNode
+	(the queries are QueryNode trees)
+    '''
+    variants = []
+    terms = orNode.children
+    for i in range(len(terms)):
+	single = replaceNode(root, orNode, terms[i])
+	others = terms[:i] + terms[i+1:]
+	if len(others) == 1:
+	    loo = replaceNode(root, orNode, others[0])
+	else:
+	    loo = replaceNode(root, orNode, OrQuery(others))
+	variants.append( (terms[i], single, loo) )
+    return variants
+# end termVariants() ----------------------------------
+
+if __name__ == "__main__":
+
+    # some test code
+    q = '''srctitle("Cell") AND
+	All("knockout mouse" OR KO OR {/-} OR heterozygo*)
+	AND All(mouse OR mice OR murine)
+	AND NOT DOC-HEAD(award OR editor* OR "inside this issue")'''
+    tree = parseQuery(q)
+    print "Query    : %s" % tree.toQuery()
+    print "Canonical: %s" % tree.canonical()
+    print "Reparsed canonical matches: %s" % \
+	    (parseQuery(tree.toQuery()).canonical() == tree.canonical())
+
+    q2 = '''All(mice OR murine OR mouse) AND srctitle("cell")
+	AND All(KO OR {/-} OR heterozygo* OR "Knockout Mouse")
+	AND NOT DOC-HEAD("inside  this issue" OR editor* OR award)'''
+    print "Same canonical as reordered query (should be True): %s" % \
+	    (parseQuery(q2).canonical() == tree.canonical())
+
+    print "Precedence: %s" % parseQuery("a OR b c W/3 d AND NOT e").canonical()
+    print "Dates: %s" % \
+	    parseQuery("Pub-Date AFT 20121231 AND Pub-Date BEF 20140101 AND x")
+
+    lists = findTermLists(tree)
+    print "Term lists (should be 2, the DOC-HEAD one is negated): %d" % \
+								len(lists)
+    for (term, single, loo) in termVariants(tree, lists[0]):
+	print "Term: %s" % term.toQuery()
+	print "    single: %s" % single.toQuery()
+	print "    without: %s" % loo.toQuery()
+
+    for bad in [ 'All(mouse', 'mouse OR', '' ]:
+	try:
+	    parseQuery(bad)
+	    print "Should have failed: '%s'" % bad
+	except QueryParseError, e:
+	    print "Expected error for '%s': %s" % (bad, e)
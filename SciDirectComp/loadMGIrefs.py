@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# loadMGIrefs.py - load the MGI references for some year(s) from the MGI
+#   database (getMGIrefs.sql) into the SQLite stores JournalComp.py reads
+#   when [MGIReferences] storage = sqlite.
+#   Replaces running getMGIrefs.sql by hand and saving the output as the tsv
+#   file each year.
+
+import sys
+import os
+import ConfigParser
+import argparse
+
+sys.path.append( os.path.join(sys.path[0],'jtLib') )
+from MgiRefDb import *
+
+YEARDELIM = ','		# delimiter in config for list of years
+
+def getArgs():
+    DEFAULTCONFIG=os.path.join(sys.path[0],'config.cfg')
+    DEFAULTSQL=os.path.join(sys.path[0],'getMGIrefs.sql')
+    parser = argparse.ArgumentParser( description=\
+	"""Load MGI references from the MGI database into SQLite stores
+	([MGIReferences] sqliteFile).""")
+    parser.add_argument('-c','--config', metavar='config_file',
+			dest='configFile', default=DEFAULTCONFIG,
+			help='Config filename')
+    parser.add_argument('-y', metavar='year',
+			dest='years', nargs='+', default=None,
+			help='year(s) to load (default: Years in config)')
+    parser.add_argument('--sql', metavar='sql_file',
+			dest='sqlFile', default=DEFAULTSQL,
+			help='SQL to get the references, default getMGIrefs.sql')
+    parser.add_argument('--standIn', action='store_true',
+			dest='standIn', default=False,
+			help=
+		    '''instead of the MGI database, use a SQLite stand-in
+		    built from the year's MGI references tsv file
+		    ([MGIReferences] filename), for testing''')
+    return parser.parse_args()
+# end getArgs() ----------------------------------
+
+def main():
+    args = getArgs()
+    config = ConfigParser.SafeConfigParser()
+    config.readfp( open(args.configFile, 'r'), args.configFile)
+
+    years = args.years
+    if years == None:
+	years = [ y.strip() for y in
+			config.get('DEFAULT', 'Years').split(YEARDELIM) ]
+    batchSize = 2000
+    if config.has_option('MGI Database', 'batchSize'):
+	batchSize = config.getint('MGI Database', 'batchSize')
+
+    conn = None
+    if not args.standIn:
+	conn = connectMgiDb(config)
+	source = "%s..%s" % (config.get('MGI Database', 'host'),
+				    config.get('MGI Database', 'database'))
+    for year in years:
+	def configGet(option):
+	    return config.get('MGIReferences', option, vars={'year' : year})
+	if args.standIn:
+	    tsvFile = configGet('filename')
+	    conn = makeStandInDb( [tsvFile] )
+	    source = "stand-in from %s" % tsvFile
+	dbFile = configGet('sqliteFile')
+	print "Loading %s MGI references from %s into %s" % (year, source,
+								    dbFile)
+	loadRefs( conn, readSqlFile(args.sqlFile, year), dbFile,
+				    batchSize=batchSize, source=source)
+	if args.standIn:
+	    conn.close()
+    if conn != None and not args.standIn:
+	conn.close()
+# end main() ----------------------------------
+
+if __name__ == "__main__":
+    main()
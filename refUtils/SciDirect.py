@@ -35,15 +35,19 @@ class SciDirectConnection:
 			'false' means search all SciDirect
 	content	   - 'all', 'serial', 'nonserial', 'journals' (default), or
 			'allbooks'
-	subjects - string of comma-separated subject codes
+	subjects - string of comma-separated subject codes, '' for all
 	  see:
 	  http://api.elsevier.com/content/subject/scidir?httpAccept=text/xml
+	startDate - 'yyyymmdd', only match pubs after this date, None = any
+	endDate   - 'yyyymmdd', only match pubs before this date, None = any
     '''
     def __init__( self,
 	      query=''		# SciDirect query string
 	):
 	self.debugWriter = None	# function/method to write debug msgs to
 				#  None means no debug messages
+	self.numApiCalls = 0	# num of API calls (hitExternalAPI()) made
+	self.apiCallback = None	# function() called w/ each API call
 
 	# API details... ----------------------
 	self.baseURL = 'http://api.elsevier.com/content/search/index:SCIDIR'
@@ -56,6 +60,8 @@ class SciDirectConnection:
 	self.content    = 'journals'	# only search journals
 	self.subjects	= '22,18'	# 22=biochem,genetics & molecular bio
 					# 18=neuroscience
+	self.startDate	= None		# no start date
+	self.endDate	= None		# no end date
 
 	self.bufferSize = 1000		# max num of pubs to get per API call
 					#  so we don't tax their server
@@ -80,10 +86,18 @@ class SciDirectConnection:
 	self.subscribed = subscribed
 
     def setSubjects( self, s  # string, comma separated (no spaces) list of
-		  	      #     SciDirect subject codes
+		  	      #     SciDirect subject codes, '' for all
 		):
 	self.subjects = s
 
+    def setStartDate( self, dateString	# string 'yyyymmdd' or None
+		):
+	self.startDate = dateString
+
+    def setEndDate( self, dateString	# string 'yyyymmdd' or None
+		):
+	self.endDate = dateString
+
     def setBufferSize( self, n	# int
 		):
 	self.bufferSize = n
@@ -92,6 +106,17 @@ class SciDirectConnection:
 	):
 	self.debugWriter = writer
 
+    def setApiCallback( self, callback	# function(), called before each
+					#  API call, e.g., to count them
+	):
+	self.apiCallback = callback
+
+    def getNumApiCalls( self):
+	''' Return num of API calls this connection has made (one per page
+	    of results, plus any count queries)
+	'''
+	return self.numApiCalls
+
     # end basic Set methods-------------------------------------------
 
     def debug( self,
@@ -123,7 +148,12 @@ class SciDirectConnection:
     def doQuery( self,
 		query=None,	# query string, use default query if None
 		numToGet=25,	# (max) num items to return from this query
-		startIndex=0	# index of 1st doc to retrieve (0=first)
+		startIndex=0,	# index of 1st doc to retrieve (0=first)
+		pageCallback=None, # function(list of rcds) called w/ each page
+				#  of results, returns False to stop paging
+		numResults=None	# total num of matching results if already
+				#  known (e.g., from doCount()), saves the
+				#  API call to get it
 	):
 	''' Submit the query and package up the results
 	    Return a 2-tuple: (x, y)
@@ -133,11 +163,16 @@ class SciDirectConnection:
 	    This function knows how to build up a result set by iterative
 	    queries to the SciDirect API to return the list of matching 
 	    publications.
+	    If pageCallback stops the paging early, the list is just the
+	    results up to then.
 	'''
 	if query == None: query = self.qstring	# use default
 
-	# do query with only 1 result to get actual num of matching results
-	(totalNumResults,results) = \
+	if numResults != None:
+	    totalNumResults = numResults
+	else:	# do query with only 1 result to get actual num of matching
+		#   results
+	    (totalNumResults,results) = \
 			    self.unpackJson( self.hitExternalAPI(query, 1, 0 ) )
 
 	# set toGet to the exact number of results we want on this query
@@ -152,8 +187,12 @@ class SciDirectConnection:
 	    (tot, newr) = self.unpackJson( \
 			self.hitExternalAPI(query, numThisPage, startIndex) )
 
+	    if len(newr) == 0:		# fewer results than the total said
+		break
 	    results.extend(newr)
 	    startIndex += len(newr)
+	    if pageCallback != None and not pageCallback(newr):
+		break
 
 	return (totalNumResults,results)
 
@@ -264,6 +303,8 @@ class SciDirectConnection:
 	rslt['issue']	     = stringIt( r.get('prism:issueIdentifier','none'))
 	rslt['issueName']    = stringIt( r.get('prism:issueName','none'))
 	rslt['journal']	     = stringIt( r['prism:publicationName'])
+	rslt['keywords']     = stringIt( r.get('authkeywords', 'none'))
+	rslt['pii']	     = stringIt( r.get('pii', 'none'))
 	rslt['prismType']    = stringIt( r['prism:aggregationType'])
 	rslt['pubmed']	     = stringIt( r.get('pubmed-id', 'none'))
 	rslt['pubType']	     = stringIt( r.get( 'pubType', 'none'))
@@ -291,8 +332,14 @@ class SciDirectConnection:
 	    NOTE:  if startIndex > the totalnumber of matching results,
 	           you seem to get a 404 ERROR FROM SCIDIRECT.
 	'''
+	self.numApiCalls += 1
+	if self.apiCallback != None: self.apiCallback()
+
 	# convert all the params to proper URL encoding
 	query = string.join(query.split('\n'), " ")	# get rid of '\n's
+	if self.startDate != None or self.endDate != None:
+	    query = addDatesToQuery( '(%s)' % query, self.startDate,
+								self.endDate)
 
 	values =  { 
 		    'query'	: query,
@@ -306,14 +353,15 @@ class SciDirectConnection:
 		    'subscribed': self.subscribed,
 		    'content'	: self.content, 
 
-		    'subj'	: self.subjects, # Not sure what is searched
-		    				 # if we don't pass this.
-						 # It does something,
-						 # but doesn't seem to search
-						 #  all subjects.
 		    'start'	: startIndex,
 		    'count'	: numToGet
 		    }
+	if self.subjects != '':
+	    values['subj'] = self.subjects # Not sure what is searched
+					   # if we don't pass this.
+					   # It does something,
+					   # but doesn't seem to search
+					   #  all subjects.
 	qparams = urllib.urlencode( values)
 	url = self.baseURL + '?' +  qparams 
 	#self.debug("API request: %s\n" % url)